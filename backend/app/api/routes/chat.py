@@ -1,9 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from typing import List, Optional
-import openai
-import re
+from typing import Dict, List, Optional
 from app.core.config import settings, AI_RESPONSE_GUIDELINES, CONTENT_SAFETY_RULES
+from app.services.ai import async_llm_gateway
+from app.services.safety import safety_engine
 
 router = APIRouter()
 
@@ -57,11 +57,12 @@ class MockOpenAIClient:
             }
         ]
 
-    def generate_response(self, message: str, user_age: Optional[int] = None) -> ChatResponse:
+    def generate_response(self, message: str, user_age: Optional[int] = None, scan: Optional[Dict] = None) -> ChatResponse:
         message_lower = message.lower()
+        scan = scan if scan is not None else safety_engine.scan(message)
         
         # Check for emergency content
-        emergency_detected = any(keyword in message_lower for keyword in CONTENT_SAFETY_RULES["emergency_triggers"])
+        emergency_detected = bool(scan["emergency"])
         
         if emergency_detected:
             return ChatResponse(
@@ -139,8 +140,9 @@ async def send_message(request: ChatRequest):
             detail=f"Message too long. Maximum {settings.MAX_CHAT_MESSAGE_LENGTH} characters allowed."
         )
     
-    # Content safety check
-    if contains_inappropriate_content(request.message):
+    # Content safety check (one scan, reused for emergency detection below)
+    scan = safety_engine.scan(request.message)
+    if scan["contact_info"]:
         raise HTTPException(
             status_code=400,
             detail="Message contains inappropriate content. Please keep the conversation supportive and safe."
@@ -149,22 +151,22 @@ async def send_message(request: ChatRequest):
     try:
         # For development, use mock client
         # In production, replace with actual OpenAI client
-        if settings.OPENAI_API_KEY and settings.OPENAI_API_KEY != "":
-            # Use real OpenAI client
-            response = await generate_openai_response(request.message, request.user_age)
+        if async_llm_gateway.available():
+            # Use real OpenAI client (unless the circuit breaker has tripped)
+            response = await generate_openai_response(request.message, request.user_age, scan)
         else:
             # Use mock client for development
-            response = mock_client.generate_response(request.message, request.user_age)
+            response = mock_client.generate_response(request.message, request.user_age, scan)
         
         return response
         
     except Exception as e:
         raise HTTPException(status_code=500, detail="Sorry, I'm having trouble responding right now. Please try again.")
 
-async def generate_openai_response(message: str, user_age: Optional[int] = None) -> ChatResponse:
+async def generate_openai_response(message: str, user_age: Optional[int] = None, scan: Optional[Dict] = None) -> ChatResponse:
     """Generate response using OpenAI API (for production use)."""
     
-    client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+    scan = scan if scan is not None else safety_engine.scan(message)
     
     system_prompt = f"""
     You are a supportive AI friend for children and teens (ages 7-16) who may be experiencing bullying or emotional difficulties. 
@@ -184,7 +186,7 @@ async def generate_openai_response(message: str, user_age: Optional[int] = None)
     """
     
     try:
-        response = client.chat.completions.create(
+        response = await async_llm_gateway.create(
             model=settings.OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -197,10 +199,7 @@ async def generate_openai_response(message: str, user_age: Optional[int] = None)
         ai_response = response.choices[0].message.content
         
         # Check if emergency content was detected
-        emergency_detected = any(
-            keyword in message.lower() 
-            for keyword in CONTENT_SAFETY_RULES["emergency_triggers"]
-        )
+        emergency_detected = bool(scan["emergency"])
         
         return ChatResponse(
             response=ai_response,
@@ -211,22 +210,12 @@ async def generate_openai_response(message: str, user_age: Optional[int] = None)
         
     except Exception as e:
         # Fallback to mock response
-        return mock_client.generate_response(message, user_age)
+        return mock_client.generate_response(message, user_age, scan)
 
 def contains_inappropriate_content(message: str) -> bool:
     """Check if message contains inappropriate content."""
     
-    inappropriate_patterns = [
-        r'\b\d{3}-\d{3}-\d{4}\b',  # Phone numbers
-        r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',  # Email addresses
-        r'\b\d{1,5}\s+\w+\s+(street|st|avenue|ave|road|rd|drive|dr|lane|ln)\b',  # Addresses
-    ]
-    
-    for pattern in inappropriate_patterns:
-        if re.search(pattern, message, re.IGNORECASE):
-            return True
-    
-    return False
+    return bool(safety_engine.scan(message)["contact_info"])
 
 def generate_suggestions(message: str) -> List[str]:
     """Generate contextual suggestions based on the message."""
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import datetime
+import json
+from ...models.community import CommunityStory as CommunityStoryRow
+from ...repositories import StoryRepository
+from ...repositories.community import APPROVED
+from ...services.database import get_async_session
+from ...utils.validation import parse_id
 
 router = APIRouter()
 
@@ -25,10 +31,9 @@ class StoryCreate(BaseModel):
     author_name: Optional[str] = None
     tags: List[str] = []
 
-# Mock community stories
-mock_stories = [
+# Stories the community board starts with, added to an empty table on startup
+SEED_STORIES = [
     {
-        "id": "story_1",
         "title": "How I Found My Confidence",
         "content": """When I started middle school, I was really shy and some kids made fun of my glasses. I felt really bad about myself and didn't want to go to school.
 
@@ -46,7 +51,6 @@ To anyone going through something similar - you are amazing just the way you are
         "created_at": "2024-01-10T14:30:00Z"
     },
     {
-        "id": "story_2", 
         "title": "Standing Up Made a Difference",
         "content": """I saw someone in my class being picked on every day at lunch. At first I didn't know what to do because I was scared the bullies would pick on me too.
 
@@ -64,7 +68,6 @@ Even if you're scared, try to help. You might be surprised how much difference y
         "created_at": "2024-01-08T16:45:00Z"
     },
     {
-        "id": "story_3",
         "title": "My Family Helped Me Through It",
         "content": """When kids at school were saying mean things about me online, I was really upset and didn't want to tell anyone. I thought it would just make things worse.
 
@@ -83,29 +86,42 @@ Don't be afraid to tell a trusted adult. They want to help you and they know how
     }
 ]
 
+def to_response(story: CommunityStoryRow) -> CommunityStory:
+    return CommunityStory(
+        id=str(story.id),
+        title=story.title,
+        content=story.content,
+        author_age=story.author_age,
+        is_anonymous=story.is_anonymous,
+        author_name=story.author_name,
+        upvotes=story.upvotes or 0,
+        is_moderated=story.status == APPROVED,
+        tags=json.loads(story.tags) if story.tags else [],
+        created_at=story.created_at.isoformat() if story.created_at else None
+    )
+
+async def get_story_or_404(repository: StoryRepository, story_id: str) -> CommunityStoryRow:
+    db_id = parse_id(story_id)
+    story = await repository.get(db_id) if db_id is not None else None
+    if not story:
+        raise HTTPException(status_code=404, detail="Story not found")
+    return story
+
 @router.get("/stories", response_model=List[CommunityStory])
 async def get_stories(
     limit: int = 20,
     tag: Optional[str] = None,
-    moderated_only: bool = True
+    moderated_only: bool = True,
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Get community stories with optional filtering."""
     
-    filtered_stories = mock_stories
-    
-    if moderated_only:
-        filtered_stories = [s for s in filtered_stories if s["is_moderated"]]
-    
-    if tag:
-        filtered_stories = [s for s in filtered_stories if tag in s["tags"]]
-    
-    # Sort by upvotes and date
-    filtered_stories.sort(key=lambda x: (x["upvotes"], x["created_at"]), reverse=True)
-    
-    return [CommunityStory(**story) for story in filtered_stories[:limit]]
+    # Sorted by upvotes and date
+    stories = await StoryRepository(session).list(limit, tag=tag, moderated_only=moderated_only)
+    return [to_response(story) for story in stories]
 
 @router.post("/stories", response_model=CommunityStory)
-async def create_story(story: StoryCreate):
+async def create_story(story: StoryCreate, session: AsyncSession = Depends(get_async_session)):
     """Submit a new community story."""
     
     # Content validation
@@ -128,63 +144,53 @@ async def create_story(story: StoryCreate):
             detail="Author age must be between 7 and 18"
         )
     
-    # Create new story
-    story_dict = {
-        "id": f"story_{len(mock_stories) + 1}",
-        "title": story.title,
-        "content": story.content,
-        "author_age": story.author_age,
-        "is_anonymous": story.is_anonymous,
-        "author_name": story.author_name if not story.is_anonymous else None,
-        "upvotes": 0,
-        "is_moderated": False,  # Requires moderation before appearing
-        "tags": story.tags,
-        "created_at": datetime.now().isoformat()
-    }
+    # Create new story; it requires moderation before appearing
+    saved = await StoryRepository(session).create(
+        title=story.title,
+        content=story.content,
+        author_age=story.author_age,
+        is_anonymous=story.is_anonymous,
+        author_name=story.author_name if not story.is_anonymous else None,
+        tags=json.dumps(story.tags)
+    )
     
-    mock_stories.append(story_dict)
-    
-    return CommunityStory(**story_dict)
+    return to_response(saved)
 
 @router.post("/stories/{story_id}/upvote")
-async def upvote_story(story_id: str, user_id: str):
-    """Upvote a community story."""
+async def upvote_story(story_id: str, user_id: str, session: AsyncSession = Depends(get_async_session)):
+    """Upvote a community story, once per user."""
     
-    story = next((s for s in mock_stories if s["id"] == story_id), None)
+    repository = StoryRepository(session)
+    story = await get_story_or_404(repository, story_id)
     
-    if not story:
-        raise HTTPException(status_code=404, detail="Story not found")
+    voter_id = parse_id(user_id)
+    if voter_id is None:
+        raise HTTPException(status_code=400, detail="Invalid user_id")
     
-    # In production, check if user already upvoted
-    story["upvotes"] += 1
+    counted, total = await repository.upvote(story.id, voter_id)
     
     return {
-        "message": "Story upvoted successfully",
+        "message": "Story upvoted successfully" if counted else "Story already upvoted",
         "story_id": story_id,
-        "total_upvotes": story["upvotes"]
+        "total_upvotes": total
     }
 
 @router.get("/stories/{story_id}", response_model=CommunityStory)
-async def get_story(story_id: str):
+async def get_story(story_id: str, session: AsyncSession = Depends(get_async_session)):
     """Get a specific community story."""
     
-    story = next((s for s in mock_stories if s["id"] == story_id), None)
-    
-    if not story:
-        raise HTTPException(status_code=404, detail="Story not found")
-    
-    return CommunityStory(**story)
+    story = await get_story_or_404(StoryRepository(session), story_id)
+    return to_response(story)
 
 @router.get("/stories/tags/popular")
-async def get_popular_tags():
+async def get_popular_tags(session: AsyncSession = Depends(get_async_session)):
     """Get popular story tags."""
     
     # Count tag usage
     tag_counts = {}
-    for story in mock_stories:
-        if story["is_moderated"]:
-            for tag in story["tags"]:
-                tag_counts[tag] = tag_counts.get(tag, 0) + 1
+    for tags in await StoryRepository(session).approved_tags():
+        for tag in tags:
+            tag_counts[tag] = tag_counts.get(tag, 0) + 1
     
     # Sort by popularity
     popular_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)
@@ -197,13 +203,10 @@ async def get_popular_tags():
     }
 
 @router.post("/stories/{story_id}/report")
-async def report_story(story_id: str, reason: str):
+async def report_story(story_id: str, reason: str, session: AsyncSession = Depends(get_async_session)):
     """Report a story for inappropriate content."""
     
-    story = next((s for s in mock_stories if s["id"] == story_id), None)
-    
-    if not story:
-        raise HTTPException(status_code=404, detail="Story not found")
+    await get_story_or_404(StoryRepository(session), story_id)
     
     # In production, log the report and notify moderators
     return {
@@ -250,34 +253,15 @@ async def get_community_guidelines():
     }
 
 @router.get("/stats")
-async def get_community_stats():
+async def get_community_stats(session: AsyncSession = Depends(get_async_session)):
     """Get community statistics."""
     
-    total_stories = len([s for s in mock_stories if s["is_moderated"]])
-    total_upvotes = sum(s["upvotes"] for s in mock_stories if s["is_moderated"])
-    
-    # Age distribution
-    age_groups = {"7-10": 0, "11-13": 0, "14-16": 0, "17+": 0}
-    for story in mock_stories:
-        if story["is_moderated"]:
-            age = story["author_age"]
-            if age <= 10:
-                age_groups["7-10"] += 1
-            elif age <= 13:
-                age_groups["11-13"] += 1
-            elif age <= 16:
-                age_groups["14-16"] += 1
-            else:
-                age_groups["17+"] += 1
+    stats = await StoryRepository(session).stats()
     
     return {
-        "total_stories": total_stories,
-        "total_upvotes": total_upvotes,
-        "age_distribution": age_groups,
-        "anonymous_stories": len([s for s in mock_stories if s["is_anonymous"] and s["is_moderated"]]),
-        "stories_this_month": len([
-            s for s in mock_stories 
-            if s["is_moderated"] and 
-            datetime.fromisoformat(s["created_at"]).month == datetime.now().month
-        ])
-    }
\ No newline at end of file
+        "total_stories": stats["total"],
+        "total_upvotes": stats["upvotes"],
+        "age_distribution": stats["age_distribution"],
+        "anonymous_stories": stats["anonymous"],
+        "stories_this_month": stats["this_month"]
+    }
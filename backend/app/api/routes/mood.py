@@ -1,7 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 from typing import List, Optional
-from datetime import datetime, date
+from datetime import date
+import json
+from ...models.mood import MoodEntry as MoodEntryRow
+from ...repositories import MoodRepository
+from ...services.database import get_async_session
+from ...utils.validation import parse_id, parse_iso_date
 
 router = APIRouter()
 
@@ -21,19 +29,47 @@ class MoodStats(BaseModel):
     most_common_mood: str
     trend: str  # improving, declining, stable
 
-# Mock mood data storage
-mock_mood_entries = []
+MAX_PAGE_SIZE = 100
+VALID_MOODS = ["happy", "sad", "angry", "anxious", "calm", "excited", "confused", "scared"]
+
+def to_response(entry: MoodEntryRow) -> MoodEntry:
+    return MoodEntry(
+        id=str(entry.id),
+        user_id=str(entry.user_id),
+        mood=entry.mood_type,
+        intensity=entry.intensity,
+        notes=entry.notes,
+        date=entry.date.isoformat(),
+        created_at=entry.created_at.isoformat() if entry.created_at else None
+    )
+
+def encode_cursor(key) -> str:
+    day, entry_id = key
+    return f"{day.isoformat()}_{entry_id}"
+
+def parse_cursor(cursor: str):
+    """The (date, id) key in an ``X-Next-Cursor`` value, or None if it isn't one."""
+    day, _, entry_id = cursor.partition("_")
+    parsed_day, parsed_id = parse_iso_date(day), parse_id(entry_id)
+    if parsed_day is None or parsed_id is None:
+        return None
+    return parsed_day, parsed_id
+
+def user_db_id(user_id: str) -> int:
+    db_id = parse_id(user_id)
+    if db_id is None:
+        raise HTTPException(status_code=400, detail="Invalid user_id")
+    return db_id
 
 @router.post("/entries", response_model=MoodEntry)
-async def create_mood_entry(entry: MoodEntry):
+async def create_mood_entry(entry: MoodEntry, session: AsyncSession = Depends(get_async_session)):
     """Create a new mood entry for the user."""
     
     # Validate mood type
-    valid_moods = ["happy", "sad", "angry", "anxious", "calm", "excited", "confused", "scared"]
-    if entry.mood not in valid_moods:
+    if entry.mood not in VALID_MOODS:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid mood. Must be one of: {', '.join(valid_moods)}"
+            detail=f"Invalid mood. Must be one of: {', '.join(VALID_MOODS)}"
         )
     
     # Validate intensity
@@ -43,61 +79,54 @@ async def create_mood_entry(entry: MoodEntry):
             detail="Intensity must be between 1 and 5"
         )
     
-    # Check if user already has an entry for today
-    today = date.today().isoformat()
-    existing_entry = next(
-        (e for e in mock_mood_entries 
-         if e["user_id"] == entry.user_id and e["date"].split("T")[0] == today),
-        None
-    )
+    entry_date = parse_iso_date(entry.date)
+    if entry_date is None:
+        raise HTTPException(status_code=400, detail="date must be an ISO date")
     
-    if existing_entry:
-        # Update existing entry
-        existing_entry.update({
-            "mood": entry.mood,
-            "intensity": entry.intensity,
-            "notes": entry.notes,
-        })
-        return MoodEntry(**existing_entry)
-    
-    # Create new entry
-    entry_dict = {
-        "id": f"mood_{len(mock_mood_entries) + 1}",
-        "user_id": entry.user_id,
-        "mood": entry.mood,
-        "intensity": entry.intensity,
-        "notes": entry.notes,
-        "date": entry.date,
-        "created_at": datetime.now().isoformat()
-    }
-    
-    mock_mood_entries.append(entry_dict)
-    return MoodEntry(**entry_dict)
+    # A second entry for the same day updates the first
+    try:
+        saved = await MoodRepository(session).save_for_date(
+            user_db_id(entry.user_id), entry_date, entry.mood, entry.intensity, entry.notes
+        )
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="User not found")
+    except StaleDataError:
+        raise HTTPException(status_code=409, detail="Mood entries are being saved too fast, try again")
+    return to_response(saved)
 
 @router.get("/entries", response_model=List[MoodEntry])
-async def get_mood_entries(user_id: str, limit: int = 30):
-    """Get mood entries for a user."""
-    
-    user_entries = [
-        entry for entry in mock_mood_entries 
-        if entry["user_id"] == user_id
-    ]
-    
-    # Sort by date descending
-    user_entries.sort(key=lambda x: x["created_at"], reverse=True)
-    
-    return [MoodEntry(**entry) for entry in user_entries[:limit]]
+async def get_mood_entries(
+    user_id: str,
+    response: Response,
+    limit: int = 30,
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Get mood entries for a user, latest day first, one page at a time.
+
+    When there are older entries the response carries an ``X-Next-Cursor``
+    header; pass it back as ``cursor`` for the next page.
+    """
+    
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    before = None
+    if cursor is not None:
+        before = parse_cursor(cursor)
+        if before is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    entries, next_key = await MoodRepository(session).page(user_db_id(user_id), limit, before)
+    if next_key is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(next_key)
+    return [to_response(entry) for entry in entries]
 
 @router.get("/stats", response_model=MoodStats)
-async def get_mood_stats(user_id: str):
+async def get_mood_stats(user_id: str, session: AsyncSession = Depends(get_async_session)):
     """Get mood tracking statistics for a user."""
     
-    user_entries = [
-        entry for entry in mock_mood_entries 
-        if entry["user_id"] == user_id
-    ]
+    summary = await MoodRepository(session).get_summary(user_db_id(user_id))
     
-    if not user_entries:
+    if summary is None or not summary.entry_count:
         return MoodStats(
             total_entries=0,
             current_streak=0,
@@ -106,73 +135,41 @@ async def get_mood_stats(user_id: str):
             trend="stable"
         )
     
-    # Calculate stats
-    total_entries = len(user_entries)
+    mood_counts = json.loads(summary.mood_counts)
+    most_common_mood = min(mood_counts, key=lambda mood: (-mood_counts[mood], mood), default="")
     
-    # Calculate average intensity
-    avg_intensity = sum(entry["intensity"] for entry in user_entries) / total_entries
+    # The streak only counts while it reaches today
+    current_streak = summary.streak if summary.last_date == date.today() else 0
     
-    # Find most common mood
-    mood_counts = {}
-    for entry in user_entries:
-        mood_counts[entry["mood"]] = mood_counts.get(entry["mood"], 0) + 1
-    
-    most_common_mood = max(mood_counts, key=mood_counts.get) if mood_counts else ""
-    
-    # Calculate streak (simplified)
-    current_streak = calculate_streak(user_entries)
-    
-    # Calculate trend (simplified)
-    trend = calculate_trend(user_entries)
+    recent_entries = [
+        {"date": day, "intensity": intensity}
+        for day, intensity in json.loads(summary.recent)
+    ]
+    trend = calculate_trend(recent_entries)
     
     return MoodStats(
-        total_entries=total_entries,
+        total_entries=summary.entry_count,
         current_streak=current_streak,
-        average_mood_intensity=round(avg_intensity, 1),
+        average_mood_intensity=round(summary.intensity_sum / summary.entry_count, 1),
         most_common_mood=most_common_mood,
         trend=trend
     )
 
 @router.get("/today")
-async def get_today_mood(user_id: str):
+async def get_today_mood(user_id: str, session: AsyncSession = Depends(get_async_session)):
     """Get today's mood entry for a user."""
     
-    today = date.today().isoformat()
+    repository = MoodRepository(session)
+    summary = await repository.get_summary(user_db_id(user_id))
     
-    today_entry = next(
-        (entry for entry in mock_mood_entries 
-         if entry["user_id"] == user_id and entry["date"].split("T")[0] == today),
-        None
-    )
-    
-    if today_entry:
-        return MoodEntry(**today_entry)
+    # Today's entry, if there is one, is the user's latest
+    if summary is not None and summary.last_date == date.today():
+        today_entry = await repository.get(summary.last_entry_id)
+        if today_entry:
+            return to_response(today_entry)
     
     return None
 
-def calculate_streak(entries: List[dict]) -> int:
-    """Calculate current consecutive days streak."""
-    
-    if not entries:
-        return 0
-    
-    # Sort entries by date
-    sorted_entries = sorted(entries, key=lambda x: x["date"], reverse=True)
-    
-    streak = 0
-    current_date = date.today()
-    
-    for entry in sorted_entries:
-        entry_date = datetime.fromisoformat(entry["date"]).date()
-        
-        if entry_date == current_date:
-            streak += 1
-            current_date = current_date.replace(day=current_date.day - 1)
-        else:
-            break
-    
-    return streak
-
 def calculate_trend(entries: List[dict]) -> str:
     """Calculate mood trend over recent entries."""
     
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import datetime
+import json
+from ...models.report import BullyingReport as BullyingReportRow
+from ...repositories import ReportRepository
+from ...services.database import get_async_session
+from ...utils.validation import parse_id, parse_iso_datetime
 
 router = APIRouter()
 
@@ -22,11 +28,30 @@ class ReportUpdate(BaseModel):
     status: str
     notes: Optional[str] = None
 
-# Mock reports storage
-mock_reports = []
+def to_response(report: BullyingReportRow) -> BullyingReport:
+    return BullyingReport(
+        id=str(report.id),
+        user_id=str(report.user_id) if report.user_id is not None else None,
+        title=report.title,
+        description=report.description,
+        incident_date=report.incident_date.isoformat() if report.incident_date else "",
+        location=report.location or "",
+        people_involved=json.loads(report.witnesses) if report.witnesses else [],
+        is_anonymous=report.is_anonymous,
+        reported_to=report.reported_to,
+        status=report.status,
+        created_at=report.created_at.isoformat() if report.created_at else None
+    )
+
+async def get_report_or_404(repository: ReportRepository, report_id: str) -> BullyingReportRow:
+    db_id = parse_id(report_id)
+    report = await repository.get(db_id) if db_id is not None else None
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report
 
 @router.post("/", response_model=BullyingReport)
-async def create_report(report: BullyingReport):
+async def create_report(report: BullyingReport, session: AsyncSession = Depends(get_async_session)):
     """Submit a new bullying incident report."""
     
     # Validate required fields
@@ -42,64 +67,69 @@ async def create_report(report: BullyingReport):
             detail="Description must be under 2000 characters"
         )
     
-    # Create new report
-    report_dict = {
-        "id": f"report_{len(mock_reports) + 1}",
-        "user_id": None if report.is_anonymous else report.user_id,
-        "title": report.title,
-        "description": report.description,
-        "incident_date": report.incident_date,
-        "location": report.location,
-        "people_involved": report.people_involved,
-        "is_anonymous": report.is_anonymous,
-        "reported_to": report.reported_to,
-        "status": "pending",
-        "created_at": datetime.now().isoformat()
-    }
+    incident_date = parse_iso_datetime(report.incident_date)
+    if incident_date is None:
+        raise HTTPException(status_code=400, detail="incident_date must be an ISO date")
     
-    mock_reports.append(report_dict)
+    user_id = None
+    if not report.is_anonymous and report.user_id:
+        user_id = parse_id(report.user_id)
+        if user_id is None:
+            raise HTTPException(status_code=400, detail="Invalid user_id")
+    
+    # Create new report
+    try:
+        saved = await ReportRepository(session).create(
+            user_id=user_id,
+            is_anonymous=report.is_anonymous,
+            report_type="other",
+            status="pending",
+            title=report.title,
+            description=report.description,
+            location=report.location,
+            reported_to=report.reported_to,
+            incident_date=incident_date,
+            witnesses=json.dumps(report.people_involved)
+        )
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="User not found")
+    response = to_response(saved)
     
     # In a real app, send notifications to appropriate authorities
-    await send_report_notifications(report_dict)
+    await send_report_notifications(response.model_dump())
     
-    return BullyingReport(**report_dict)
+    return response
 
 @router.get("/", response_model=List[BullyingReport])
-async def get_reports(user_id: Optional[str] = None, status: Optional[str] = None):
-    """Get reports. If user_id is provided, get user's reports only."""
-    
-    filtered_reports = mock_reports
-    
+async def get_reports(
+    user_id: Optional[str] = None,
+    status: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Get reports, newest first. If user_id is provided, get user's reports only."""
+    
+    db_user_id = None
     if user_id:
-        filtered_reports = [r for r in filtered_reports if r["user_id"] == user_id]
-    
-    if status:
-        filtered_reports = [r for r in filtered_reports if r["status"] == status]
+        db_user_id = parse_id(user_id)
+        if db_user_id is None:
+            return []
     
-    # Sort by creation date (newest first)
-    filtered_reports.sort(key=lambda x: x["created_at"], reverse=True)
-    
-    return [BullyingReport(**report) for report in filtered_reports]
+    reports = await ReportRepository(session).list(user_id=db_user_id, status=status)
+    return [to_response(report) for report in reports]
 
 @router.get("/{report_id}", response_model=BullyingReport)
-async def get_report(report_id: str):
+async def get_report(report_id: str, session: AsyncSession = Depends(get_async_session)):
     """Get a specific report by ID."""
     
-    report = next((r for r in mock_reports if r["id"] == report_id), None)
-    
-    if not report:
-        raise HTTPException(status_code=404, detail="Report not found")
-    
-    return BullyingReport(**report)
+    report = await get_report_or_404(ReportRepository(session), report_id)
+    return to_response(report)
 
 @router.put("/{report_id}/status")
-async def update_report_status(report_id: str, update: ReportUpdate):
+async def update_report_status(report_id: str, update: ReportUpdate, session: AsyncSession = Depends(get_async_session)):
     """Update the status of a report (admin/staff only)."""
     
-    report = next((r for r in mock_reports if r["id"] == report_id), None)
-    
-    if not report:
-        raise HTTPException(status_code=404, detail="Report not found")
+    repository = ReportRepository(session)
+    report = await get_report_or_404(repository, report_id)
     
     valid_statuses = ["pending", "reviewed", "resolved"]
     if update.status not in valid_statuses:
@@ -108,39 +138,27 @@ async def update_report_status(report_id: str, update: ReportUpdate):
             detail=f"Invalid status. Must be one of: {', '.join(valid_statuses)}"
         )
     
-    report["status"] = update.status
+    await repository.set_status(report, update.status)
     
     # In a real app, send notification to user if not anonymous
-    if not report["is_anonymous"] and report["user_id"]:
-        await send_status_update_notification(report, update.notes)
+    if not report.is_anonymous and report.user_id:
+        await send_status_update_notification(to_response(report).model_dump(), update.notes)
     
     return {"message": "Report status updated successfully"}
 
 @router.get("/stats/summary")
-async def get_report_stats():
+async def get_report_stats(session: AsyncSession = Depends(get_async_session)):
     """Get summary statistics of all reports."""
     
-    total_reports = len(mock_reports)
-    anonymous_reports = len([r for r in mock_reports if r["is_anonymous"]])
-    
-    status_counts = {}
-    for report in mock_reports:
-        status = report["status"]
-        status_counts[status] = status_counts.get(status, 0) + 1
-    
-    # Recent activity (last 30 days)
-    from datetime import timedelta
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    recent_reports = [
-        r for r in mock_reports 
-        if datetime.fromisoformat(r["created_at"]) > thirty_days_ago
-    ]
+    stats = await ReportRepository(session).stats()
+    total_reports = stats["total"]
+    status_counts = stats["status_counts"]
     
     return {
         "total_reports": total_reports,
-        "anonymous_reports": anonymous_reports,
+        "anonymous_reports": stats["anonymous"],
         "status_breakdown": status_counts,
-        "recent_reports_30_days": len(recent_reports),
+        "recent_reports_30_days": stats["recent_30_days"],
         "resolution_rate": (
             status_counts.get("resolved", 0) / total_reports * 100 
             if total_reports > 0 else 0
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from ...models.resource import LearningResource as LearningResourceRow
+from ...repositories import ResourceRepository
+from ...services.database import get_async_session
+from ...utils.validation import parse_id
 
 router = APIRouter()
 
@@ -16,8 +22,8 @@ class LearningResource(BaseModel):
     duration: Optional[int] = None
     thumbnail_url: Optional[str] = None
 
-# Mock learning resources
-mock_resources = [
+# Resources the library starts with, added to an empty table on startup
+SEED_RESOURCES = [
     {
         "id": "1",
         "title": "What is Bullying?",
@@ -422,37 +428,51 @@ Challenge yourself to do one act of kindness every day. Watch how it transforms
     }
 ]
 
+def to_response(resource: LearningResourceRow) -> LearningResource:
+    return LearningResource(
+        id=str(resource.id),
+        title=resource.title,
+        description=resource.description,
+        type=resource.resource_type,
+        age_group=f"{resource.min_age}-{resource.max_age}",
+        category=resource.category,
+        content=resource.content,
+        duration=resource.duration_minutes,
+        thumbnail_url=resource.external_url or ""
+    )
+
+async def get_resource_or_404(repository: ResourceRepository, resource_id: str) -> LearningResourceRow:
+    db_id = parse_id(resource_id)
+    resource = await repository.get(db_id) if db_id is not None else None
+    if not resource:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    return resource
+
 @router.get("/", response_model=List[LearningResource])
 async def get_resources(
     category: Optional[str] = None,
     type: Optional[str] = None,
-    age_group: Optional[str] = None
+    age_group: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Get learning resources with optional filtering."""
     
-    filtered_resources = mock_resources
-    
-    if category:
-        filtered_resources = [r for r in filtered_resources if r["category"] == category]
-    
-    if type:
-        filtered_resources = [r for r in filtered_resources if r["type"] == type]
+    resources = [
+        to_response(resource)
+        for resource in await ResourceRepository(session).list(category=category, resource_type=type)
+    ]
     
     if age_group:
-        filtered_resources = [r for r in filtered_resources if age_group in r["age_group"]]
+        resources = [r for r in resources if age_group in r.age_group]
     
-    return [LearningResource(**resource) for resource in filtered_resources]
+    return resources
 
 @router.get("/{resource_id}", response_model=LearningResource)
-async def get_resource(resource_id: str):
+async def get_resource(resource_id: str, session: AsyncSession = Depends(get_async_session)):
     """Get a specific learning resource by ID."""
     
-    resource = next((r for r in mock_resources if r["id"] == resource_id), None)
-    
-    if not resource:
-        raise HTTPException(status_code=404, detail="Resource not found")
-    
-    return LearningResource(**resource)
+    resource = await get_resource_or_404(ResourceRepository(session), resource_id)
+    return to_response(resource)
 
 @router.get("/categories/list")
 async def get_categories():
@@ -488,47 +508,78 @@ async def get_categories():
     }
 
 @router.post("/{resource_id}/complete")
-async def mark_resource_complete(resource_id: str, user_id: str):
+async def mark_resource_complete(resource_id: str, user_id: str, session: AsyncSession = Depends(get_async_session)):
     """Mark a resource as completed by a user."""
     
-    resource = next((r for r in mock_resources if r["id"] == resource_id), None)
+    repository = ResourceRepository(session)
+    resource = await get_resource_or_404(repository, resource_id)
     
-    if not resource:
-        raise HTTPException(status_code=404, detail="Resource not found")
+    db_user_id = parse_id(user_id)
+    if db_user_id is None:
+        raise HTTPException(status_code=400, detail="Invalid user_id")
+    
+    try:
+        progress = await repository.mark_complete(resource.id, db_user_id)
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    # In production, store completion in database
     return {
         "message": "Resource marked as completed",
         "resource_id": resource_id,
         "user_id": user_id,
-        "completed_at": datetime.now().isoformat()
+        "completed_at": progress.completed_at.isoformat()
     }
 
+def calculate_learning_streak(completed: List[Dict]) -> int:
+    """Consecutive days, up to today, with at least one completed resource."""
+    days = {item["completed_at"].date() for item in completed if item["completed_at"]}
+    streak = 0
+    current_date = datetime.utcnow().date()
+    while current_date in days:
+        streak += 1
+        current_date -= timedelta(days=1)
+    return streak
+
+def earned_achievements(completed: List[Dict]) -> List[Dict]:
+    achievements = []
+    if completed:
+        achievements.append({
+            "id": "first_complete",
+            "title": "First Steps",
+            "description": "Completed your first learning resource",
+            "earned_at": completed[0]["completed_at"].isoformat()
+        })
+    emotional = [item for item in completed if item["category"] == "emotional-support"]
+    if len(emotional) >= 3:
+        achievements.append({
+            "id": "emotional_learner",
+            "title": "Emotional Intelligence",
+            "description": "Completed 3 emotional support resources",
+            "earned_at": emotional[2]["completed_at"].isoformat()
+        })
+    return achievements
+
 @router.get("/user/{user_id}/progress")
-async def get_user_progress(user_id: str):
+async def get_user_progress(user_id: str, session: AsyncSession = Depends(get_async_session)):
     """Get learning progress for a specific user."""
     
-    # Mock progress data
+    repository = ResourceRepository(session)
+    total_resources = await repository.count()
+    db_user_id = parse_id(user_id)
+    completed = await repository.completed(db_user_id) if db_user_id is not None else []
+    
+    category_counts = {}
+    for item in completed:
+        category_counts[item["category"]] = category_counts.get(item["category"], 0) + 1
+    favorite_categories = sorted(category_counts, key=category_counts.get, reverse=True)[:2]
+    
     return {
         "user_id": user_id,
-        "total_resources": len(mock_resources),
-        "completed_resources": 2,
-        "completion_percentage": 40,
-        "favorite_categories": ["emotional-support", "self-confidence"],
-        "learning_streak": 5,
-        "total_learning_time": 45,  # minutes
-        "achievements": [
-            {
-                "id": "first_complete",
-                "title": "First Steps",
-                "description": "Completed your first learning resource",
-                "earned_at": "2024-01-15T10:00:00Z"
-            },
-            {
-                "id": "emotional_learner",
-                "title": "Emotional Intelligence",
-                "description": "Completed 3 emotional support resources",
-                "earned_at": "2024-01-20T14:30:00Z"
-            }
-        ]
-    }
\ No newline at end of file
+        "total_resources": total_resources,
+        "completed_resources": len(completed),
+        "completion_percentage": round(len(completed) / total_resources * 100) if total_resources else 0,
+        "favorite_categories": favorite_categories,
+        "learning_streak": calculate_learning_streak(completed),
+        "total_learning_time": sum(item["duration"] for item in completed),  # minutes
+        "achievements": earned_achievements(completed)
+    }
@@ -19,6 +19,11 @@ class Settings(BaseSettings):
     
     # Database settings
     DATABASE_URL: str = ""
+    LOCAL_DATABASE_URL: str = "sqlite+aiosqlite:///./anti_bullying.db"  # used when DATABASE_URL is empty
+    DB_POOL_SIZE: int = 10  # per worker process
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
     SUPABASE_URL: str = ""
     SUPABASE_ANON_KEY: str = ""
     SUPABASE_SERVICE_KEY: str = ""
@@ -32,6 +37,14 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = ""
     OPENAI_MODEL: str = "gpt-3.5-turbo"
     MAX_CHAT_HISTORY: int = 50
+    OPENAI_BASE_URL: str = ""
+    OPENAI_TIMEOUT_SECONDS: float = 20.0
+    OPENAI_MAX_CONCURRENCY: int = 16
+    OPENAI_ASYNC_MAX_CONCURRENCY: int = 256
+    OPENAI_MAX_RETRIES: int = 2
+    OPENAI_SLOW_CALL_SECONDS: float = 8.0
+    OPENAI_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    OPENAI_CIRCUIT_RESET_SECONDS: float = 30.0
     
     # Notification settings
     SENDGRID_API_KEY: str = ""
@@ -56,6 +69,8 @@ class Settings(BaseSettings):
     
     # Emergency contacts
     EMERGENCY_NOTIFICATION_ENABLED: bool = True
+    EMERGENCY_ALERT_DEADLINE_SECONDS: float = 10.0  # per delivery, counted from the trigger
+    NOTIFICATION_MAX_WORKERS: int = 16  # concurrent provider calls
     EMERGENCY_KEYWORDS: List[str] = [
         "suicide", "kill myself", "hurt myself", "end it all",
         "want to die", "self harm", "cutting", "overdose"
@@ -70,6 +85,13 @@ class Settings(BaseSettings):
         r'\bSSN\s*:?\s*\d{3}-?\d{2}-?\d{4}\b'  # Social Security Numbers
     ]
     
+    # Contact details that get a chat message rejected outright
+    CONTACT_INFO_PATTERNS: List[str] = [
+        r'\b\d{3}-\d{3}-\d{4}\b',  # Phone numbers
+        r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',  # Email addresses
+        r'\b\d{1,5}\s+\w+\s+(street|st|avenue|ave|road|rd|drive|dr|lane|ln)\b',  # Addresses
+    ]
+    
     INAPPROPRIATE_CONTENT_KEYWORDS: List[str] = [
         "explicit", "inappropriate", "sexual", "violent", "illegal",
         "drugs", "alcohol", "weapons", "hate speech"
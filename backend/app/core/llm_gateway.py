@@ -0,0 +1,365 @@
+"""
+Shared gateway for OpenAI chat completions.
+
+Used by both the FastAPI backend and simple_app.py so every call goes through
+one pooled keep-alive HTTP client with the same deadline, concurrency, retry
+and circuit-breaker rules. When the gateway can't get an answer in time it
+raises ``LLMUnavailableError`` and callers drop to their canned fallbacks.
+``AsyncLLMGateway`` is the non-blocking flavour for FastAPI handlers.
+
+This module only depends on ``openai`` and ``httpx`` so it can be imported
+without the rest of the backend.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(Exception):
+    """The model could not be reached within the call's budget."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Upstream has been failing or slow, so calls are short-circuited."""
+
+
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failed or slow calls.
+
+    While open every call is refused until ``reset_timeout`` has passed, then a
+    single trial call is let through (half-open); its outcome closes or re-opens
+    the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """True while calls are being refused outright."""
+        return self.state == self.OPEN and self.clock() - self.opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("LLM circuit opened after %s failures", self.failures)
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class _GatewayBase:
+    """Settings and circuit-breaker bookkeeping shared by the sync and async gateways."""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        timeout: float = 20.0,
+        connect_timeout: float = 3.0,
+        max_concurrency: int = 16,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 2.0,
+        slow_call_threshold: Optional[float] = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_connections: Optional[int] = None,
+        base_url: Optional[str] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url or None
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.slow_call_threshold = slow_call_threshold
+        self.max_connections = max_connections or max_concurrency
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def available(self) -> bool:
+        """False while the circuit is open, so callers can go straight to a fallback."""
+        return self.configured and not self.breaker.is_open()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _http_options(self) -> dict:
+        return {
+            "timeout": httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=60.0,
+            ),
+        }
+
+    def _check_open(self) -> None:
+        if not self.configured:
+            raise LLMUnavailableError("OpenAI API key not configured")
+        if self.breaker.is_open():
+            raise CircuitOpenError("LLM circuit is open")
+
+    def _retry_delay(self, error: Exception, attempt: int, expires: float) -> float:
+        """Record a retryable failure and return how long to wait, or raise if out of budget."""
+        self.breaker.record_failure()
+        delay = self.backoff(attempt)
+        if attempt >= self.max_retries or not self.breaker.allow() \
+                or time.monotonic() + delay >= expires:
+            raise LLMUnavailableError(str(error)) from error
+        logger.info("Retrying LLM call in %.2fs after %s", delay, type(error).__name__)
+        return delay
+
+    def _record_elapsed(self, started: float) -> None:
+        elapsed = time.monotonic() - started
+        if self.slow_call_threshold is not None and elapsed > self.slow_call_threshold:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _remaining(self, expires: float) -> float:
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            self.breaker.record_failure()
+            raise LLMUnavailableError("LLM call deadline exceeded")
+        return remaining
+
+
+class LLMGateway(_GatewayBase):
+    """Blocking gateway, for Flask views and other threaded callers."""
+
+    def __init__(self, api_key: Optional[str], **options):
+        super().__init__(api_key, **options)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    @property
+    def client(self) -> OpenAI:
+        """OpenAI client sharing one keep-alive connection pool, built on first use."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # Retries are handled here so they respect the call deadline
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        http_client=httpx.Client(**self._http_options()),
+                        max_retries=0,
+                    )
+        return self._client
+
+    def create(self, deadline: Optional[float] = None, **params):
+        """Run ``chat.completions.create(**params)`` within ``deadline`` seconds.
+
+        ``deadline`` is the total budget for queueing, every attempt and the
+        backoff between them; it defaults to the gateway ``timeout``. With
+        ``stream=True`` the returned iterator holds a concurrency slot until it
+        is exhausted. Raises ``LLMUnavailableError`` when no answer is possible.
+        """
+        self._check_open()
+        budget = deadline if deadline is not None else self.timeout
+        expires = time.monotonic() + budget
+        if not self._slots.acquire(timeout=budget):
+            raise LLMUnavailableError("Too many LLM calls in flight")
+        if not self.breaker.allow():
+            self._slots.release()
+            raise CircuitOpenError("LLM circuit is open")
+
+        try:
+            result = self._call_with_retries(expires, params)
+        except BaseException:
+            self._slots.release()
+            raise
+        if not params.get("stream"):
+            self._slots.release()
+            return result
+        return _SlotStream(result, self._slots.release)
+
+    def _call_with_retries(self, expires: float, params: dict):
+        attempt = 0
+        while True:
+            remaining = self._remaining(expires)
+            started = time.monotonic()
+            try:
+                result = self.client.chat.completions.create(timeout=remaining, **params)
+            except RETRYABLE_ERRORS as e:
+                time.sleep(self._retry_delay(e, attempt, expires))
+                attempt += 1
+                continue
+            except openai.APIStatusError:
+                # 4xx: upstream answered promptly, the request itself was bad
+                self.breaker.record_success()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            self._record_elapsed(started)
+            return result
+
+
+class AsyncLLMGateway(_GatewayBase):
+    """Non-blocking gateway for FastAPI handlers.
+
+    Same rules as ``LLMGateway``, but waits on the event loop instead of a
+    thread, so one worker can keep many chats in flight. Use it from a single
+    event loop (one instance per uvicorn worker).
+    """
+
+    def __init__(self, api_key: Optional[str], max_concurrency: int = 256, **options):
+        super().__init__(api_key, max_concurrency=max_concurrency, **options)
+        self._slots = asyncio.BoundedSemaphore(self.max_concurrency)
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=httpx.AsyncClient(**self._http_options()),
+                max_retries=0,
+            )
+        return self._client
+
+    async def create(self, deadline: Optional[float] = None, **params):
+        """Async counterpart of ``LLMGateway.create``."""
+        self._check_open()
+        budget = deadline if deadline is not None else self.timeout
+        expires = time.monotonic() + budget
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=budget)
+        except asyncio.TimeoutError:
+            raise LLMUnavailableError("Too many LLM calls in flight")
+        if not self.breaker.allow():
+            self._slots.release()
+            raise CircuitOpenError("LLM circuit is open")
+
+        try:
+            result = await self._call_with_retries(expires, params)
+        except BaseException:
+            self._slots.release()
+            raise
+        if not params.get("stream"):
+            self._slots.release()
+            return result
+        return _AsyncSlotStream(result, self._slots.release)
+
+    async def _call_with_retries(self, expires: float, params: dict):
+        attempt = 0
+        while True:
+            remaining = self._remaining(expires)
+            started = time.monotonic()
+            try:
+                result = await self.client.chat.completions.create(timeout=remaining, **params)
+            except RETRYABLE_ERRORS as e:
+                await asyncio.sleep(self._retry_delay(e, attempt, expires))
+                attempt += 1
+                continue
+            except openai.APIStatusError:
+                self.breaker.record_success()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            self._record_elapsed(started)
+            return result
+
+
+class _SlotStream:
+    """Streamed completion that gives its concurrency slot back once finished."""
+
+    def __init__(self, stream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self) -> Iterator:
+        try:
+            yield from self._stream
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __del__(self):
+        self.close()
+
+
+class _AsyncSlotStream:
+    """Async streamed completion that gives its concurrency slot back once finished."""
+
+    def __init__(self, stream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator:
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __del__(self):
+        self.close()
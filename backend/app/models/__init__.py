@@ -1,5 +1,5 @@
 from .user import User
-from .mood import MoodEntry
+from .mood import MoodEntry, MoodSummary
 from .chat import ChatSession, ChatMessage
 from .report import BullyingReport
 from .resource import LearningResource, UserProgress
@@ -9,6 +9,7 @@ from .notification import EmergencyContact, NotificationLog
 __all__ = [
     "User",
     "MoodEntry", 
+    "MoodSummary",
     "ChatSession",
     "ChatMessage",
     "BullyingReport",
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, Text, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, Boolean, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from .base import Base, TimestampMixin
 
@@ -11,6 +11,7 @@ class CommunityStory(Base, TimestampMixin):
     content = Column(Text, nullable=False)
     
     is_anonymous = Column(Boolean, default=True)
+    author_name = Column(String(100), nullable=True)  # first name only, when not anonymous
     author_age = Column(Integer, nullable=True)
     
     status = Column(String(20), default="pending")
@@ -38,4 +39,9 @@ class StoryVote(Base, TimestampMixin):
     is_upvote = Column(Boolean, default=True)
     
     user = relationship("User", back_populates="story_votes")
-    story = relationship("CommunityStory", back_populates="votes")
\ No newline at end of file
+    story = relationship("CommunityStory", back_populates="votes")
+    
+    __table_args__ = (
+        # One vote per user and story; an Index so upgrade_schema adds it to existing tables
+        Index("ix_story_votes_story_id_user_id", "story_id", "user_id", unique=True),
+    )
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Date, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, Date, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base, TimestampMixin
 
@@ -17,5 +17,27 @@ class MoodEntry(Base, TimestampMixin):
     user = relationship("User", back_populates="mood_entries")
     
     __table_args__ = (
+        Index("ix_mood_entries_user_id_date", "user_id", "date"),
         {"schema": None}
-    )
\ No newline at end of file
+    )
+
+class MoodSummary(Base, TimestampMixin):
+    """Running totals for one user's mood entries, updated with every entry saved."""
+    __tablename__ = "mood_summaries"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    
+    entry_count = Column(Integer, nullable=False, default=0)
+    intensity_sum = Column(Integer, nullable=False, default=0)
+    mood_counts = Column(Text, nullable=False, default="{}")  # JSON object, mood -> count
+    
+    last_date = Column(Date, nullable=True)
+    last_entry_id = Column(Integer, nullable=True)
+    streak = Column(Integer, nullable=False, default=0)  # consecutive days ending at last_date
+    
+    recent = Column(Text, nullable=False, default="[]")  # JSON [[date, intensity], ...] of the latest 14 days
+    
+    # Bumped on every update, which only applies if nobody else updated the row first
+    version = Column(Integer, nullable=False, server_default="0")
+    
+    __mapper_args__ = {"version_id_col": version}
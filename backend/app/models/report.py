@@ -14,6 +14,7 @@ class BullyingReport(Base, TimestampMixin):
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=False)
     location = Column(String(255), nullable=True)
+    reported_to = Column(String(255), nullable=True)  # who the child already told, comma-separated
     incident_date = Column(DateTime(timezone=True), nullable=True)
     
     bully_name = Column(String(255), nullable=True)
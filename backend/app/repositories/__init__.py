@@ -0,0 +1,11 @@
+from .mood import MoodRepository
+from .reports import ReportRepository
+from .community import StoryRepository
+from .resources import ResourceRepository
+
+__all__ = [
+    "MoodRepository",
+    "ReportRepository",
+    "StoryRepository",
+    "ResourceRepository"
+]
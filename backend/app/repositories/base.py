@@ -0,0 +1,25 @@
+from typing import Dict, List
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+async def insert_seed_rows(session: AsyncSession, model, rows: List[Dict]) -> None:
+    """Insert rows with fixed ids, skipping ids already there.
+
+    Several workers can seed at once: whichever inserts an id first wins and
+    the others skip it instead of failing. Postgres doesn't move a serial
+    sequence on for explicit ids, so it is set past the largest one.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    dialect = session.bind.dialect.name
+    insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    await session.execute(insert(table).values(rows).on_conflict_do_nothing(index_elements=["id"]))
+    if dialect == "postgresql":
+        await session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"(SELECT MAX(id) FROM {table.name}))"
+        ))
+    await session.commit()
@@ -0,0 +1,111 @@
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.community import CommunityStory, StoryVote
+from .base import insert_seed_rows
+
+APPROVED = "approved"
+
+class StoryRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+    
+    async def seed(self, stories: List[Dict]) -> None:
+        """Add the built-in stories to an empty table, numbered from 1."""
+        if await self.session.scalar(select(func.count(CommunityStory.id))):
+            return
+        rows = []
+        for story_id, story in enumerate(stories, 1):
+            created_at = datetime.fromisoformat(story["created_at"].replace("Z", "+00:00"))
+            rows.append(dict(
+                id=story_id,
+                title=story["title"],
+                content=story["content"],
+                author_age=story["author_age"],
+                is_anonymous=story["is_anonymous"],
+                author_name=story["author_name"],
+                upvotes=story["upvotes"],
+                status=APPROVED if story["is_moderated"] else "pending",
+                tags=json.dumps(story["tags"]),
+                created_at=created_at,
+                approved_at=created_at if story["is_moderated"] else None,
+            ))
+        await insert_seed_rows(self.session, CommunityStory, rows)
+    
+    async def list(self, limit: int, tag: Optional[str] = None, moderated_only: bool = True) -> List[CommunityStory]:
+        """Most upvoted first, then newest."""
+        query = select(CommunityStory)
+        if moderated_only:
+            query = query.where(CommunityStory.status == APPROVED)
+        if tag:
+            # tags is a JSON array of strings
+            query = query.where(CommunityStory.tags.contains(json.dumps(tag), autoescape=True))
+        result = await self.session.execute(
+            query.order_by(CommunityStory.upvotes.desc(), CommunityStory.created_at.desc()).limit(limit)
+        )
+        return list(result.scalars())
+    
+    async def create(self, **fields) -> CommunityStory:
+        story = CommunityStory(status="pending", upvotes=0, **fields)
+        self.session.add(story)
+        await self.session.commit()
+        await self.session.refresh(story)
+        return story
+    
+    async def get(self, story_id: int) -> Optional[CommunityStory]:
+        return await self.session.get(CommunityStory, story_id)
+    
+    async def upvote(self, story_id: int, user_id: int) -> Tuple[bool, int]:
+        """Count one upvote per user. Returns whether this one counted and the new total.
+
+        The unique (story_id, user_id) index turns a repeat vote, even a
+        concurrent one from another worker, into an IntegrityError.
+        """
+        counted = False
+        try:
+            self.session.add(StoryVote(story_id=story_id, user_id=user_id, is_upvote=True))
+            await self.session.flush()
+            # In the database, so concurrent votes from other workers add up
+            await self.session.execute(
+                update(CommunityStory)
+                .where(CommunityStory.id == story_id)
+                .values(upvotes=CommunityStory.upvotes + 1)
+            )
+            await self.session.commit()
+            counted = True
+        except IntegrityError:
+            await self.session.rollback()
+        total = await self.session.scalar(select(CommunityStory.upvotes).where(CommunityStory.id == story_id))
+        return counted, total or 0
+    
+    async def approved_tags(self) -> List[List[str]]:
+        result = await self.session.execute(
+            select(CommunityStory.tags).where(CommunityStory.status == APPROVED)
+        )
+        return [json.loads(tags) if tags else [] for tags in result.scalars()]
+    
+    async def stats(self) -> Dict:
+        age = CommunityStory.author_age
+        month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        row = (await self.session.execute(
+            select(
+                func.count(CommunityStory.id),
+                func.coalesce(func.sum(CommunityStory.upvotes), 0),
+                func.count(CommunityStory.id).filter(CommunityStory.is_anonymous.is_(True)),
+                func.count(CommunityStory.id).filter(CommunityStory.created_at >= month_start),
+                func.count(CommunityStory.id).filter(age <= 10),
+                func.count(CommunityStory.id).filter(age.between(11, 13)),
+                func.count(CommunityStory.id).filter(age.between(14, 16)),
+                func.count(CommunityStory.id).filter(age >= 17),
+            ).where(CommunityStory.status == APPROVED)
+        )).one()
+        return {
+            "total": row[0],
+            "upvotes": row[1],
+            "anonymous": row[2],
+            "this_month": row[3],
+            "age_distribution": {"7-10": row[4], "11-13": row[5], "14-16": row[6], "17+": row[7]},
+        }
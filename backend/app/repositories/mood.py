@@ -0,0 +1,185 @@
+import json
+from datetime import date, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+from ..models.mood import MoodEntry, MoodSummary
+
+# Days of (date, intensity) kept on the summary for the trend
+RECENT_DAYS = 14
+# Tries at saving an entry while other saves for the same user keep getting in first
+SAVE_ATTEMPTS = 5
+
+class MoodRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+    
+    async def get_for_date(self, user_id: int, day: date) -> Optional[MoodEntry]:
+        result = await self.session.execute(
+            select(MoodEntry)
+            .where(MoodEntry.user_id == user_id, MoodEntry.date == day)
+            .order_by(MoodEntry.id.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+    
+    async def get(self, entry_id: int) -> Optional[MoodEntry]:
+        return await self.session.get(MoodEntry, entry_id)
+    
+    async def save_for_date(self, user_id: int, day: date, mood: str, intensity: int, notes: Optional[str]) -> MoodEntry:
+        """Keep one entry per user per day: update that day's entry, or add it.
+
+        The user's ``MoodSummary`` is updated in the same transaction. Its
+        version column makes the update fail if another save for the user
+        committed in between (FOR UPDATE does nothing on SQLite), and the
+        whole save then starts over from the new totals. Raises
+        ``StaleDataError`` if that keeps happening.
+        """
+        for attempt in range(SAVE_ATTEMPTS):
+            try:
+                return await self._save_for_date(user_id, day, mood, intensity, notes)
+            except (IntegrityError, StaleDataError):
+                # Another save got in first (for IntegrityError, possibly by
+                # creating the user's summary); a missing user fails every time
+                await self.session.rollback()
+                if attempt == SAVE_ATTEMPTS - 1:
+                    raise
+    
+    async def _save_for_date(self, user_id: int, day: date, mood: str, intensity: int, notes: Optional[str]) -> MoodEntry:
+        # Locking the summary row serialises writes for the same user where the database supports it
+        summary = await self.session.scalar(
+            select(MoodSummary).where(MoodSummary.user_id == user_id).with_for_update()
+        )
+        entry = await self.get_for_date(user_id, day)
+        previous = None
+        if entry is None:
+            entry = MoodEntry(user_id=user_id, date=day, mood_type=mood, intensity=intensity, notes=notes)
+            self.session.add(entry)
+            await self.session.flush()
+        else:
+            previous = (entry.mood_type, entry.intensity)
+            entry.mood_type = mood
+            entry.intensity = intensity
+            entry.notes = notes
+        
+        if summary is None:
+            self.session.add(await self._build_summary(user_id))
+        else:
+            await self._apply(summary, entry, previous)
+        await self.session.commit()
+        await self.session.refresh(entry)
+        return entry
+    
+    async def page(self, user_id: int, limit: int, before: Optional[Tuple[date, int]] = None) -> Tuple[List[MoodEntry], Optional[Tuple[date, int]]]:
+        """Newest days first, from just after ``before`` (a (date, id) key); also returns the key to continue from."""
+        query = select(MoodEntry).where(MoodEntry.user_id == user_id)
+        if before is not None:
+            query = query.where(tuple_(MoodEntry.date, MoodEntry.id) < before)
+        # Served by ix_mood_entries_user_id_date, id breaks ties within a day
+        result = await self.session.execute(
+            query.order_by(MoodEntry.date.desc(), MoodEntry.id.desc()).limit(limit + 1)
+        )
+        entries = list(result.scalars())
+        last = entries[limit - 1] if len(entries) > limit else None
+        return entries[:limit], (last.date, last.id) if last else None
+    
+    async def get_summary(self, user_id: int) -> Optional[MoodSummary]:
+        """The user's running totals, or None if they have no entries."""
+        summary = await self.session.scalar(select(MoodSummary).where(MoodSummary.user_id == user_id))
+        if summary is not None:
+            return summary
+        if await self.session.scalar(select(MoodEntry.id).where(MoodEntry.user_id == user_id).limit(1)) is None:
+            return None
+        # Entries saved before summaries were kept
+        summary = await self._build_summary(user_id)
+        self.session.add(summary)
+        try:
+            await self.session.commit()
+        except IntegrityError:
+            await self.session.rollback()
+            summary = await self.session.scalar(select(MoodSummary).where(MoodSummary.user_id == user_id))
+        return summary
+    
+    async def _days(self, user_id: int, until: Optional[date] = None) -> AsyncIterator[Tuple[date, int, int]]:
+        """(date, intensity, id) of each day with an entry, newest first."""
+        query = select(MoodEntry.date, MoodEntry.intensity, MoodEntry.id).where(MoodEntry.user_id == user_id)
+        if until is not None:
+            query = query.where(MoodEntry.date <= until)
+        result = await self.session.stream(query.order_by(MoodEntry.date.desc(), MoodEntry.id.desc()))
+        last_day = None
+        async for day, intensity, entry_id in result:
+            if day != last_day:
+                last_day = day
+                yield day, intensity, entry_id
+    
+    async def _streak_until(self, user_id: int, last_date: date) -> int:
+        streak = 0
+        async for day, _, _ in self._days(user_id, last_date):
+            if day != last_date - timedelta(days=streak):
+                break
+            streak += 1
+        return streak
+    
+    async def _build_summary(self, user_id: int) -> MoodSummary:
+        """Work a user's summary out from all of their entries."""
+        count, intensity_sum = (await self.session.execute(
+            select(func.count(MoodEntry.id), func.coalesce(func.sum(MoodEntry.intensity), 0))
+            .where(MoodEntry.user_id == user_id)
+        )).one()
+        mood_counts = dict((await self.session.execute(
+            select(MoodEntry.mood_type, func.count(MoodEntry.id))
+            .where(MoodEntry.user_id == user_id)
+            .group_by(MoodEntry.mood_type)
+        )).all())
+        summary = MoodSummary(
+            user_id=user_id,
+            entry_count=count,
+            intensity_sum=intensity_sum,
+            mood_counts=json.dumps(mood_counts),
+            streak=0,
+        )
+        recent = []
+        async for day, intensity, entry_id in self._days(user_id):
+            recent.append([day.isoformat(), intensity])
+            if len(recent) >= RECENT_DAYS:
+                break
+        if recent:
+            summary.last_date = date.fromisoformat(recent[0][0])
+            summary.last_entry_id = await self.session.scalar(
+                select(func.max(MoodEntry.id)).where(MoodEntry.user_id == user_id, MoodEntry.date == summary.last_date)
+            )
+            summary.streak = await self._streak_until(user_id, summary.last_date)
+        summary.recent = json.dumps(recent)
+        return summary
+    
+    async def _apply(self, summary: MoodSummary, entry: MoodEntry, previous: Optional[Tuple[str, int]]) -> None:
+        """Fold a saved entry into the summary; ``previous`` is the (mood, intensity) it replaced."""
+        mood_counts: Dict[str, int] = json.loads(summary.mood_counts)
+        if previous is None:
+            summary.entry_count += 1
+            summary.intensity_sum += entry.intensity
+        else:
+            old_mood, old_intensity = previous
+            summary.intensity_sum += entry.intensity - old_intensity
+            mood_counts[old_mood] = mood_counts.get(old_mood, 1) - 1
+            if mood_counts[old_mood] <= 0:
+                del mood_counts[old_mood]
+        mood_counts[entry.mood_type] = mood_counts.get(entry.mood_type, 0) + 1
+        summary.mood_counts = json.dumps(mood_counts)
+        
+        day = entry.date.isoformat()
+        recent = [item for item in json.loads(summary.recent) if item[0] != day]
+        recent.append([day, entry.intensity])
+        recent.sort(key=lambda item: item[0], reverse=True)
+        summary.recent = json.dumps(recent[:RECENT_DAYS])
+        
+        if summary.last_date is None or entry.date > summary.last_date:
+            continues = summary.last_date is not None and entry.date - summary.last_date == timedelta(days=1)
+            summary.streak = summary.streak + 1 if continues else 1
+            summary.last_date = entry.date
+            summary.last_entry_id = entry.id
+        elif previous is None and entry.date == summary.last_date - timedelta(days=summary.streak):
+            # A back-filled day just before the run, which may join it to an older one
+            summary.streak = await self._streak_until(summary.user_id, summary.last_date)
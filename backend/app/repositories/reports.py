@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.report import BullyingReport
+
+class ReportRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+    
+    async def create(self, **fields) -> BullyingReport:
+        report = BullyingReport(**fields)
+        self.session.add(report)
+        await self.session.commit()
+        await self.session.refresh(report)
+        return report
+    
+    async def get(self, report_id: int) -> Optional[BullyingReport]:
+        return await self.session.get(BullyingReport, report_id)
+    
+    async def list(self, user_id: Optional[int] = None, status: Optional[str] = None) -> List[BullyingReport]:
+        """Newest first."""
+        query = select(BullyingReport)
+        if user_id is not None:
+            query = query.where(BullyingReport.user_id == user_id)
+        if status:
+            query = query.where(BullyingReport.status == status)
+        result = await self.session.execute(query.order_by(BullyingReport.id.desc()))
+        return list(result.scalars())
+    
+    async def set_status(self, report: BullyingReport, status: str) -> None:
+        report.status = status
+        if status == "resolved":
+            report.resolved_at = datetime.utcnow()
+        await self.session.commit()
+    
+    async def stats(self) -> Dict:
+        total, anonymous, recent = (await self.session.execute(
+            select(
+                func.count(BullyingReport.id),
+                func.count(BullyingReport.id).filter(BullyingReport.is_anonymous.is_(True)),
+                func.count(BullyingReport.id).filter(BullyingReport.created_at > datetime.utcnow() - timedelta(days=30)),
+            )
+        )).one()
+        by_status = await self.session.execute(
+            select(BullyingReport.status, func.count(BullyingReport.id)).group_by(BullyingReport.status)
+        )
+        return {
+            "total": total,
+            "anonymous": anonymous,
+            "recent_30_days": recent,
+            "status_counts": {status: count for status, count in by_status},
+        }
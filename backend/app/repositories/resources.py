@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.resource import LearningResource, UserProgress
+from .base import insert_seed_rows
+
+class ResourceRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+    
+    async def seed(self, resources: List[Dict]) -> None:
+        """Add the built-in resources to an empty table, under their fixed ids."""
+        if await self.count():
+            return
+        rows = []
+        for resource in resources:
+            min_age, _, max_age = resource["age_group"].partition("-")
+            rows.append(dict(
+                id=int(resource["id"]),
+                title=resource["title"],
+                description=resource["description"],
+                content=resource["content"],
+                resource_type=resource["type"],
+                category=resource["category"],
+                min_age=int(min_age),
+                max_age=int(max_age or min_age),
+                duration_minutes=resource.get("duration"),
+                external_url=resource.get("thumbnail_url") or None,
+            ))
+        await insert_seed_rows(self.session, LearningResource, rows)
+    
+    async def count(self) -> int:
+        return await self.session.scalar(
+            select(func.count(LearningResource.id)).where(LearningResource.is_published.is_(True))
+        )
+    
+    async def list(self, category: Optional[str] = None, resource_type: Optional[str] = None) -> List[LearningResource]:
+        query = select(LearningResource).where(LearningResource.is_published.is_(True))
+        if category:
+            query = query.where(LearningResource.category == category)
+        if resource_type:
+            query = query.where(LearningResource.resource_type == resource_type)
+        result = await self.session.execute(query.order_by(LearningResource.id))
+        return list(result.scalars())
+    
+    async def get(self, resource_id: int) -> Optional[LearningResource]:
+        resource = await self.session.get(LearningResource, resource_id)
+        return resource if resource is not None and resource.is_published else None
+    
+    async def mark_complete(self, resource_id: int, user_id: int) -> UserProgress:
+        progress = await self.session.scalar(
+            select(UserProgress).where(UserProgress.resource_id == resource_id, UserProgress.user_id == user_id)
+        )
+        now = datetime.utcnow()
+        if progress is None:
+            progress = UserProgress(resource_id=resource_id, user_id=user_id, started_at=now)
+            self.session.add(progress)
+        if not progress.is_completed:
+            progress.is_completed = True
+            progress.progress_percentage = 100
+            progress.completed_at = now
+        await self.session.commit()
+        return progress
+    
+    async def completed(self, user_id: int) -> List[Dict]:
+        """The user's completed resources, oldest completion first."""
+        result = await self.session.execute(
+            select(LearningResource.category, LearningResource.duration_minutes, UserProgress.completed_at)
+            .join(UserProgress, UserProgress.resource_id == LearningResource.id)
+            .where(UserProgress.user_id == user_id, UserProgress.is_completed.is_(True))
+            .order_by(UserProgress.completed_at)
+        )
+        return [
+            {"category": category, "duration": duration or 0, "completed_at": completed_at}
+            for category, duration, completed_at in result
+        ]
@@ -2,10 +2,12 @@ from .auth import AuthService
 from .database import DatabaseService
 from .ai import AIService
 from .notification import NotificationService
+from .safety import SafetyEngine
 
 __all__ = [
     "AuthService",
     "DatabaseService", 
     "AIService",
-    "NotificationService"
+    "NotificationService",
+    "SafetyEngine"
 ]
\ No newline at end of file
@@ -1,23 +1,42 @@
-import re
 import random
 from typing import List, Dict, Optional
-from openai import OpenAI
 from ..core.config import settings
+from ..core.llm_gateway import AsyncLLMGateway, LLMGateway
+from .safety import safety_engine
 import logging
 
 logger = logging.getLogger(__name__)
 
+_gateway_options = dict(
+    base_url=settings.OPENAI_BASE_URL,
+    timeout=settings.OPENAI_TIMEOUT_SECONDS,
+    max_retries=settings.OPENAI_MAX_RETRIES,
+    slow_call_threshold=settings.OPENAI_SLOW_CALL_SECONDS,
+    failure_threshold=settings.OPENAI_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.OPENAI_CIRCUIT_RESET_SECONDS,
+)
+
+# Blocking gateway for sync callers, async one for request handlers
+llm_gateway = LLMGateway(
+    settings.OPENAI_API_KEY,
+    max_concurrency=settings.OPENAI_MAX_CONCURRENCY,
+    **_gateway_options,
+)
+async_llm_gateway = AsyncLLMGateway(
+    settings.OPENAI_API_KEY,
+    max_concurrency=settings.OPENAI_ASYNC_MAX_CONCURRENCY,
+    **_gateway_options,
+)
+
 class AIService:
     def __init__(self):
         self.client = None
-        if settings.OPENAI_API_KEY:
-            self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        if llm_gateway.configured:
+            self.client = llm_gateway
         else:
             logger.warning("OpenAI API key not configured, using mock responses")
         
-        self.emergency_keywords = settings.EMERGENCY_KEYWORDS
-        self.personal_info_patterns = settings.PERSONAL_INFO_PATTERNS
-        self.inappropriate_content_keywords = settings.INAPPROPRIATE_CONTENT_KEYWORDS
+        self.safety_engine = safety_engine
     
     def process_message(self, message: str, user_age: int = 12) -> Dict:
         safety_check = self._check_message_safety(message)
@@ -56,39 +75,10 @@ class AIService:
         }
     
     def _check_message_safety(self, message: str) -> Dict:
-        message_lower = message.lower()
-        flags = []
-        
-        is_emergency = any(
-            keyword.lower() in message_lower 
-            for keyword in self.emergency_keywords
-        )
-        if is_emergency:
-            flags.append("emergency_keywords")
-        
-        contains_personal_info = any(
-            re.search(pattern, message, re.IGNORECASE) 
-            for pattern in self.personal_info_patterns
-        )
-        if contains_personal_info:
-            flags.append("personal_information")
-        
-        is_inappropriate = any(
-            keyword.lower() in message_lower 
-            for keyword in self.inappropriate_content_keywords
-        )
-        if is_inappropriate:
-            flags.append("inappropriate_content")
-        
-        return {
-            "is_emergency": is_emergency,
-            "contains_personal_info": contains_personal_info,
-            "is_inappropriate": is_inappropriate,
-            "flags": flags
-        }
+        return self.safety_engine.check_message(message)
     
     def _generate_response(self, message: str, user_age: int) -> str:
-        if self.client:
+        if self.client and self.client.available():
             return self._generate_openai_response(message, user_age)
         else:
             return self._generate_mock_response(message)
@@ -108,7 +98,7 @@ Age-appropriate considerations:
 
 Never provide specific personal information, locations, or contact details beyond general resources."""
 
-            response = self.client.chat.completions.create(
+            response = self.client.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -1,5 +1,9 @@
-from sqlalchemy import create_engine
+from typing import AsyncIterator
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from ..core.config import settings
 import logging
@@ -56,4 +60,91 @@ def get_db():
         finally:
             db.close()
     else:
-        yield None
\ No newline at end of file
+        yield None
+
+# Async drivers for the URL schemes DATABASE_URL is usually given in
+ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    """DATABASE_URL with an async driver, or the local SQLite fallback when it isn't set."""
+    if not url:
+        return settings.LOCAL_DATABASE_URL
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False) if driver else url
+
+def upgrade_schema(connection, metadata) -> None:
+    """Create missing tables, then add columns and indexes newer than an existing table.
+
+    ``create_all`` leaves tables that already exist alone, so a model column
+    added later (e.g. ``bullying_reports.reported_to``) is added here with
+    ALTER TABLE. Only nullable columns or ones with a server default can be
+    added this way. An index that can't be built (e.g. a unique one over
+    duplicate rows) is logged and skipped. Safe to run on every startup.
+    """
+    metadata.create_all(connection)
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    ddl = connection.dialect.ddl_compiler(connection.dialect, None)
+    for table in metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                logger.error(f"Cannot add required column {table.name}.{column.name} to an existing table")
+                continue
+            connection.exec_driver_sql(
+                f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl.get_column_specification(column)}"
+            )
+            logger.info(f"Added column {table.name}.{column.name}")
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in indexes:
+                continue
+            try:
+                # Own savepoint: a unique index fails on rows that already break it
+                with connection.begin_nested():
+                    index.create(connection)
+                logger.info(f"Added index {index.name}")
+            except DBAPIError as e:
+                logger.error(f"Cannot add index {index.name} to {table.name}: {e}")
+
+class AsyncDatabaseService:
+    """Async engine and sessions for the FastAPI routes, so handlers never block on the database."""
+
+    def __init__(self):
+        url = async_database_url(settings.DATABASE_URL)
+        options = {"pool_pre_ping": True}
+        if not url.startswith("sqlite"):
+            options.update(
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+                pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            )
+        self.engine = create_async_engine(url, **options)
+        self.SessionLocal = async_sessionmaker(self.engine, expire_on_commit=False)
+        if not settings.DATABASE_URL:
+            logger.warning(f"DATABASE_URL not configured, storing data in {url}")
+    
+    async def create_tables(self):
+        from .. import models  # noqa: F401 - registers every table on Base.metadata
+        from ..models.base import Base
+        async with self.engine.begin() as conn:
+            await conn.run_sync(upgrade_schema, Base.metadata)
+        logger.info("Database tables ready")
+    
+    async def dispose(self):
+        await self.engine.dispose()
+
+async_db_service = AsyncDatabaseService()
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    async with async_db_service.SessionLocal() as session:
+        yield session
@@ -1,5 +1,9 @@
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
 from datetime import datetime
+import threading
+import time
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 from twilio.rest import Client as TwilioClient
@@ -8,10 +12,80 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+class AlertMetrics:
+    """Running delivery numbers for emergency alerts.
+
+    ``first_delivery`` summarises, over the last ``window`` alerts, the time
+    from the alert being triggered to its first successful delivery.
+    ``timed_out`` counts deliveries still running at the deadline; they carry
+    on, and ``late_delivered``/``late_failed`` count how they ended.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.alerts = 0
+        self.delivered = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.late_delivered = 0
+        self.late_failed = 0
+        self.undelivered_alerts = 0
+        self._first_delivery = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, results: List[Dict], first_delivery: Optional[float]) -> None:
+        with self._lock:
+            self.alerts += 1
+            for entry in results:
+                if entry["result"].get("success"):
+                    self.delivered += 1
+                elif entry["result"].get("timed_out"):
+                    self.timed_out += 1
+                else:
+                    self.failed += 1
+            if first_delivery is None:
+                self.undelivered_alerts += 1
+            else:
+                self._first_delivery.append(first_delivery)
+
+    def record_late(self, result: Dict) -> None:
+        with self._lock:
+            if result.get("success"):
+                self.late_delivered += 1
+            else:
+                self.late_failed += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = sorted(self._first_delivery)
+            summary = None
+            if samples:
+                summary = {
+                    "count": len(samples),
+                    "p50_seconds": round(samples[len(samples) // 2], 4),
+                    "p95_seconds": round(samples[max(0, int(len(samples) * 0.95) - 1)], 4),
+                    "max_seconds": round(samples[-1], 4),
+                }
+            return {
+                "alerts": self.alerts,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "timed_out": self.timed_out,
+                "late_delivered": self.late_delivered,
+                "late_failed": self.late_failed,
+                "undelivered_alerts": self.undelivered_alerts,
+                "first_delivery": summary,
+            }
+
 class NotificationService:
     def __init__(self):
         self.sendgrid_client = None
         self.twilio_client = None
+        # Provider clients block, so alerts fan out over a bounded thread pool
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.NOTIFICATION_MAX_WORKERS,
+            thread_name_prefix="notification"
+        )
+        self.metrics = AlertMetrics()
         
         if settings.SENDGRID_API_KEY:
             self.sendgrid_client = SendGridAPIClient(api_key=settings.SENDGRID_API_KEY)
@@ -92,8 +166,28 @@ class NotificationService:
                 "timestamp": datetime.utcnow().isoformat()
             }
     
-    def send_emergency_alert(self, emergency_contacts: List[Dict], user_name: str, alert_type: str = "emergency") -> List[Dict]:
-        results = []
+    def send_emergency_alert(
+        self,
+        emergency_contacts: List[Dict],
+        user_name: str,
+        alert_type: str = "emergency",
+        deadline: Optional[float] = None,
+        on_result: Optional[Callable[[Dict], None]] = None,
+    ) -> List[Dict]:
+        """Email and text every emergency contact at once.
+
+        Each delivery runs on the service's thread pool, so the alert takes as
+        long as the slowest provider call instead of the sum of them all.
+        ``on_result`` is called with each result as soon as it completes. Any
+        delivery still unfinished ``deadline`` seconds after the trigger
+        (``EMERGENCY_ALERT_DEADLINE_SECONDS`` by default) is reported as timed
+        out and pending, but keeps going: a crisis message is never dropped,
+        and how it ends goes to the log and ``metrics``. Results are returned
+        in contact order, email before SMS.
+        """
+        triggered = time.monotonic()
+        if deadline is None:
+            deadline = settings.EMERGENCY_ALERT_DEADLINE_SECONDS
         
         alert_subject = f"🚨 Emergency Alert for {user_name}"
         alert_message = f"""EMERGENCY ALERT
@@ -110,33 +204,92 @@ If this is a life-threatening emergency, call 911.
 For crisis support:
 - National Suicide Prevention Lifeline: 988
 - Crisis Text Line: Text HOME to 741741"""
+        sms_message = f"EMERGENCY ALERT: Please check on {user_name} immediately. If life-threatening, call 911. Time: {datetime.utcnow().strftime('%H:%M')}"
         
+        deliveries = []  # (contact, method, future)
         for contact in emergency_contacts:
             if contact.get("email"):
-                email_result = self.send_email(
+                deliveries.append((contact, "email", self.executor.submit(
+                    self.send_email,
                     to_email=contact["email"],
                     subject=alert_subject,
                     content=alert_message.replace('\n', '<br>')
-                )
-                results.append({
-                    "contact": contact,
-                    "method": "email",
-                    "result": email_result
-                })
-            
+                )))
             if contact.get("phone"):
-                sms_result = self.send_sms(
+                deliveries.append((contact, "sms", self.executor.submit(
+                    self.send_sms,
                     to_phone=contact["phone"],
-                    message=f"EMERGENCY ALERT: Please check on {user_name} immediately. If life-threatening, call 911. Time: {datetime.utcnow().strftime('%H:%M')}"
-                )
-                results.append({
-                    "contact": contact,
-                    "method": "sms", 
-                    "result": sms_result
+                    message=sms_message
+                )))
+        
+        positions = {future: i for i, (_, _, future) in enumerate(deliveries)}
+        results: List[Optional[Dict]] = [None] * len(deliveries)
+        first_delivery = None
+        
+        def report(i: int, result: Dict) -> None:
+            contact, method, _ = deliveries[i]
+            results[i] = {
+                "contact": contact,
+                "method": method,
+                "result": result,
+                "elapsed_seconds": round(time.monotonic() - triggered, 4)
+            }
+            if on_result is not None:
+                try:
+                    on_result(results[i])
+                except Exception as e:
+                    logger.error(f"Emergency alert result callback failed: {e}")
+        
+        try:
+            for future in as_completed(positions, timeout=deadline):
+                result = self._outcome(future)
+                if result.get("success") and first_delivery is None:
+                    first_delivery = time.monotonic() - triggered
+                report(positions[future], result)
+        except FuturesTimeoutError:
+            pass
+        
+        for i, (contact, method, future) in enumerate(deliveries):
+            if results[i] is None:
+                # Queued or still talking to the provider: let it finish in the background
+                logger.warning(f"Emergency {method} to contact {contact.get('name', '')!r} missed the {deadline}s deadline, still sending")
+                report(i, {
+                    "success": False,
+                    "timed_out": True,
+                    "pending": True,
+                    "message": f"No answer from the provider within {deadline}s, still sending",
+                    "timestamp": datetime.utcnow().isoformat()
                 })
+                future.add_done_callback(
+                    lambda future, contact=contact, method=method: self._late_result(future, contact, method, user_name)
+                )
         
+        self.metrics.record(results, first_delivery)
+        if first_delivery is not None:
+            logger.info(f"Emergency alert for {user_name} first delivered after {first_delivery:.3f}s")
+        elif deliveries:
+            logger.error(f"Emergency alert for {user_name} was not delivered to any contact")
         return results
     
+    @staticmethod
+    def _outcome(future) -> Dict:
+        try:
+            return future.result()
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Failed to send: {str(e)}",
+                "timestamp": datetime.utcnow().isoformat()
+            }
+
+    def _late_result(self, future, contact: Dict, method: str, user_name: str) -> None:
+        result = self._outcome(future)
+        self.metrics.record_late(result)
+        if result.get("success"):
+            logger.info(f"Emergency {method} for {user_name} to contact {contact.get('name', '')!r} delivered after the deadline")
+        else:
+            logger.error(f"Emergency {method} for {user_name} to contact {contact.get('name', '')!r} failed after the deadline: {result.get('message')}")
+    
     def send_parental_consent_email(self, parent_email: str, child_name: str, consent_link: str) -> Dict:
         subject = f"Parental Consent Required - {child_name} wants to join Anti-Bullying Support App"
         
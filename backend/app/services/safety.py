@@ -0,0 +1,162 @@
+import re
+from typing import Dict, Iterable, List, Optional
+from ..core.config import settings
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Build a regex that walks a trie of ``words`` instead of trying each word in turn.
+
+    The regex engine then does the work of an Aho-Corasick automaton: at each
+    position it follows at most one branch per character, so the cost of a scan
+    does not grow with the number of keywords. Longer words win at a shared
+    start, which is what ``SafetyEngine`` relies on to recover shorter ones.
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: Dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class SafetyEngine:
+    """Single-pass scanner for every keyword list and personal-info pattern.
+
+    ``keywords`` and ``patterns`` map a category name (e.g. ``"emergency"``) to
+    its list of keywords or regexes. Everything is compiled once, and ``scan``
+    returns the keywords / patterns found for every category in one call:
+
+    * keywords are matched anywhere in the lowercased text (the same substring
+      semantics as ``keyword in message.lower()``), overlapping matches
+      included, through one trie-shaped regex;
+    * patterns are joined into one case-insensitive alternation, with a shared
+      leading ``\\b`` tested once per position; only when it finds something
+      are patterns it could have shadowed checked on their own.
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]], patterns: Dict[str, Iterable[str]]):
+        self.categories = list(dict.fromkeys([*keywords, *patterns]))
+
+        # keyword (lowercased) -> [(category, configured spelling, order)]
+        self._keyword_owners: Dict[str, List] = {}
+        order = 0
+        for category, words in keywords.items():
+            for word in words:
+                owners = self._keyword_owners.setdefault(word.lower(), []) if word else None
+                if owners is not None and all(owner[0] != category for owner in owners):
+                    owners.append((category, word, order))
+                    order += 1
+        # Shorter keywords that start every keyword, since the regex reports the longest
+        self._keyword_prefixes = {
+            word: [other for other in self._keyword_owners if word.startswith(other)]
+            for word in self._keyword_owners
+        }
+        self._keyword_regex = None
+        if self._keyword_owners:
+            # Case-sensitive on purpose: it lets re skip ahead on the trie's first letters
+            self._keyword_regex = re.compile(_trie_pattern(self._keyword_owners))
+
+        # pattern -> [(category, order)]; identical patterns are compiled once
+        self._pattern_owners: Dict[str, List] = {}
+        for category, category_patterns in patterns.items():
+            for pattern in category_patterns:
+                self._pattern_owners.setdefault(pattern, []).append((category, order))
+                order += 1
+        self._patterns = list(self._pattern_owners)
+        self._pattern_regexes = [re.compile(p, re.IGNORECASE) for p in self._patterns]
+        self._combined_regex = None
+        if self._patterns:
+            bounded = [f"(?P<p{i}>{p[2:]})" for i, p in enumerate(self._patterns) if p.startswith(r"\b")]
+            others = [f"(?P<p{i}>{p})" for i, p in enumerate(self._patterns) if not p.startswith(r"\b")]
+            if bounded:
+                others.insert(0, r"\b(?:" + "|".join(bounded) + ")")
+            self._combined_regex = re.compile("|".join(others), re.IGNORECASE)
+
+    @classmethod
+    def from_settings(cls) -> "SafetyEngine":
+        return cls(
+            keywords={
+                "emergency": settings.EMERGENCY_KEYWORDS,
+                "inappropriate": settings.INAPPROPRIATE_CONTENT_KEYWORDS,
+            },
+            patterns={
+                "personal_info": settings.PERSONAL_INFO_PATTERNS,
+                "contact_info": settings.CONTACT_INFO_PATTERNS,
+            },
+        )
+
+    def scan(self, text: str) -> Dict[str, List[str]]:
+        """Return ``{category: [matched keywords or patterns]}`` for ``text``."""
+        found = []  # (order, category, item)
+        if not text:
+            return {category: [] for category in self.categories}
+
+        if self._keyword_regex is not None:
+            lowered = text.lower()
+            seen = set()
+            match = self._keyword_regex.search(lowered)
+            while match:
+                for word in self._keyword_prefixes[match.group()]:
+                    if word not in seen:
+                        seen.add(word)
+                        found.extend((order, category, spelling)
+                                     for category, spelling, order in self._keyword_owners[word])
+                # Restart one character later so overlapping keywords are found too
+                match = self._keyword_regex.search(lowered, match.start() + 1)
+
+        if self._combined_regex is not None:
+            matched = set()
+            for match in self._combined_regex.finditer(text):
+                matched.add(int(match.lastgroup[1:]))
+            if matched:
+                # A pattern can be hidden behind another one matching at the same spot
+                for i, regex in enumerate(self._pattern_regexes):
+                    if i not in matched and regex.search(text):
+                        matched.add(i)
+            for i in matched:
+                found.extend((order, category, self._patterns[i])
+                             for category, order in self._pattern_owners[self._patterns[i]])
+
+        result: Dict[str, List[str]] = {category: [] for category in self.categories}
+        for _, category, item in sorted(found):
+            result[category].append(item)
+        return result
+
+    def scan_many(self, texts: Iterable[str]) -> List[Dict[str, List[str]]]:
+        """Scan a batch of messages, e.g. for moderating stored stories or chats."""
+        return [self.scan(text) for text in texts]
+
+    def check_message(self, message: str, scan: Optional[Dict[str, List[str]]] = None) -> Dict:
+        """Summarise a scan in the shape ``AIService`` uses for chat messages."""
+        scan = scan if scan is not None else self.scan(message)
+        flags = []
+        is_emergency = bool(scan["emergency"])
+        if is_emergency:
+            flags.append("emergency_keywords")
+        contains_personal_info = bool(scan["personal_info"])
+        if contains_personal_info:
+            flags.append("personal_information")
+        is_inappropriate = bool(scan["inappropriate"])
+        if is_inappropriate:
+            flags.append("inappropriate_content")
+        return {
+            "is_emergency": is_emergency,
+            "contains_personal_info": contains_personal_info,
+            "is_inappropriate": is_inappropriate,
+            "flags": flags
+        }
+
+
+safety_engine = SafetyEngine.from_settings()
@@ -1,19 +1,15 @@
 import re
-from typing import List, Dict
+from datetime import date, datetime
+from typing import List, Dict, Optional
 from ..core.config import settings
+from ..services.safety import safety_engine
 
 def validate_content_safety(content: str) -> Dict:
-    content_lower = content.lower()
-    flags = []
-    
-    for keyword in settings.INAPPROPRIATE_CONTENT_KEYWORDS:
-        if keyword.lower() in content_lower:
-            flags.append(f"inappropriate_keyword: {keyword}")
+    scan = safety_engine.scan(content)
+    flags = [f"inappropriate_keyword: {keyword}" for keyword in scan["inappropriate"]]
     
-    for pattern in settings.PERSONAL_INFO_PATTERNS:
-        if re.search(pattern, content, re.IGNORECASE):
-            flags.append(f"personal_info_detected")
-            break
+    if scan["personal_info"]:
+        flags.append(f"personal_info_detected")
     
     return {
         "is_safe": len(flags) == 0,
@@ -69,4 +65,22 @@ def validate_email_format(email: str) -> bool:
 
 def validate_phone_format(phone: str) -> bool:
     phone = re.sub(r'[^\d]', '', phone)
-    return len(phone) >= 10 and len(phone) <= 15
\ No newline at end of file
+    return len(phone) >= 10 and len(phone) <= 15
+
+def parse_id(value: Optional[str]) -> Optional[int]:
+    """Database id from one of the string ids the API hands out, or None if it isn't one."""
+    if value is None or not value.isdigit():
+        return None
+    return int(value)
+
+def parse_iso_datetime(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def parse_iso_date(value: Optional[str]) -> Optional[date]:
+    parsed = parse_iso_datetime(value)
+    return parsed.date() if parsed else None
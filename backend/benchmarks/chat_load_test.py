@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Load test for POST /api/v1/chat/send.
+
+Starts a stand-in OpenAI server with a fixed reply latency, then fires
+concurrent chat requests at the FastAPI app twice: once with the old
+blocking SDK call inside the async handler ("before") and once with the
+async gateway ("after"). Usage:
+
+    cd backend
+    python benchmarks/chat_load_test.py --requests 200 --concurrency 100 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+def make_upstream(latency: float) -> Starlette:
+    async def completions(request):
+        await request.body()
+        await asyncio.sleep(latency)
+        return JSONResponse({
+            "id": "chatcmpl-load-test",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "stand-in",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "I'm here for you. 💙"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    return Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"])])
+
+
+def start_upstream(latency: float) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    config = uvicorn.Config(make_upstream(latency), host="127.0.0.1", port=port,
+                            log_level="error", limit_concurrency=10000, backlog=4096)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+async def run_load(app, total: int, concurrency: int) -> dict:
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(client):
+        async with limit:
+            started = time.perf_counter()
+            response = await client.post("/api/v1/chat/send", json={"message": "Tell me about your day"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    async with httpx.AsyncClient(app=app, base_url="http://test", timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client) for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "rps": total / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2, help="stand-in model latency in seconds")
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "load-test"
+    os.environ["OPENAI_BASE_URL"] = start_upstream(args.latency)
+    os.environ["OPENAI_TIMEOUT_SECONDS"] = "120"
+    os.environ["OPENAI_SLOW_CALL_SECONDS"] = "60"
+
+    from main import app
+    from app.api.routes import chat
+    from app.services.ai import llm_gateway
+
+    async_path = chat.generate_openai_response
+
+    async def blocking_path(message, user_age=None):
+        # What send_message did before: a synchronous SDK call on the event loop
+        completion = llm_gateway.create(model="stand-in", messages=[{"role": "user", "content": message}])
+        return chat.ChatResponse(response=completion.choices[0].message.content)
+
+    results = {}
+    for label, handler in (("before (blocking SDK)", blocking_path), ("after (async gateway)", async_path)):
+        chat.generate_openai_response = handler
+        results[label] = asyncio.run(run_load(app, args.requests, args.concurrency))
+    chat.generate_openai_response = async_path
+
+    print(f"\n{args.requests} requests, concurrency {args.concurrency}, model latency {args.latency * 1000:.0f} ms\n")
+    print(f"{'mode':<24}{'total s':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for label, r in results.items():
+        print(f"{label:<24}{r['elapsed']:>10.2f}{r['rps']:>10.1f}{r['p50'] * 1000:>10.0f}{r['p99'] * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from app.api.routes import auth, mood, reports, chat, resources, community
 from app.core.config import settings
+from app.repositories import ResourceRepository, StoryRepository
+from app.services.database import async_db_service
+from app.services.notification import notification_service
 import uvicorn
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await async_db_service.create_tables()
+    async with async_db_service.SessionLocal() as session:
+        await ResourceRepository(session).seed(resources.SEED_RESOURCES)
+        await StoryRepository(session).seed(community.SEED_STORIES)
+    yield
+    await async_db_service.dispose()
+
 app = FastAPI(
     title="Anti-Bullying Support API",
     description="A comprehensive API for supporting children affected by bullying",
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -149,6 +163,12 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "emergency_alerts": notification_service.metrics.snapshot()
+    }
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+History-query latency before and after the user/timestamp indexes (migrations 1 and 4).
+
+Fills a scratch database with synthetic mood entries and chat messages spread
+over many users, times the per-user lookups simple_app.py runs, applies the
+migrations with run_migrations() and times them again. Uses a temporary
+SQLite file unless --database-url points somewhere else (e.g. a throwaway
+Postgres database; its tables are emptied first). Usage:
+
+    python benchmarks/db_index_benchmark.py [--rows 1000000] [--users 5000] [--database-url URL]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument('--rows', type=int, default=1_000_000, help='rows per table')
+parser.add_argument('--users', type=int, default=5000)
+parser.add_argument('--queries', type=int, default=200, help='lookups per query type')
+parser.add_argument('--database-url')
+args = parser.parse_args()
+
+scratch = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+os.environ['AUTO_MIGRATE'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_app
+from simple_app import ChatMessage, MoodEntry, app, db
+
+NOW = datetime.utcnow()
+MOODS = ['happy', 'sad', 'worried', 'angry', 'calm', 'excited']
+QUERIES = {
+    'last 20 chat messages': lambda uid: (
+        ChatMessage.query.filter_by(user_id=uid)
+        .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(20).all()),
+    'moods in the last 7 days': lambda uid: (
+        MoodEntry.query.filter(MoodEntry.user_id == uid,
+                               MoodEntry.timestamp >= NOW - timedelta(days=7)).count()),
+    'latest mood': lambda uid: (
+        MoodEntry.query.filter_by(user_id=uid).order_by(MoodEntry.timestamp.desc()).first()),
+}
+
+
+def drop_indexes():
+    """Put the schema back the way it was before migrations 1 and 4."""
+    with db.engine.begin() as conn:
+        for table in ('mood_entry', 'chat_message', 'report', 'kindness_entry'):
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS ix_{table}_user_id_timestamp')
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS ix_{table}_user_id_timestamp_id')
+        conn.exec_driver_sql('DROP INDEX IF EXISTS ix_trust_team_member_user_id')
+        conn.exec_driver_sql('DELETE FROM schema_version')
+
+
+def fill(rows, users, chunk=50_000):
+    rng = random.Random(42)
+    year = 365 * 24 * 3600
+    with db.engine.begin() as conn:
+        conn.execute(MoodEntry.__table__.delete())
+        conn.execute(ChatMessage.__table__.delete())
+        for start in range(0, rows, chunk):
+            count = min(chunk, rows - start)
+            conn.execute(MoodEntry.__table__.insert(), [
+                {'user_id': rng.randint(1, users), 'mood': rng.choice(MOODS), 'note': '',
+                 'timestamp': NOW - timedelta(seconds=rng.randrange(year))}
+                for _ in range(count)
+            ])
+            conn.execute(ChatMessage.__table__.insert(), [
+                {'user_id': rng.randint(1, users), 'role': rng.choice(['user', 'ai']),
+                 'content': 'hello buddy', 'timestamp': NOW - timedelta(seconds=rng.randrange(year))}
+                for _ in range(count)
+            ])
+
+
+def measure(users, queries):
+    rng = random.Random(7)
+    results = {}
+    for name, query in QUERIES.items():
+        timings = []
+        for _ in range(queries):
+            uid = rng.randint(1, users)
+            started = time.perf_counter()
+            query(uid)
+            timings.append((time.perf_counter() - started) * 1000)
+        db.session.rollback()
+        results[name] = (statistics.median(timings), sorted(timings)[int(len(timings) * 0.95) - 1])
+    return results
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        simple_app.run_migrations()  # makes sure schema_version exists
+        drop_indexes()
+
+        started = time.perf_counter()
+        fill(args.rows, args.users)
+        print(f"Inserted {args.rows:,} mood entries and {args.rows:,} chat messages "
+              f"for {args.users:,} users in {time.perf_counter() - started:.1f}s "
+              f"({db.engine.dialect.name})")
+
+        before = measure(args.users, args.queries)
+        started = time.perf_counter()
+        simple_app.run_migrations()
+        print(f"run_migrations() built the indexes in {time.perf_counter() - started:.1f}s")
+        after = measure(args.users, args.queries)
+
+    print(f"\n{'query':<26}{'before p50':>12}{'p95':>10}{'after p50':>12}{'p95':>10}{'speedup':>10}")
+    for name in QUERIES:
+        (b50, b95), (a50, a95) = before[name], after[name]
+        print(f"{name:<26}{b50:>10.2f}ms{b95:>8.2f}ms{a50:>10.2f}ms{a95:>8.2f}ms{b50 / a50:>9.0f}x")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Parallel writers against simple_app.py's SQLite database, default vs tuned.
+
+Starts several processes (standing in for gunicorn workers), each with a few
+threads, that save mood entries and read chat history the way the request
+handlers do, all on one SQLite file. Runs once with SQLite's defaults
+(rollback journal, synchronous=FULL) and once with simple_app.SQLITE_PRAGMAS,
+and reports throughput, latency and "database is locked" errors. Usage:
+
+    python benchmarks/sqlite_concurrency_benchmark.py [--workers 4] [--threads 4] [--ops 300]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+def load_app(db_path, pragmas):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['AUTO_MIGRATE'] = '0'
+    sys.path.insert(0, ROOT)
+    import simple_app
+    if pragmas is not None:
+        simple_app.SQLITE_PRAGMAS.clear()
+        simple_app.SQLITE_PRAGMAS.update(pragmas)
+    return simple_app
+
+
+def create_schema(db_path, pragmas):
+    simple_app = load_app(db_path, pragmas)
+    with simple_app.app.app_context():
+        simple_app.db.create_all()
+        simple_app.run_migrations()
+
+
+def worker(db_path, pragmas, threads, ops, write_ratio, start_at, results):
+    simple_app = load_app(db_path, pragmas)
+    from simple_app import ChatMessage, MoodEntry, app, db
+
+    def run(thread_index):
+        latencies, errors = [], 0
+        with app.app_context():
+            for i in range(ops):
+                user_id = (os.getpid() * 31 + thread_index * 7 + i) % 500 + 1
+                started = time.perf_counter()
+                try:
+                    if (i % 100) < write_ratio * 100:
+                        db.session.add(MoodEntry(user_id=user_id, mood='happy', note='benchmark'))
+                        db.session.commit()
+                    else:
+                        (ChatMessage.query.filter_by(user_id=user_id)
+                         .order_by(ChatMessage.timestamp.desc()).limit(20).all())
+                        db.session.rollback()
+                except Exception as e:  # OperationalError: database is locked
+                    db.session.rollback()
+                    errors += 1
+                    if 'locked' not in str(e):
+                        raise
+                latencies.append((time.perf_counter() - started) * 1000)
+        results.put((latencies, errors))
+
+    while time.time() < start_at:
+        time.sleep(0.001)
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+
+def run_case(label, pragmas, args):
+    scratch = tempfile.mkdtemp()
+    db_path = os.path.join(scratch, 'bench.db')
+    try:
+        # Everything that imports simple_app runs in its own process, like a gunicorn worker
+        ctx = multiprocessing.get_context('spawn')
+        setup = ctx.Process(target=create_schema, args=(db_path, pragmas))
+        setup.start()
+        setup.join()
+
+        results = ctx.Queue()
+        start_at = time.time() + 3  # let every process finish importing first
+        procs = [ctx.Process(target=worker, args=(db_path, pragmas, args.threads, args.ops,
+                                                  args.write_ratio, start_at, results))
+                 for _ in range(args.workers)]
+        for p in procs:
+            p.start()
+        latencies, errors = [], 0
+        for _ in range(args.workers * args.threads):
+            thread_latencies, thread_errors = results.get()
+            latencies += thread_latencies
+            errors += thread_errors
+        elapsed = time.time() - start_at
+        for p in procs:
+            p.join()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    latencies.sort()
+    print(f"{label:<10}{(len(latencies) - errors) / elapsed:>9.0f}/s{statistics.median(latencies):>9.2f}ms"
+          f"{latencies[int(len(latencies) * 0.99) - 1]:>9.1f}ms{latencies[-1]:>9.0f}ms{errors:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--ops', type=int, default=300, help='operations per thread')
+    parser.add_argument('--write-ratio', type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{args.workers} processes x {args.threads} threads x {args.ops} ops, "
+          f"{args.write_ratio:.0%} writes\n")
+    print(f"{'':<10}{'ok ops':>11}{'p50':>11}{'p99':>11}{'max':>11}{'locked':>8}")
+    run_case('default', DEFAULT_PRAGMAS, args)
+    run_case('tuned', None, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Per-request latency and CPU cost of converting a voice kindness entry to WAV.
+
+Compares the old temp-file ffmpeg conversion with the in-memory pipeline in
+simple_app.py (ffmpeg over stdin/stdout, and PyAV when it is installed).
+Needs ffmpeg on PATH (or FFMPEG_BIN). Usage:
+
+    python benchmarks/transcode_benchmark.py [--input recording.webm] [--runs 30]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import simple_app
+
+
+def legacy_transcode(audio_bytes):
+    """The conversion kindness_voice() used to do: two temp files and a spawn."""
+    with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as tmp_in:
+        tmp_in.write(audio_bytes)
+        tmp_in_path = tmp_in.name
+    tmp_out_path = tmp_in_path.replace('.webm', '.wav')
+    try:
+        subprocess.run([simple_app.FFMPEG_BIN, '-y', '-i', tmp_in_path, '-ar', '16000', '-ac', '1', tmp_out_path],
+                       capture_output=True, timeout=10)
+        with open(tmp_out_path, 'rb') as f:
+            return f.read()
+    finally:
+        os.unlink(tmp_in_path)
+        if os.path.exists(tmp_out_path):
+            os.unlink(tmp_out_path)
+
+
+def sample_recording(seconds):
+    """A few seconds of Opus-in-WebM, like MediaRecorder produces."""
+    result = subprocess.run(
+        [simple_app.FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+         '-i', f'sine=frequency=440:duration={seconds}', '-c:a', 'libopus', '-f', 'webm', 'pipe:1'],
+        capture_output=True, check=True
+    )
+    return result.stdout
+
+
+def measure(fn, audio_bytes, runs):
+    latencies, cpu = [], []
+    for _ in range(runs):
+        before = os.times()
+        started = time.perf_counter()
+        wav = fn(audio_bytes)
+        latencies.append(time.perf_counter() - started)
+        after = os.times()
+        cpu.append(sum(after[:4]) - sum(before[:4]))
+        assert wav[:4] == b'RIFF', 'conversion did not produce WAV'
+    return statistics.median(latencies) * 1000, statistics.mean(cpu) * 1000, len(wav)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', help='recording to convert (default: generated 8 s Opus/WebM clip)')
+    parser.add_argument('--seconds', type=int, default=8)
+    parser.add_argument('--runs', type=int, default=30)
+    args = parser.parse_args()
+
+    audio_bytes = open(args.input, 'rb').read() if args.input else sample_recording(args.seconds)
+
+    av_module = simple_app.av
+    modes = [
+        ('temp files + ffmpeg (old)', legacy_transcode, None),
+        ('ffmpeg stdin/stdout', simple_app.transcode_to_wav, None),
+    ]
+    if av_module is not None:
+        modes.append(('PyAV in-process', simple_app.transcode_to_wav, av_module))
+
+    print(f"\nInput: {len(audio_bytes):,} bytes, {args.runs} runs each\n")
+    print(f"{'mode':<28}{'median ms':>12}{'cpu ms':>10}{'wav bytes':>12}")
+    for label, fn, decoder in modes:
+        simple_app.av = decoder
+        latency, cpu, size = measure(fn, audio_bytes, args.runs)
+        print(f"{label:<28}{latency:>12.1f}{cpu:>10.1f}{size:>12,}")
+    simple_app.av = av_module
+
+
+if __name__ == '__main__':
+    main()
@@ -4,16 +4,60 @@ Simple Anti-Bullying Support App - Web Version
 Run this file and it works immediately.
 """
 
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, session, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, make_transient_to_detached
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
+import atexit
+import base64
 import random
-from datetime import datetime
+import re
+import requests
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
 import os
 import json
+import gzip
+import hashlib
+import io
+import multiprocessing
+import secrets
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import wave
 from dotenv import load_dotenv
-from openai import OpenAI
+
+# The OpenAI gateway lives in the backend package and is shared by both apps
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from app.core.config import settings as backend_settings
+from app.core.llm_gateway import LLMGateway
+
+try:
+    import av  # PyAV: decode voice uploads in-process when it's installed
+except ImportError:
+    av = None
+
+try:
+    import brotli  # optional: adds a br variant of the page shell
+except ImportError:
+    brotli = None
+
+try:
+    import redis  # optional: STATE_BACKEND=redis
+except ImportError:
+    redis = None
+
+try:
+    import ijson  # optional: parse /api/migrate uploads incrementally
+except ImportError:
+    ijson = None
 
 load_dotenv()
 
@@ -24,12 +68,49 @@ if db_url.startswith('postgres://'):
     db_url = db_url.replace('postgres://', 'postgresql://', 1)
 app.config['SQLALCHEMY_DATABASE_URI'] = db_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if not db_url.startswith('sqlite'):
+    # Per process: keep (pool size + overflow) x gunicorn workers under the server's max_connections
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '5')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': True,
+    }
+
+# SQLite tuning, applied to every new connection
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # readers don't block the writer (and vice versa)
+    'synchronous': 'NORMAL',  # safe with WAL; fsync at checkpoints instead of every commit
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),  # wait for the write lock, don't fail
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KB', '65536')),  # negative = KiB
+}
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
 
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
 
-# OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# OpenAI access: pooled connections, deadlines, retries and a circuit breaker.
+# Same variables and defaults as the backend's OPENAI_* settings.
+llm = LLMGateway(
+    api_key=os.getenv('OPENAI_API_KEY'),
+    base_url=os.getenv('OPENAI_BASE_URL', ''),
+    timeout=float(os.getenv('OPENAI_TIMEOUT_SECONDS', '20')),
+    max_concurrency=int(os.getenv('OPENAI_MAX_CONCURRENCY', '16')),
+    max_retries=int(os.getenv('OPENAI_MAX_RETRIES', '2')),
+    slow_call_threshold=float(os.getenv('OPENAI_SLOW_CALL_SECONDS', '8')) or None,
+    failure_threshold=int(os.getenv('OPENAI_CIRCUIT_FAILURE_THRESHOLD', '5')),
+    reset_timeout=float(os.getenv('OPENAI_CIRCUIT_RESET_SECONDS', '30')),
+)
 
 BUDDY_SYSTEM_PROMPT = """You are Buddy, a warm, caring AI best friend for children aged 7-14. You live inside an anti-bullying support app. You are the one person this kid feels safe talking to - maybe the ONLY one right now. That matters. Treat every conversation like it matters.
 
@@ -266,13 +347,370 @@ WHEN THEY ADMIT "I bullied someone" or "I was mean":
 
 REMEMBER: You are possibly the only safe space this child has right now. Be worthy of that trust."""
 
-# Conversation history per session (in-memory)
-conversation_history = []
-
-# In-memory data (fallback for non-logged-in users)
-mood_entries = []
-reports = []
-chat_history = []
+# --- Shared State ---
+# Short-lived state every worker should see the same way (chat context, and
+# optionally the user cache). STATE_BACKEND picks where it lives:
+#   memory  one copy per process; fine for development and a single worker
+#   sqlite  a SQLite file shared by all workers on one host (STATE_SQLITE_PATH)
+#   redis   any Redis-protocol server (STATE_REDIS_URL), for several hosts
+# Values must be JSON-serialisable. Every backend offers get/set/delete for
+# single values, add (set unless present) and update (atomic read-modify-write),
+# and get_list/push for bounded lists, all with a TTL.
+
+class MemoryState:
+    """Process-local backend. Holds at most ``max_keys`` keys, least recently used evicted first."""
+
+    def __init__(self, max_keys=1000):
+        self.max_keys = max_keys
+        self._data = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key, value, ttl, now):
+        self._data[key] = (now + ttl, value)
+        self._data.move_to_end(key)
+        while self._data:
+            oldest, (expires, _) = next(iter(self._data.items()))
+            if len(self._data) <= self.max_keys and expires > now:
+                break
+            del self._data[oldest]
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key, time.monotonic())
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._store(key, value, ttl, time.monotonic())
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def add(self, key, value, ttl):
+        """Store ``value`` unless the key is set; return the value already there, or None if stored."""
+        now = time.monotonic()
+        with self._lock:
+            current = self._live(key, now)
+            if current is None:
+                self._store(key, value, ttl, now)
+            return current
+
+    def update(self, key, change, ttl):
+        """Replace the value with ``change(current)[0]`` atomically and return ``change(current)[1]``.
+
+        ``current`` is None when the key isn't set.
+        """
+        now = time.monotonic()
+        with self._lock:
+            value, result = change(self._live(key, now))
+            self._store(key, value, ttl, now)
+            return result
+
+    def get_list(self, key):
+        with self._lock:
+            return list(self._live(key, time.monotonic()) or ())
+
+    def push(self, key, items, maxlen, ttl, if_empty=False):
+        """Append ``items``, keep the last ``maxlen`` and restart the TTL.
+
+        With ``if_empty`` nothing happens unless the list is missing or empty.
+        """
+        now = time.monotonic()
+        with self._lock:
+            current = self._live(key, now) or []
+            if if_empty and current:
+                return
+            self._store(key, (current + list(items))[-maxlen:], ttl, now)
+
+class SQLiteState:
+    """Backend shared by the workers on one host through a SQLite file."""
+
+    PURGE_EVERY = 1000  # writes between sweeps of expired keys
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS state '
+                     '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)')
+        conn.commit()
+        conn.close()  # workers forked after this open their own connections
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _read(self, key):
+        row = self.conn.execute('SELECT value FROM state WHERE key = ? AND expires > ?',
+                                (key, time.time())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _write(self, key, value, ttl):
+        self.conn.execute('INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)',
+                          (key, json.dumps(value), time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.conn.execute('DELETE FROM state WHERE expires <= ?', (time.time(),))
+
+    def get(self, key):
+        return self._read(key)
+
+    def set(self, key, value, ttl):
+        self._write(key, value, ttl)
+
+    def delete(self, key):
+        self.conn.execute('DELETE FROM state WHERE key = ?', (key,))
+
+    def _exclusive(self, action):
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')  # read-modify-write without another worker in between
+        try:
+            result = action()
+            conn.execute('COMMIT')
+            return result
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def add(self, key, value, ttl):
+        def action():
+            current = self._read(key)
+            if current is None:
+                self._write(key, value, ttl)
+            return current
+        return self._exclusive(action)
+
+    def update(self, key, change, ttl):
+        def action():
+            value, result = change(self._read(key))
+            self._write(key, value, ttl)
+            return result
+        return self._exclusive(action)
+
+    def get_list(self, key):
+        return self._read(key) or []
+
+    def push(self, key, items, maxlen, ttl, if_empty=False):
+        def action():
+            current = self._read(key) or []
+            if not (if_empty and current):
+                self._write(key, (current + list(items))[-maxlen:], ttl)
+        self._exclusive(action)
+
+class RedisState:
+    """Backend on a Redis-protocol server (Redis, Valkey, KeyDB, ...), shared across hosts."""
+
+    def __init__(self, url, prefix='buddy:'):
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.redis.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.redis.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000))
+
+    def delete(self, key):
+        self.redis.delete(self.prefix + key)
+
+    def add(self, key, value, ttl):
+        while True:
+            if self.redis.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000), nx=True):
+                return None
+            current = self.get(key)
+            if current is not None:
+                return current
+            # It expired between the two calls; try again
+
+    def update(self, key, change, ttl):
+        key = self.prefix + key
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    value, result = change(None if raw is None else json.loads(raw))
+                    pipe.multi()
+                    pipe.set(key, json.dumps(value), px=int(ttl * 1000))
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue  # changed under us; redo with the new value
+
+    def get_list(self, key):
+        return [json.loads(item) for item in self.redis.lrange(self.prefix + key, 0, -1)]
+
+    def push(self, key, items, maxlen, ttl, if_empty=False):
+        key = self.prefix + key
+        values = [json.dumps(item) for item in items]
+        if not values:
+            return
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    if if_empty:
+                        pipe.watch(key)
+                        if pipe.llen(key):
+                            return
+                        pipe.multi()
+                    pipe.rpush(key, *values)
+                    pipe.ltrim(key, -maxlen, -1)
+                    pipe.pexpire(key, int(ttl * 1000))
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue  # someone else filled it first; look again
+
+def make_state_backend(name, max_keys=1000):
+    if name == 'sqlite':
+        return SQLiteState(os.getenv('STATE_SQLITE_PATH') or os.path.join(app.instance_path, 'state.db'))
+    if name == 'redis':
+        if redis is not None:
+            return RedisState(os.getenv('STATE_REDIS_URL', 'redis://localhost:6379/0'))
+        print("⚠️  STATE_BACKEND=redis needs the redis package; keeping state in process memory")
+    elif name != 'memory':
+        print(f"⚠️  Unknown STATE_BACKEND {name!r}; keeping state in process memory")
+    return MemoryState(max_keys=max_keys)
+
+shared_state = make_state_backend(
+    os.getenv('STATE_BACKEND', 'memory'),
+    max_keys=int(os.getenv('STATE_MAX_KEYS', os.getenv('CHAT_MAX_CONVERSATIONS', '1000')))
+)
+# Alert rate limits and dedupe keys. The sqlite and redis backends only drop
+# keys when they expire, but the memory one evicts by LRU, so there they get
+# a store of their own: chat traffic can't push them out (which would reset
+# the limits) and alerts can't push out chat context.
+alert_state = shared_state
+if isinstance(shared_state, MemoryState):
+    alert_state = MemoryState(max_keys=int(os.getenv('ALERT_STATE_MAX_KEYS', '10000')))
+
+class ConversationStore:
+    """Per-visitor chat history used as context for Buddy, kept in shared state.
+
+    Keeps the last ``max_messages`` of each conversation; one that gets no new
+    message for ``idle_seconds`` expires. Conversations that are not in the
+    store (expired, evicted, or from before a restart) are rebuilt on first
+    use by ``loader``.
+    """
+
+    def __init__(self, state, max_messages=20, idle_seconds=1800, loader=None):
+        self.state = state
+        self.max_messages = max_messages
+        self.idle_seconds = idle_seconds
+        self.loader = loader
+
+    def history(self, key):
+        """Return a copy of the conversation, rehydrating it if it isn't in the store."""
+        messages = self.state.get_list('conversation:' + key)
+        if messages or self.loader is None:
+            return messages
+        loaded = self.loader(key, self.max_messages)
+        if not loaded:
+            return []
+        self.state.push('conversation:' + key, loaded, self.max_messages, self.idle_seconds, if_empty=True)
+        return self.state.get_list('conversation:' + key)
+
+    def append(self, key, role, content):
+        self.state.push('conversation:' + key, [{"role": role, "content": content}],
+                        self.max_messages, self.idle_seconds)
+
+class UserCache:
+    """Short-lived cache of the columns Flask-Login's user loader reads.
+
+    Saves the SELECT on ``user`` that every authenticated request would
+    otherwise run. Entries expire after ``ttl`` seconds and are dropped as
+    soon as a change to that user commits in this worker, so other workers
+    see a password or profile change within ``ttl``. Holds at most
+    ``max_users`` entries, least recently used evicted first.
+
+    Given a shared ``state`` backend the entries live there instead, so every
+    worker shares them and an invalidation reaches all of them at once.
+    """
+
+    def __init__(self, ttl=30, max_users=10000, state=None):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.state = state
+        self.generation = 0  # bumped on every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._users = OrderedDict()  # user_id -> (expires, column values)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        if self.state is not None:
+            values = self.state.get(f'user:{user_id}')
+            with self._lock:
+                if values is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return values
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or entry[0] <= now:
+                self._users.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, values, generation):
+        """Cache ``values`` unless an invalidation happened since ``generation`` was read."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return  # the row may have changed while it was being loaded
+            if self.state is not None:
+                self.state.set(f'user:{user_id}', values, self.ttl)
+                return
+            self._users[user_id] = (time.monotonic() + self.ttl, values)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._users.pop(user_id, None)
+        if self.state is not None:
+            self.state.delete(f'user:{user_id}')
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'shared': self.state is not None,
+                'size': len(self._users),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hitRate': round(self.hits / lookups, 4) if lookups else None,
+            }
 
 # --- Database Models ---
 
@@ -285,13 +723,19 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class MoodEntry(db.Model):
+    __table_args__ = (
+        db.Index('ix_mood_entry_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+        db.Index('ux_mood_entry_user_id_import_key', 'user_id', 'import_key', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     mood = db.Column(db.String(50), nullable=False)
     note = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    import_key = db.Column(db.String(64), nullable=True)  # content hash of a row brought in by /api/migrate
 
 class ChatMessage(db.Model):
+    __table_args__ = (db.Index('ix_chat_message_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     role = db.Column(db.String(10), nullable=False)  # 'user' or 'ai'
@@ -299,12 +743,14 @@ class ChatMessage(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Report(db.Model):
+    __table_args__ = (db.Index('ix_report_user_id_timestamp', 'user_id', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     report_text = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 class KindnessEntry(db.Model):
+    __table_args__ = (db.Index('ix_kindness_entry_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     entry_text = db.Column(db.Text, nullable=False)
@@ -312,12 +758,16 @@ class KindnessEntry(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 class TrustTeamMember(db.Model):
+    __table_args__ = (
+        db.Index('ux_trust_team_member_user_id_import_key', 'user_id', 'import_key', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     relationship = db.Column(db.String(100), nullable=False)
     contact = db.Column(db.String(200), nullable=True)
     emoji = db.Column(db.String(10), nullable=True)
+    import_key = db.Column(db.String(64), nullable=True)
 
 class UserProgress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -328,10 +778,443 @@ class UserProgress(db.Model):
     kindness_count = db.Column(db.Integer, default=0)
     courage_practiced = db.Column(db.Integer, default=0)
     last_synced = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped by every sync that changes something
+
+class ProgressField(db.Model):
+    """One synced progress value and the UserProgress version that last changed it."""
+    __table_args__ = (
+        db.Index('ux_progress_field_user_id_key', 'user_id', 'key', unique=True),
+        db.Index('ix_progress_field_user_id_version', 'user_id', 'version'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    value = db.Column(db.Text, nullable=False)  # JSON
+    version = db.Column(db.Integer, nullable=False)
+
+class AppCounter(db.Model):
+    """A running total shown by /api/stats, shared by every worker (see UsageCounters)."""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+class VoiceJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    owner = db.Column(db.String(64), nullable=False)  # conversation_key() of whoever uploaded it
+    status = db.Column(db.String(10), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    audio = db.Column(db.LargeBinary, nullable=True)  # the upload, dropped once processed
+    transcript = db.Column(db.Text, nullable=True)
+    reply_wav = db.Column(db.LargeBinary, nullable=True)  # Buddy's spoken reply
+    reply_opus = db.Column(db.LargeBinary, nullable=True)  # same reply as Opus/WebM, much smaller
+    attempts = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class EmailOutbox(db.Model):
+    """An email waiting to go out, then the record of how it went (like the backend's NotificationLog)."""
+    __table_args__ = (db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),)
+    id = db.Column(db.String(32), primary_key=True)  # tracking id handed back to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    trigger_event = db.Column(db.String(100), nullable=True)  # e.g. 'send_alert'
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=True)
+    content = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, sending, sent, failed
+    priority = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 1: urgent, claimed first
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    provider_message_id = db.Column(db.String(255), nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+# --- Schema Migrations ---
+# db.create_all() only creates missing tables. Changes to existing tables go
+# here as numbered migrations; each one is recorded in schema_version once applied.
+
+MIGRATIONS = []  # (version, description, apply(connection))
+MIGRATION_LOCK_ID = 48151623  # Postgres advisory lock held while migrating
+
+def migration(version, description):
+    def register(apply):
+        MIGRATIONS.append((version, description, apply))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return apply
+    return register
+
+def create_index(conn, name, table, columns, unique=False):
+    """Add an index if it's missing. On Postgres it's built CONCURRENTLY, so writes carry on."""
+    concurrently = 'CONCURRENTLY ' if conn.dialect.name == 'postgresql' else ''
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    conn.exec_driver_sql(f'CREATE {kind} {concurrently}IF NOT EXISTS {name} ON {table} ({columns})')
+
+def drop_index(conn, name):
+    concurrently = 'CONCURRENTLY ' if conn.dialect.name == 'postgresql' else ''
+    conn.exec_driver_sql(f'DROP INDEX {concurrently}IF EXISTS {name}')
+
+def add_column(conn, table, column, ddl):
+    """Add a nullable column if it's missing (a metadata-only change on SQLite and Postgres)."""
+    if column not in {c['name'] for c in db.inspect(conn).get_columns(table)}:
+        conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}')
+
+@migration(1, 'Index history tables by user and time')
+def index_history_tables(conn):
+    for table in ('mood_entry', 'chat_message', 'report', 'kindness_entry'):
+        create_index(conn, f'ix_{table}_user_id_timestamp', table, 'user_id, timestamp')
+    create_index(conn, 'ix_trust_team_member_user_id', 'trust_team_member', 'user_id')
+
+@migration(2, 'Import keys for idempotent /api/migrate')
+def add_import_keys(conn):
+    for table in ('mood_entry', 'trust_team_member'):
+        add_column(conn, table, 'import_key', 'VARCHAR(64)')
+        create_index(conn, f'ux_{table}_user_id_import_key', table, 'user_id, import_key', unique=True)
+
+@migration(3, 'Version counter for progress sync')
+def add_progress_version(conn):
+    add_column(conn, 'user_progress', 'version', 'INTEGER NOT NULL DEFAULT 0')
+
+@migration(4, 'Add id to the history indexes for keyset pagination')
+def index_history_pages(conn):
+    for table in ('mood_entry', 'chat_message', 'kindness_entry'):
+        create_index(conn, f'ix_{table}_user_id_timestamp_id', table, 'user_id, timestamp, id')
+        drop_index(conn, f'ix_{table}_user_id_timestamp')  # a prefix of the new one
+
+@migration(5, 'Priority lane for queued emails')
+def add_email_priority(conn):
+    add_column(conn, 'email_outbox', 'priority', 'INTEGER NOT NULL DEFAULT 0')
+
+def run_migrations():
+    """Apply any migrations this database hasn't had yet. Safe to run from every worker."""
+    with db.engine.connect() as conn:
+        # Autocommit: CREATE INDEX CONCURRENTLY can't run inside a transaction
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        postgres = conn.dialect.name == 'postgresql'
+        conn.exec_driver_sql(
+            'CREATE TABLE IF NOT EXISTS schema_version '
+            '(version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at TIMESTAMP)'
+        )
+        if postgres:
+            conn.exec_driver_sql(f'SELECT pg_advisory_lock({MIGRATION_LOCK_ID})')
+        try:
+            applied = {row[0] for row in conn.exec_driver_sql('SELECT version FROM schema_version')}
+            for version, description, apply in MIGRATIONS:
+                if version in applied:
+                    continue
+                print(f"🗄️  Applying migration {version}: {description}")
+                apply(conn)
+                try:
+                    conn.execute(
+                        db.text('INSERT INTO schema_version (version, description, applied_at) '
+                                'VALUES (:version, :description, :applied_at)'),
+                        {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+                    )
+                except db.exc.IntegrityError:
+                    pass  # another worker finished the same (idempotent) migration first
+        finally:
+            if postgres:
+                conn.exec_driver_sql(f'SELECT pg_advisory_unlock({MIGRATION_LOCK_ID})')
+
+user_cache = UserCache(
+    ttl=float(os.getenv('USER_CACHE_TTL', '30')),  # 0 turns the cache off
+    max_users=int(os.getenv('USER_CACHE_MAX_USERS', '10000')),
+    # 1: keep entries in shared_state so workers share them
+    state=shared_state if os.getenv('USER_CACHE_SHARED', '0') == '1' else None
+)
+
+USER_DATETIME_COLUMNS = [c.key for c in User.__table__.columns if isinstance(c.type, db.DateTime)]
+
+def user_to_cache(user):
+    """A user's column values, made JSON-safe so shared state can hold them."""
+    values = {attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs}
+    for key in USER_DATETIME_COLUMNS:
+        if values[key] is not None:
+            values[key] = values[key].isoformat()
+    return values
+
+def user_from_cache(values):
+    """Attach a cached user as an already-loaded row: no SELECT, and changes to it still save."""
+    values = dict(values)
+    for key in USER_DATETIME_COLUMNS:
+        if values.get(key) is not None:
+            values[key] = datetime.fromisoformat(values[key])
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    user_id = int(user_id)
+    values = user_cache.get(user_id)
+    if values is None:
+        generation = user_cache.generation
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user_cache.put(user_id, user_to_cache(user), generation)
+        return user
+    return user_from_cache(values)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def note_user_changed(mapper, connection, target):
+    Session.object_session(target).info.setdefault('changed_users', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changed_users(session):
+    session.info.pop('changed_users', None)
+
+def load_conversation(key, limit):
+    """Rebuild a logged-in user's recent chat from the database."""
+    if not key.startswith('user:'):
+        return []
+    rows = (ChatMessage.query.filter_by(user_id=int(key.split(':', 1)[1]))
+            .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+            .limit(limit).all())
+    return [{"role": "assistant" if m.role == 'ai' else "user", "content": m.content}
+            for m in reversed(rows)]
+
+# Conversation history per user / browser session
+conversations = ConversationStore(
+    shared_state,
+    max_messages=int(os.getenv('CHAT_MAX_MESSAGES', '20')),
+    idle_seconds=int(os.getenv('CHAT_IDLE_SECONDS', '1800')),
+    loader=load_conversation
+)
+
+def conversation_key():
+    """Identify whose conversation this request belongs to."""
+    if current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    if 'chat_id' not in session:
+        session['chat_id'] = secrets.token_urlsafe(12)
+    return f"anon:{session['chat_id']}"
+
+# --- Write-Behind Buffer ---
+
+# The backend's EMERGENCY_KEYWORDS setting, matched the way its SafetyEngine
+# does (anywhere in the lowercased text), so both apps flag the same messages
+CRISIS_KEYWORDS = [keyword.lower() for keyword in backend_settings.EMERGENCY_KEYWORDS if keyword]
+
+def is_crisis(*texts):
+    """True if any of the texts mentions self-harm or suicide."""
+    return any(keyword in (text or '').lower() for text in texts for keyword in CRISIS_KEYWORDS)
+
+class WriteOutcomeUnknown(Exception):
+    """Rows were handed to the write-behind flush, which stopped before reporting back."""
+
+class WriteBehindBuffer:
+    """Batches inserts from many requests into one transaction (group commit).
+
+    Rows wait at most ``interval`` seconds, or until ``max_rows`` are queued,
+    then go to the database together. With ``durable`` each caller blocks
+    until its rows are committed, so an acknowledged write is never lost but
+    requests still share one commit; without it callers return at once and a
+    crash can lose the last ``interval`` worth of rows. close() flushes what is
+    left and runs at interpreter exit.
+
+    Once queued, rows are written whatever the caller does, so a durable
+    caller never gives up on a slow flush (that would fail a request whose
+    rows then commit, and a retry would insert them twice). It keeps waiting
+    while the flush thread is alive, and raises WriteOutcomeUnknown if that
+    thread died without answering.
+
+    A batch only ever holds whole add() calls (one larger than ``max_rows``
+    goes alone), so each caller's rows commit and are answered together.
+    """
+
+    def __init__(self, interval=0.02, max_rows=200, durable=False, wait_timeout=5.0):
+        self.interval = interval
+        self.max_rows = max_rows
+        self.durable = durable
+        self.wait_timeout = wait_timeout
+        self._pending = deque()  # ([(table, values)], future) per add()
+        self._queued = 0  # rows in _pending
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def add(self, rows):
+        now = datetime.utcnow()
+        future = Future() if self.durable else None
+        entries = []
+        for row in rows:
+            table = row.__table__
+            values = {c.key: getattr(row, c.key) for c in table.columns if getattr(row, c.key) is not None}
+            if 'timestamp' in table.columns:
+                values.setdefault('timestamp', now)  # when it happened, not when it's flushed
+            entries.append((table, values))
+        with self._cond:
+            self._pending.append((entries, future))
+            self._queued += len(entries)
+            if self._thread is None or not self._thread.is_alive():
+                self._closed = False
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        if future is not None:
+            self._wait(future)
+
+    def _wait(self, future):
+        while True:
+            try:
+                return future.result(timeout=self.wait_timeout)
+            except FutureTimeout:
+                thread = self._thread
+                if thread is None or not thread.is_alive():
+                    raise WriteOutcomeUnknown('The write-behind flush stopped before confirming these rows')
+                print(f"Write-behind flush still running after {self.wait_timeout}s, waiting for it")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Give other requests a moment to join this batch
+                deadline = time.monotonic() + self.interval
+                while self._queued < self.max_rows and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, size = [], 0
+                while self._pending and (not batch or size + len(self._pending[0][0]) <= self.max_rows):
+                    entries, future = self._pending.popleft()
+                    batch.append((entries, future))
+                    size += len(entries)
+                self._queued -= size
+            self._write(batch)
+
+    def _write(self, batch):
+        # executemany needs the same columns in every row, so group by table and column set
+        groups = {}
+        rows = 0
+        for entries, _ in batch:
+            for table, values in entries:
+                groups.setdefault((table, tuple(sorted(values))), []).append(values)
+            rows += len(entries)
+        error = None
+        for attempt in range(2):
+            try:
+                with app.app_context(), db.engine.begin() as conn:
+                    for (table, _), rows in groups.items():
+                        conn.execute(table.insert(), rows)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                time.sleep(0.1)
+        if error is not None:
+            print(f"Write-behind flush failed, {rows} rows lost: {error}")
+        for _, future in batch:
+            if future is None or future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    def close(self):
+        """Flush everything still queued and stop the flush thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=self.wait_timeout)
+
+WRITE_BEHIND = os.getenv('WRITE_BEHIND', '0') == '1'
+write_behind = WriteBehindBuffer(
+    interval=float(os.getenv('WRITE_BEHIND_INTERVAL_MS', '20')) / 1000,
+    max_rows=int(os.getenv('WRITE_BEHIND_MAX_ROWS', '200')),
+    # 1: requests wait for their group commit; 0: acknowledge straight away
+    durable=os.getenv('WRITE_BEHIND_DURABLE', '1') == '1'
+)
+atexit.register(write_behind.close)
+
+@app.errorhandler(WriteOutcomeUnknown)
+def write_outcome_unknown(e):
+    # Not a plain failure: the rows may well be saved, so the client shouldn't resend them
+    return jsonify({'error': 'Your entry may already have been saved. Please refresh before trying again.',
+                    'outcome': 'unknown'}), 503
+
+def persist(*rows, urgent=False):
+    """Insert new rows, batched through the write-behind buffer when it's on.
+
+    ``urgent`` rows (anything touching a crisis) always commit straight away.
+    """
+    if urgent or not WRITE_BEHIND:
+        db.session.add_all(rows)
+        db.session.commit()
+    else:
+        write_behind.add(rows)
+
+# --- Usage Counters ---
+
+class UsageCounters:
+    """Constant-memory event counts, summed across workers in the app_counter table.
+
+    incr() only bumps a number in this process. A background thread adds the
+    deltas to the database every ``interval`` seconds (and at exit), so
+    counting costs no query on the request path and every worker feeds the
+    same totals. If a flush fails the deltas are kept for the next one.
+    """
+
+    UPSERT = db.text(
+        'INSERT INTO app_counter (name, value) VALUES (:name, :delta) '
+        'ON CONFLICT (name) DO UPDATE SET value = app_counter.value + excluded.value'
+    )
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._pending = {}  # name -> count not yet in the database
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._pending[name] = self._pending.get(name, 0) + amount
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='usage-counters', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            with app.app_context(), db.engine.begin() as conn:
+                conn.execute(self.UPSERT, [{'name': name, 'delta': delta} for name, delta in pending.items()])
+        except Exception as e:
+            print(f"Couldn't save usage counters, will retry: {e}")
+            with self._lock:
+                for name, delta in pending.items():
+                    self._pending[name] = self._pending.get(name, 0) + delta
+
+    def totals(self):
+        """Every worker's counts, including this one's not yet flushed."""
+        self.flush()
+        rows = db.session.execute(db.select(AppCounter.name, AppCounter.value)).all()
+        return {name: value for name, value in rows}
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+usage = UsageCounters(interval=float(os.getenv('USAGE_FLUSH_INTERVAL', '5')))
+atexit.register(usage.close)
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -3156,6 +4039,9 @@ HTML_TEMPLATE = """
             }
         }
 
+        // Stream Buddy's reply word by word when the browser can read response bodies
+        const CHAT_STREAMING = !!(window.ReadableStream && window.TextDecoder);
+
         function sendMessage() {
             const input = document.getElementById('chat-input');
             const message = input.value.trim();
@@ -3171,24 +4057,71 @@ HTML_TEMPLATE = """
             // Clear input
             input.value = '';
 
+            const aiDiv = document.createElement('div');
+            aiDiv.className = 'message ai-message';
+
+            function chatDone() {
+                chatCount++;
+                localStorage.setItem('chatCount', chatCount);
+                if (typeof updateProgressDashboard === 'function') updateProgressDashboard();
+            }
+
             // Send to backend and get AI response
-            fetch('/api/chat', {
+            const reply = CHAT_STREAMING
+                ? streamChatReply(message, aiDiv, chatMessages).catch(() => aiDiv.isConnected ? null : fetchChatReply(message))
+                : fetchChatReply(message);
+            reply.then(text => {
+                if (text !== null) {
+                    aiDiv.textContent = text;
+                    chatMessages.appendChild(aiDiv);
+                }
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+                chatDone();
+            });
+        }
+
+        function fetchChatReply(message) {
+            return fetch('/api/chat', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
                 body: JSON.stringify({message: message})
             })
             .then(response => response.json())
-            .then(data => {
-                const aiDiv = document.createElement('div');
-                aiDiv.className = 'message ai-message';
-                aiDiv.textContent = data.response;
-                chatMessages.appendChild(aiDiv);
-                chatMessages.scrollTop = chatMessages.scrollHeight;
-                
-                chatCount++;
-                localStorage.setItem('chatCount', chatCount);
-                if (typeof updateProgressDashboard === 'function') updateProgressDashboard();
+            .then(data => data.response);
+        }
+
+        async function streamChatReply(message, aiDiv, chatMessages) {
+            const response = await fetch('/api/chat/stream', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json', 'Accept': 'text/event-stream'},
+                body: JSON.stringify({message: message})
             });
+            if (!response.ok || !response.body) throw new Error('stream unavailable');
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const {value, done} = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, {stream: true});
+                const frames = buffer.split('\\n\\n');
+                buffer = frames.pop();
+                for (const frame of frames) {
+                    const dataLine = frame.split('\\n').find(line => line.startsWith('data: '));
+                    if (!dataLine) continue;
+                    const data = JSON.parse(dataLine.slice(6));
+                    if (frame.startsWith('event: done')) {
+                        aiDiv.textContent = data.response;
+                    } else if (data.delta) {
+                        if (!aiDiv.isConnected) chatMessages.appendChild(aiDiv);
+                        aiDiv.textContent += data.delta;
+                        chatMessages.scrollTop = chatMessages.scrollHeight;
+                    }
+                }
+            }
+            if (!aiDiv.isConnected) chatMessages.appendChild(aiDiv);
+            return null;
         }
 
         function populateReportTrustDropdown() {
@@ -3424,24 +4357,28 @@ HTML_TEMPLATE = """
             try {
                 const formData = new FormData();
                 formData.append('audio', audioBlob, 'kindness.webm');
-                const response = await fetch('/api/kindness-voice', {
+                let response = await fetch('/api/kindness-voice', {
                     method: 'POST',
                     body: formData
                 });
-                const data = await response.json();
+                let data = await response.json();
+                // Buddy listens in the background; check back until the reply is ready
+                for (let tries = 0; response.status === 202 && data.status_url && tries < 90; tries++) {
+                    await new Promise(resolve => setTimeout(resolve, tries < 10 ? 1000 : 2000));
+                    response = await fetch(data.status_url);
+                    if (response.status === 202) continue;
+                    data = await response.json();
+                    break;
+                }
                 const buddyText = data.response || "That's really thoughtful of you!";
                 entry.buddyResponse = buddyText;
                 localStorage.setItem('kindnessEntries', JSON.stringify(kindnessEntries));
                 renderKindnessEntries();
 
-                // Play Buddy's voice reply
-                if (data.audio) {
-                    const audioBytes = atob(data.audio);
-                    const audioArray = new Uint8Array(audioBytes.length);
-                    for (let i = 0; i < audioBytes.length; i++) audioArray[i] = audioBytes.charCodeAt(i);
-                    const buddyAudioBlob = new Blob([audioArray], { type: 'audio/wav' });
-                    const buddyAudioUrl = URL.createObjectURL(buddyAudioBlob);
-                    const buddyAudio = new Audio(buddyAudioUrl);
+                // Play Buddy's voice reply (streamed; Opus unless the browser can't play it)
+                if (data.audio_url) {
+                    const canOpus = new Audio().canPlayType('audio/webm; codecs=opus') !== '';
+                    const buddyAudio = new Audio(data.audio_url + (canOpus ? '' : '?format=wav'));
                     buddyAudio.play();
                 }
             } catch (error) {
@@ -5198,7 +6135,8 @@ You are enough. Right now. As you are.`
                 currentUserData = data;
                 hideAuthScreen();
                 updateAuthUI(true);
-                migrateLocalStorageToServer();
+                // Then pull the merged progress, so the first delta sync starts from the server's version
+                migrateLocalStorageToServer().then(loadUserProgress);
             } catch (err) {
                 document.getElementById('auth-error').textContent = 'Connection error. Try again.';
             }
@@ -5239,23 +6177,11 @@ You are enough. Right now. As you are.`
         }
 
         async function loadUserProgress() {
+            // Fresh account on this browser: pull everything, then sync deltas from here on
+            progressVersion = 0;
+            syncedProgress = {};
             try {
-                const res = await fetch('/api/progress/load');
-                if (res.ok) {
-                    const data = await res.json();
-                    xp = data.xp || 0;
-                    level = data.level || 1;
-                    kindnessCount = data.kindnessCount || 0;
-                    totalCouragePracticed = data.couragePracticed || 0;
-                    if (data.badges && data.badges.length) {
-                        data.badges.forEach(b => {
-                            if (!unlockedBadges.includes(b)) unlockedBadges.push(b);
-                        });
-                    }
-                    updateXPDisplay();
-                    updateBadgesDisplay();
-                    if (typeof updateProgressDashboard === 'function') updateProgressDashboard();
-                }
+                await syncProgress(true);
             } catch (err) {}
             // Load trust team from server
             try {
@@ -5274,20 +6200,83 @@ You are enough. Right now. As you are.`
             } catch (err) {}
         }
 
+        // Versioned progress sync: send only the values that changed since the
+        // last sync plus the version they were based on; the server answers with
+        // its new version and whatever changed on other devices.
+        let progressVersion = 0;
+        let syncedProgress = {};
+
+        function progressSnapshot() {
+            return {
+                xp, level, kindnessCount,
+                couragePracticed: totalCouragePracticed,
+                badges: Object.keys(badges).filter(b => badges[b]),
+                courageMeter, courageUnlockedLevel
+            };
+        }
+
+        function applyProgress(changes) {
+            if ('xp' in changes) { xp = changes.xp; localStorage.setItem('xp', xp); }
+            if ('level' in changes) { level = changes.level; localStorage.setItem('level', level); }
+            if ('kindnessCount' in changes) {
+                kindnessCount = changes.kindnessCount;
+                localStorage.setItem('kindnessCount', kindnessCount);
+            }
+            if ('couragePracticed' in changes) {
+                totalCouragePracticed = changes.couragePracticed;
+                localStorage.setItem('totalCouragePracticed', totalCouragePracticed);
+            }
+            if ('courageMeter' in changes) {
+                courageMeter = changes.courageMeter;
+                localStorage.setItem('courageMeter', courageMeter);
+            }
+            if ('courageUnlockedLevel' in changes) {
+                courageUnlockedLevel = changes.courageUnlockedLevel;
+                localStorage.setItem('courageUnlockedLevel', courageUnlockedLevel);
+            }
+            if (Array.isArray(changes.badges)) {
+                changes.badges.forEach(b => {
+                    badges[b] = true;
+                    const badge = document.getElementById(`badge-${b}`);
+                    if (badge) badge.classList.add('earned');
+                });
+                localStorage.setItem('badges', JSON.stringify(badges));
+            }
+            const snapshot = progressSnapshot();
+            Object.keys(changes).forEach(key => { syncedProgress[key] = snapshot[key]; });
+            updateXPDisplay();
+            if (typeof updateCourageMeter === 'function') updateCourageMeter();
+            if (typeof updateProgressDashboard === 'function') updateProgressDashboard();
+        }
+
+        async function syncProgress(pullOnly) {
+            const snapshot = progressSnapshot();
+            const changes = {};
+            if (!pullOnly) {
+                Object.keys(snapshot).forEach(key => {
+                    if (JSON.stringify(snapshot[key]) !== JSON.stringify(syncedProgress[key])) changes[key] = snapshot[key];
+                });
+                if (Object.keys(changes).length === 0) return;
+            }
+            const res = await fetch('/api/progress/sync', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({version: progressVersion, changes})
+            });
+            if (!res.ok) return;
+            const data = await res.json();
+            Object.assign(syncedProgress, changes);
+            progressVersion = data.version;
+            applyProgress(data.changes || {});
+        }
+
         let syncTimer = null;
         function syncProgressToServer() {
             if (!currentUserData) return;
             clearTimeout(syncTimer);
             syncTimer = setTimeout(async () => {
                 try {
-                    await fetch('/api/progress/sync', {
-                        method: 'POST',
-                        headers: {'Content-Type': 'application/json'},
-                        body: JSON.stringify({
-                            xp, level, badges: unlockedBadges,
-                            kindnessCount, couragePracticed: totalCouragePracticed
-                        })
-                    });
+                    await syncProgress(false);
                 } catch (err) {}
             }, 2000);
         }
@@ -5298,7 +6287,7 @@ You are enough. Right now. As you are.`
             const progress = {
                 xp: parseInt(localStorage.getItem('xp') || '0'),
                 level: parseInt(localStorage.getItem('level') || '1'),
-                badges: JSON.parse(localStorage.getItem('unlockedBadges') || '[]'),
+                badges: Object.keys(JSON.parse(localStorage.getItem('badges') || '{}')),
                 kindnessCount: parseInt(localStorage.getItem('kindnessCount') || '0'),
                 couragePracticed: parseInt(localStorage.getItem('totalCouragePracticed') || '0')
             };
@@ -5463,101 +6452,532 @@ def change_password():
     db.session.commit()
     return jsonify({'status': 'success'})
 
+class PrecompressedAsset:
+    """A response body rendered once and kept ready in every encoding we serve.
+
+    The body is compressed at startup (gzip, plus brotli when installed) so a
+    request only picks a variant from Accept-Encoding. Each variant has its own
+    strong ETag; a matching If-None-Match gets a 304 with no body.
+    """
+
+    def __init__(self, body, mimetype='text/html', immutable=False):
+        data = body.encode('utf-8')
+        self.digest = hashlib.sha256(data).hexdigest()[:20]
+        self.mimetype = mimetype
+        self.immutable = immutable
+        self.variants = {'identity': (data, self.digest)}
+        self.variants['gzip'] = (gzip.compress(data, compresslevel=9, mtime=0), self.digest + '-gz')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(data, quality=11), self.digest + '-br')
+        # Ordered by preference when the client rates several equally
+        self.encodings = [e for e in ('br', 'gzip', 'identity') if e in self.variants]
+
+    def response(self):
+        encoding = request.accept_encodings.best_match(self.encodings, default='identity')
+        data, etag = self.variants.get(encoding, self.variants['identity'])
+        response = Response(data, mimetype=self.mimetype)
+        if encoding != 'identity':
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        if self.immutable:
+            # Fingerprinted URL: a change in content is a new URL
+            response.cache_control.public = True
+            response.cache_control.max_age = 31536000
+            response.cache_control.immutable = True
+        else:
+            # Always revalidate so a deploy shows up straight away; the ETag keeps that cheap
+            response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+INLINE_ASSET_RE = re.compile(r'<(style|script)>(.*?)</\1>', re.S)
+
+def split_inline_assets(html):
+    """Move inline <style>/<script> blocks into fingerprinted bundles.
+
+    Returns the remaining HTML shell and a {filename: PrecompressedAsset} map
+    for /static/dist/. Each block keeps its place in the page; scripts are
+    deferred, which is safe because they only touch the DOM from handlers.
+    """
+    bundles = {}
+
+    def extract(match):
+        tag, body = match.groups()
+        ext, mimetype = ('css', 'text/css') if tag == 'style' else ('js', 'text/javascript')
+        asset = PrecompressedAsset(body, mimetype=mimetype, immutable=True)
+        name = f"app.{asset.digest[:12]}.{ext}"
+        bundles[name] = asset
+        if tag == 'style':
+            return f'<link rel="stylesheet" href="/static/dist/{name}">'
+        return f'<script src="/static/dist/{name}" defer></script>'
+
+    shell = INLINE_ASSET_RE.sub(extract, html)
+    return shell, bundles
+
+# --- Buddy Media ---
+
+MEDIA_DIR = os.path.join(app.static_folder, 'buddy')
+MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR', os.path.join(app.instance_path, 'media'))
+# Derive variants lazily in the web process. With several workers, set this to 0 and run
+# `python simple_app.py --derive-media` as a build step instead.
+MEDIA_DERIVE = os.getenv('MEDIA_DERIVE', '1') == '1'
+MEDIA_DERIVE_TIMEOUT = float(os.getenv('MEDIA_DERIVE_TIMEOUT', '300'))
+# Hand file bodies to nginx/Apache (X-Sendfile) instead of streaming them from the worker
+app.config['USE_X_SENDFILE'] = os.getenv('MEDIA_X_SENDFILE', '0') == '1'
+# Effective connection types (ECT client hint) that get the lightweight variants
+SLOW_CONNECTIONS = {'slow-2g', '2g', '3g'}
+
+POSTER_FRAME = ('.poster.jpg', ['-frames:v', '1', '-q:v', '4'])
+# Variants derived from each source, by source extension: kind -> (name suffix, ffmpeg output args)
+MEDIA_VARIANTS = {
+    '.webm': {
+        'poster': POSTER_FRAME,
+        'lite': ('.lite.webm', ['-an', '-vf', "scale='min(iw,320)':-2,fps=15", '-c:v', 'libvpx-vp9',
+                                '-crf', '45', '-b:v', '0', '-deadline', 'good', '-cpu-used', '4']),
+    },
+    '.mp4': {
+        'poster': POSTER_FRAME,
+        'lite': ('.lite.mp4', ['-an', '-vf', "scale='min(iw,480)':-2,fps=15", '-c:v', 'libx264',
+                               '-crf', '32', '-preset', 'slow', '-pix_fmt', 'yuv420p', '-movflags', '+faststart']),
+    },
+    '.gif': {
+        'poster': POSTER_FRAME,
+        'webp': ('.webp', ['-c:v', 'libwebp_anim', '-q:v', '60', '-loop', '0']),
+    },
+}
+
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+class MediaLibrary:
+    """The files in static/buddy plus lighter variants derived from them.
+
+    Sources are fingerprinted at startup. Variants (a poster frame, a
+    low-bitrate video, an animated WebP in place of the GIF) are made by ffmpeg
+    in a background thread and cached under MEDIA_CACHE_DIR/<fingerprint>/, so
+    a changed source never picks up stale variants. A lock file in the cache
+    keeps several worker processes from running ffmpeg side by side.
+    """
+
+    def __init__(self, source_dir, cache_dir):
+        self.cache_dir = cache_dir
+        self.sources = {}  # name -> (path, fingerprint)
+        if os.path.isdir(source_dir):
+            for name in sorted(os.listdir(source_dir)):
+                path = os.path.join(source_dir, name)
+                if os.path.isfile(path):
+                    self.sources[name] = (path, file_fingerprint(path))
+        self.derived = {}  # variant name -> (source name, kind)
+        for name in self.sources:
+            stem, ext = os.path.splitext(name)
+            for kind, (suffix, _) in MEDIA_VARIANTS.get(ext.lower(), {}).items():
+                self.derived.setdefault(stem + suffix, (name, kind))
+        self._started = False
+        self._lock = threading.Lock()
+
+    def variant_file(self, name, kind):
+        stem, ext = os.path.splitext(name)
+        suffix = MEDIA_VARIANTS[ext.lower()][kind][0]
+        return os.path.join(self.cache_dir, self.sources[name][1], stem + suffix)
+
+    def variant_name(self, name, kind):
+        """Name of the ``kind`` variant of ``name`` if it has been made, else None."""
+        stem, ext = os.path.splitext(name)
+        variant = MEDIA_VARIANTS.get(ext.lower(), {}).get(kind)
+        if variant and self.derived.get(stem + variant[0]) == (name, kind) \
+                and os.path.exists(self.variant_file(name, kind)):
+            return stem + variant[0]
+        return None
+
+    def resolve(self, name):
+        """(path, etag) for a source or a finished variant, else None."""
+        if name in self.sources:
+            path, fingerprint = self.sources[name]
+            return path, fingerprint
+        if name in self.derived:
+            source, kind = self.derived[name]
+            path = self.variant_file(source, kind)
+            if os.path.exists(path):
+                return path, f"{self.sources[source][1]}-{kind}"
+        return None
+
+    def negotiate(self, name):
+        """Pick what to send for ``name``: (name to serve, whether that choice is final).
+
+        Clients asking to save data (Save-Data, or a slow ECT hint) get the
+        low-bitrate video, or the poster frame in place of the GIF. Browsers
+        that accept WebP images get the animated WebP instead of the GIF. The
+        choice isn't final while a wanted variant is still being made.
+        """
+        stem, ext = os.path.splitext(name)
+        variants = MEDIA_VARIANTS.get(ext.lower())
+        if not variants or name not in self.sources:
+            return name, True
+        wanted = []
+        if request.headers.get('Save-Data', '').lower() == 'on' \
+                or request.headers.get('ECT', '').lower() in SLOW_CONNECTIONS:
+            wanted.append('lite' if 'lite' in variants else 'poster')
+        if 'webp' in variants and any(value == 'image/webp' for value, quality in request.accept_mimetypes if quality):
+            wanted.append('webp')
+        for kind in wanted:
+            served = self.variant_name(name, kind)
+            if served:
+                return served, True
+        return name, not wanted
+
+    def rewrite_html(self, html):
+        """Fingerprint /static/buddy URLs in ``html`` and give videos a poster frame."""
+        def add_poster(match):
+            tag, rest, source = match.groups()
+            poster = os.path.splitext(source)[0] + POSTER_FRAME[0]
+            if 'poster=' in tag or self.variant_name(source, 'poster') != poster:
+                return match.group(0)
+            return f'{tag} poster="/static/buddy/{poster}"{rest}'
+
+        def fingerprint(match):
+            name = match.group(1)
+            if name in self.derived:
+                name_fingerprint = self.sources[self.derived[name][0]][1]
+            elif name in self.sources:
+                name_fingerprint = self.sources[name][1]
+            else:
+                return match.group(0)
+            return f'/static/buddy/{name}?v={name_fingerprint}'
+
+        html = re.sub(r'(<video\b[^>]*?)(>\s*<source src="/static/buddy/([\w.-]+)")', add_poster, html)
+        return re.sub(r'/static/buddy/([\w.-]+)', fingerprint, html)
+
+    def posters(self):
+        """Names of the poster frames made so far."""
+        return frozenset(name for name, (source, kind) in self.derived.items()
+                         if kind == 'poster' and os.path.exists(self.variant_file(source, kind)))
+
+    def ensure_variants(self):
+        """Start making any missing variants in the background, once per process."""
+        if self._started or not MEDIA_DERIVE:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self.derive_all, name='media-variants', daemon=True).start()
+
+    def _acquire(self, lock):
+        for _ in range(2):
+            try:
+                os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    # The holder touches the lock after every variant
+                    if time.time() - os.path.getmtime(lock) < MEDIA_DERIVE_TIMEOUT + 60:
+                        return False
+                    os.remove(lock)  # left behind by a process that died mid-run
+                except FileNotFoundError:
+                    pass
+        return False
+
+    def derive_all(self):
+        """Make the missing variants; False if another process is already making them."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        lock = os.path.join(self.cache_dir, '.deriving')
+        if not self._acquire(lock):
+            return False
+        try:
+            self._derive_missing(lock)
+        finally:
+            os.remove(lock)
+        return True
+
+    def _derive_missing(self, lock):
+        for source, kind in list(self.derived.values()):
+            target = self.variant_file(source, kind)
+            if os.path.exists(target):
+                continue
+            os.utime(lock)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Unique temp name (keeping the extension for ffmpeg), so workers don't collide
+            partial = os.path.join(os.path.dirname(target), f".{os.getpid()}-{os.path.basename(target)}")
+            stem, ext = os.path.splitext(source)
+            args = MEDIA_VARIANTS[ext.lower()][kind][1]
+            try:
+                result = subprocess.run(
+                    [FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-y',
+                     '-i', self.sources[source][0], *args, partial],
+                    capture_output=True, timeout=MEDIA_DERIVE_TIMEOUT
+                )
+            except FileNotFoundError:
+                print("Media variants disabled: ffmpeg not found")
+                return
+            except subprocess.TimeoutExpired:
+                result = None
+            if result is None or result.returncode != 0:
+                error = result.stderr.decode('utf-8', 'replace').strip() if result else 'timed out'
+                print(f"Media variant error ({source} {kind}): {error}")
+                if os.path.exists(partial):
+                    os.remove(partial)
+                continue
+            os.replace(partial, target)
+
+media_library = MediaLibrary(MEDIA_DIR, MEDIA_CACHE_DIR)
+
+@app.route('/static/buddy/<name>')
+def buddy_media(name):
+    """Buddy's animations and videos: Range requests, sendfile and per-client variants."""
+    media_library.ensure_variants()
+    served, final = media_library.negotiate(name)
+    found = media_library.resolve(served)
+    if found is None:
+        return jsonify({'error': 'Not found'}), 404
+    path, etag = found
+    response = send_file(path, conditional=True, etag=etag, max_age=None)
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    if request.args.get('v') and final:
+        # Fingerprinted URL: a new source file means a new URL
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = 3600 if final else 60
+    response.vary.update(['Save-Data', 'ECT'])
+    if os.path.splitext(name)[1].lower() == '.gif':
+        response.vary.add('Accept')
+    return response
+
+# The template has no per-request state, so it goes through Jinja exactly once
+# and is split into a small page shell plus long-cached CSS/JS bundles
+home_html = app.jinja_env.from_string(HTML_TEMPLATE).render()
+home_posters = media_library.posters()
+home_shell, static_bundles = split_inline_assets(media_library.rewrite_html(home_html))
+home_page = PrecompressedAsset(home_shell)
+
+def refresh_home_page():
+    """Rebuild the shell once more poster frames exist (the bundles don't change)."""
+    global home_posters, home_page
+    posters = media_library.posters()
+    if posters != home_posters:
+        home_posters = posters
+        home_page = PrecompressedAsset(split_inline_assets(media_library.rewrite_html(home_html))[0])
+
 @app.route('/')
 def home():
-    return render_template_string(HTML_TEMPLATE)
+    refresh_home_page()
+    response = home_page.response()
+    # Ask for the connection-type hint used to pick media variants
+    response.headers['Accept-CH'] = 'ECT, Save-Data'
+    return response
+
+@app.route('/static/dist/<name>')
+def static_bundle(name):
+    asset = static_bundles.get(name)
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    return asset.response()
 
 @app.route('/api/mood', methods=['POST'])
 def save_mood():
     data = request.json
-    mood_entries.append(data)
+    usage.incr('moods')
     if current_user.is_authenticated:
         entry = MoodEntry(user_id=current_user.id, mood=data.get('mood', ''), note=data.get('note', ''))
-        db.session.add(entry)
-        db.session.commit()
+        persist(entry, urgent=is_crisis(entry.note))
     return jsonify({'status': 'success', 'message': 'Mood saved'})
 
+CHAT_ERROR_RESPONSE = "Oops, I'm having trouble thinking right now. Can you try again in a moment? 💙"
+# Ends a streamed reply the client disconnected from before it was finished
+CHAT_TRUNCATED_MARK = " [reply cut short]"
+
+def build_chat_messages(key, user_message):
+    """Add the user's message to their history and build the prompt for the model."""
+    # The store only keeps the last CHAT_MAX_MESSAGES to stay within token limits
+    conversations.history(key)
+    conversations.append(key, "user", user_message)
+    return [
+        {"role": "system", "content": BUDDY_SYSTEM_PROMPT},
+        *conversations.history(key)
+    ]
+
+def save_chat_turn(key, user_id, user_message, response):
+    """Save Buddy's reply to history and, for logged-in users, to the database."""
+    conversations.append(key, "assistant", response)
+    usage.incr('chats')
+    if user_id is not None:
+        persist(ChatMessage(user_id=user_id, role='user', content=user_message),
+                ChatMessage(user_id=user_id, role='ai', content=response),
+                urgent=is_crisis(user_message))
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     data = request.json
     user_message = data.get('message', '')
-
-    # Add user message to conversation history
-    conversation_history.append({"role": "user", "content": user_message})
-
-    # Keep only last 20 messages to stay within token limits
-    recent_history = conversation_history[-20:]
+    key = conversation_key()
+    messages = build_chat_messages(key, user_message)
 
     try:
-        completion = client.chat.completions.create(
+        completion = llm.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": BUDDY_SYSTEM_PROMPT},
-                *recent_history
-            ],
+            messages=messages,
             max_tokens=200,
             temperature=0.7
         )
         response = completion.choices[0].message.content
     except Exception as e:
         print(f"OpenAI API error: {e}")
-        response = "Oops, I'm having trouble thinking right now. Can you try again in a moment? 💙"
+        response = CHAT_ERROR_RESPONSE
 
-    # Save assistant response to history
-    conversation_history.append({"role": "assistant", "content": response})
-    chat_history.append({'user': user_message, 'ai': response})
-    if current_user.is_authenticated:
-        db.session.add(ChatMessage(user_id=current_user.id, role='user', content=user_message))
-        db.session.add(ChatMessage(user_id=current_user.id, role='ai', content=response))
-        db.session.commit()
+    user_id = current_user.id if current_user.is_authenticated else None
+    save_chat_turn(key, user_id, user_message, response)
     return jsonify({'response': response})
 
+def sse_event(payload, event=None):
+    """Format one Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(payload)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Same as /api/chat, but relays Buddy's reply token by token as Server-Sent Events.
+
+    Emits ``data: {"delta": ...}`` frames while the model is writing, then a single
+    ``event: done`` frame carrying the full reply once it has been saved. If the
+    client disconnects first, the part of the reply it got is saved, marked
+    with CHAT_TRUNCATED_MARK, so the history and Buddy's context still agree.
+    """
+    data = request.json
+    user_message = data.get('message', '')
+    key = conversation_key()
+    user_id = current_user.id if current_user.is_authenticated else None
+
+    def generate():
+        # Only once the response is actually being streamed, so a client that
+        # never reads it leaves no half turn behind
+        messages = build_chat_messages(key, user_message)
+        parts = []
+        saved = False
+        try:
+            try:
+                stream = llm.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    max_tokens=200,
+                    temperature=0.7,
+                    stream=True
+                )
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield sse_event({'delta': delta})
+            except Exception as e:
+                print(f"OpenAI API error: {e}")
+                if not parts:
+                    parts.append(CHAT_ERROR_RESPONSE)
+                    yield sse_event({'delta': CHAT_ERROR_RESPONSE})
+
+            response = ''.join(parts)
+            saved = True
+            save_chat_turn(key, user_id, user_message, response)
+            yield sse_event({'response': response}, event='done')
+        finally:
+            if not saved:
+                # Closed mid-reply (GeneratorExit): keep what was said so far
+                save_chat_turn(key, user_id, user_message, ''.join(parts) + CHAT_TRUNCATED_MARK)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/report', methods=['POST'])
 def submit_report():
     data = request.json
-    reports.append(data)
+    usage.incr('reports')
     if current_user.is_authenticated:
         report = Report(user_id=current_user.id, report_text=json.dumps(data))
-        db.session.add(report)
-        db.session.commit()
+        persist(report, urgent=is_crisis(report.report_text))
     return jsonify({'status': 'success', 'message': 'Report submitted'})
 
-@app.route('/api/kindness-voice', methods=['POST'])
-def kindness_voice():
-    """Listen to a voice kindness entry with GPT-4o and respond."""
-    import base64
-
-    audio_file = request.files.get('audio')
-    if not audio_file:
-        return jsonify({'response': 'I couldn\'t hear your message. Try again!'}), 400
-
-    import subprocess, tempfile
-
-    audio_bytes = audio_file.read()
-
-    # Convert webm to wav using ffmpeg (GPT-4o only accepts wav/mp3)
-    with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as tmp_in:
-        tmp_in.write(audio_bytes)
-        tmp_in_path = tmp_in.name
-    tmp_out_path = tmp_in_path.replace('.webm', '.wav')
-
+# --- Voice Transcoding ---
+
+FFMPEG_BIN = os.getenv('FFMPEG_BIN', 'ffmpeg')
+TRANSCODE_TIMEOUT = float(os.getenv('TRANSCODE_TIMEOUT', '10'))
+# At most this many decodes at once, so a burst of voice entries can't swamp the box
+transcode_slots = threading.BoundedSemaphore(int(os.getenv('TRANSCODE_MAX_WORKERS', '2')))
+
+class TranscodeError(Exception):
+    pass
+
+def pcm_to_wav(pcm, rate):
+    """Wrap 16-bit mono PCM in a WAV header."""
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+def decode_with_av(audio_bytes, rate):
+    with av.open(io.BytesIO(audio_bytes)) as container:
+        resampler = av.AudioResampler(format='s16', layout='mono', rate=rate)
+        chunks = []
+        for frame in container.decode(audio=0):
+            for out in resampler.resample(frame):
+                chunks.append(bytes(out.planes[0])[:out.samples * 2])
+        for out in resampler.resample(None):
+            chunks.append(bytes(out.planes[0])[:out.samples * 2])
+    return b''.join(chunks)
+
+def run_ffmpeg(args, input_bytes, timeout):
+    """Pipe bytes through ffmpeg's stdin/stdout."""
+    result = subprocess.run(
+        [FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', *args, 'pipe:1'],
+        input=input_bytes, capture_output=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise TranscodeError(result.stderr.decode('utf-8', 'replace').strip())
+    return result.stdout
+
+def decode_with_ffmpeg(audio_bytes, rate, timeout):
+    return run_ffmpeg(['-f', 's16le', '-acodec', 'pcm_s16le', '-ar', str(rate), '-ac', '1'],
+                      audio_bytes, timeout)
+
+def transcode_to_wav(audio_bytes, rate=16000, timeout=TRANSCODE_TIMEOUT):
+    """Convert a browser recording (webm/ogg/mp4) to mono WAV without touching disk.
+
+    Uses PyAV in-process when available, otherwise pipes through ffmpeg's
+    stdin/stdout. Raises TranscodeError if no worker frees up within ``timeout``.
+    """
+    if not transcode_slots.acquire(timeout=timeout):
+        raise TranscodeError('All transcoding workers are busy')
     try:
-        subprocess.run(['ffmpeg', '-y', '-i', tmp_in_path, '-ar', '16000', '-ac', '1', tmp_out_path],
-                       capture_output=True, timeout=10)
-        with open(tmp_out_path, 'rb') as f:
-            wav_bytes = f.read()
-    except Exception as e:
-        print(f"ffmpeg conversion error: {e}")
-        wav_bytes = audio_bytes  # fallback: try raw
+        if av is not None:
+            pcm = decode_with_av(audio_bytes, rate)
+        else:
+            pcm = decode_with_ffmpeg(audio_bytes, rate, timeout)
     finally:
-        import os as _os
-        _os.unlink(tmp_in_path)
-        if _os.path.exists(tmp_out_path):
-            _os.unlink(tmp_out_path)
-
-    audio_b64 = base64.b64encode(wav_bytes).decode('utf-8')
+        transcode_slots.release()
+    if not pcm:
+        raise TranscodeError('No audio decoded')
+    return pcm_to_wav(pcm, rate)
+
+def encode_opus_webm(wav_bytes, bitrate='24k', timeout=TRANSCODE_TIMEOUT):
+    """Compress a WAV reply to Opus in WebM (roughly a tenth of the size) for playback."""
+    if not transcode_slots.acquire(timeout=timeout):
+        raise TranscodeError('All transcoding workers are busy')
+    try:
+        return run_ffmpeg(['-c:a', 'libopus', '-b:a', bitrate, '-application', 'voip', '-f', 'webm'],
+                          wav_bytes, timeout)
+    finally:
+        transcode_slots.release()
 
-    kindness_prompt = """You are Buddy, a warm and curious friend for children aged 7-13. A child just sent you a voice message about their day or something kind they did.
+VOICE_KINDNESS_PROMPT = """You are Buddy, a warm and curious friend for children aged 7-13. A child just sent you a voice message about their day or something kind they did.
 
 Listen carefully to what they actually said and respond like a real friend would:
 - React specifically to what THEY told you (never give a generic response)
@@ -5569,34 +6989,208 @@ Listen carefully to what they actually said and respond like a real friend would
 
 NEVER give generic praise like "That's wonderful!" or "Good job!" without referencing what they specifically said."""
 
+VOICE_FALLBACKS = [
+    "That probably made someone's day better. Small kindnesses matter.",
+    "You noticed a moment to be kind. That's what good friends do.",
+]
+
+def respond_to_voice_entry(audio_bytes):
+    """Listen to a voice kindness entry with GPT-4o. Returns (transcript, base64 wav)."""
+    # The API only takes audio inline as base64; it never reaches the browser that way
+    import base64
+
+    # Convert webm to wav (GPT-4o only accepts wav/mp3)
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-audio-preview",
-            modalities=["text", "audio"],
-            audio={"voice": "sage", "format": "wav"},
-            messages=[
-                {"role": "system", "content": kindness_prompt},
-                {"role": "user", "content": [
-                    {"type": "text", "text": "Listen to my kindness journal voice entry and respond to what I said:"},
-                    {"type": "input_audio", "input_audio": {"data": audio_b64, "format": "wav"}}
-                ]}
-            ],
-            max_tokens=1024,
-            temperature=0.7
-        )
-        text_response = completion.choices[0].message.audio.transcript
-        audio_response = completion.choices[0].message.audio.data
-        return jsonify({'response': text_response, 'audio': audio_response})
+        wav_bytes = transcode_to_wav(audio_bytes)
+    except Exception as e:
+        print(f"Audio conversion error: {e}")
+        wav_bytes = audio_bytes  # fallback: try raw
+
+    audio_b64 = base64.b64encode(wav_bytes).decode('utf-8')
+
+    completion = llm.create(
+        deadline=float(os.getenv('OPENAI_AUDIO_TIMEOUT', '45')),
+        model="gpt-4o-audio-preview",
+        modalities=["text", "audio"],
+        audio={"voice": "sage", "format": "wav"},
+        messages=[
+            {"role": "system", "content": VOICE_KINDNESS_PROMPT},
+            {"role": "user", "content": [
+                {"type": "text", "text": "Listen to my kindness journal voice entry and respond to what I said:"},
+                {"type": "input_audio", "input_audio": {"data": audio_b64, "format": "wav"}}
+            ]}
+        ],
+        max_tokens=1024,
+        temperature=0.7
+    )
+    return completion.choices[0].message.audio.transcript, completion.choices[0].message.audio.data
+
+# --- Voice Job Queue ---
+# Voice entries are queued in the VoiceJob table and handled by worker processes,
+# so web workers aren't held for the upload + transcode + GPT-4o round trip.
+# VOICE_WORKERS processes are started on first use; set it to 0 and run
+# `python simple_app.py --voice-worker` to host them separately instead.
+
+VOICE_WORKERS = int(os.getenv('VOICE_WORKERS', '2'))
+VOICE_JOB_LEASE = int(os.getenv('VOICE_JOB_LEASE', '120'))  # seconds before a stuck job is retried
+VOICE_JOB_MAX_ATTEMPTS = 3
+VOICE_JOB_TTL = int(os.getenv('VOICE_JOB_TTL', '3600'))  # seconds finished jobs are kept for polling
+
+voice_pool = []
+voice_pool_lock = threading.Lock()
+
+def claim_voice_job():
+    """Atomically take the oldest queued (or abandoned) job.
+
+    Returns (job id, attempt) or None; the attempt number is this worker's
+    claim on the job and has to still match when the result is saved.
+    """
+    stale = datetime.utcnow() - timedelta(seconds=VOICE_JOB_LEASE)
+    candidates = (VoiceJob.query
+                  .filter((VoiceJob.status == 'queued') |
+                          ((VoiceJob.status == 'running') & (VoiceJob.started_at < stale)))
+                  .order_by(VoiceJob.created_at)
+                  .with_entities(VoiceJob.id, VoiceJob.attempts)
+                  .limit(5).all())
+    for job_id, attempts in candidates:
+        if attempts >= VOICE_JOB_MAX_ATTEMPTS:
+            changes = {'status': 'failed', 'audio': None, 'finished_at': datetime.utcnow(),
+                       'transcript': random.choice(VOICE_FALLBACKS)}
+        else:
+            changes = {'status': 'running', 'started_at': datetime.utcnow(), 'attempts': attempts + 1}
+        # attempts doubles as a version number, so only one worker wins each job
+        claimed = (VoiceJob.query.filter_by(id=job_id, attempts=attempts)
+                   .update(changes, synchronize_session=False))
+        db.session.commit()
+        if claimed and changes['status'] == 'running':
+            return job_id, changes['attempts']
+    return None
+
+def run_voice_job(job_id, attempt):
+    import base64
+
+    audio = db.session.get(VoiceJob, job_id).audio
+    db.session.rollback()  # don't hold a transaction open during the model call
+    result = {'status': 'done', 'audio': None}
+    try:
+        result['transcript'], reply_b64 = respond_to_voice_entry(audio)
+        if reply_b64:
+            result['reply_wav'] = base64.b64decode(reply_b64)
+            try:
+                result['reply_opus'] = encode_opus_webm(result['reply_wav'])
+            except Exception as e:
+                print(f"Opus encoding error: {e}")
     except Exception as e:
         import traceback
         print(f"GPT-4o audio error: {e}")
         traceback.print_exc()
-        fallbacks = [
-            "That probably made someone's day better. Small kindnesses matter.",
-            "You noticed a moment to be kind. That's what good friends do.",
-        ]
-        import random as rnd
-        return jsonify({'response': rnd.choice(fallbacks)})
+        result['transcript'] = random.choice(VOICE_FALLBACKS)
+        result['status'] = 'failed'
+    result['finished_at'] = datetime.utcnow()
+    # Only while our claim stands: if the lease ran out and another worker
+    # took the job, its result is the one that counts
+    saved = (VoiceJob.query.filter_by(id=job_id, attempts=attempt, status='running')
+             .update(result, synchronize_session=False))
+    db.session.commit()
+    if not saved:
+        print(f"Voice job {job_id} was re-claimed after its lease expired; dropping attempt {attempt}")
+
+def purge_voice_jobs():
+    cutoff = datetime.utcnow() - timedelta(seconds=VOICE_JOB_TTL)
+    VoiceJob.query.filter(VoiceJob.finished_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+
+def voice_worker(poll_interval=0.5):
+    """Worker process loop: claim a job, run it, repeat."""
+    last_purge = 0
+    with app.app_context():
+        while True:
+            try:
+                claim = claim_voice_job()
+                if claim is not None:
+                    run_voice_job(*claim)
+                    continue
+                if time.monotonic() - last_purge > 60:
+                    purge_voice_jobs()
+                    last_purge = time.monotonic()
+            except Exception as e:
+                print(f"Voice worker error: {e}")
+                db.session.rollback()
+            time.sleep(poll_interval)
+
+def ensure_voice_workers():
+    """Start (or restart) this process's voice worker pool."""
+    if VOICE_WORKERS <= 0:
+        return
+    with voice_pool_lock:
+        voice_pool[:] = [p for p in voice_pool if p.is_alive()]
+        ctx = multiprocessing.get_context('spawn')
+        while len(voice_pool) < VOICE_WORKERS:
+            worker = ctx.Process(target=voice_worker, name='voice-worker', daemon=True)
+            worker.start()
+            voice_pool.append(worker)
+
+@app.route('/api/kindness-voice', methods=['POST'])
+def kindness_voice():
+    """Queue a voice kindness entry for Buddy. Poll the returned status_url for the reply."""
+    audio_file = request.files.get('audio')
+    if not audio_file:
+        return jsonify({'response': 'I couldn\'t hear your message. Try again!'}), 400
+
+    job = VoiceJob(id=secrets.token_hex(16), owner=conversation_key(), audio=audio_file.read())
+    db.session.add(job)
+    db.session.commit()
+    ensure_voice_workers()
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/api/kindness-voice/{job.id}'
+    }), 202
+
+@app.route('/api/kindness-voice/<job_id>')
+def kindness_voice_status(job_id):
+    # Only the small columns; the audio is fetched separately from .../audio
+    job = (db.session.query(VoiceJob.status, VoiceJob.transcript, VoiceJob.reply_wav.isnot(None))
+           .filter(VoiceJob.id == job_id, VoiceJob.owner == conversation_key()).first())
+    if not job:
+        return jsonify({'error': 'Not found'}), 404
+    status, transcript, has_audio = job
+    if status in ('queued', 'running'):
+        return jsonify({'job_id': job_id, 'status': status}), 202
+    return jsonify({
+        'job_id': job_id,
+        'status': status,
+        'response': transcript,
+        'audio_url': f'/api/kindness-voice/{job_id}/audio' if has_audio else None
+    })
+
+@app.route('/api/kindness-voice/<job_id>/audio')
+def kindness_voice_audio(job_id):
+    """Buddy's spoken reply as a binary body, with Range support for streaming playback.
+
+    Serves Opus/WebM when it's available unless ``?format=wav`` is asked for
+    (browsers without WebM/Opus support, e.g. older Safari).
+    """
+    owner = conversation_key()
+    want_wav = request.args.get('format') == 'wav'
+    column = VoiceJob.reply_wav if want_wav else db.func.coalesce(VoiceJob.reply_opus, VoiceJob.reply_wav)
+    row = (db.session.query(column, VoiceJob.reply_opus.isnot(None))
+           .filter(VoiceJob.id == job_id, VoiceJob.owner == owner).first())
+    if not row or row[0] is None:
+        return jsonify({'error': 'Not found'}), 404
+    blob, has_opus = row
+    is_opus = has_opus and not want_wav
+    response = send_file(
+        io.BytesIO(blob),
+        mimetype='audio/webm; codecs=opus' if is_opus else 'audio/wav',
+        conditional=True,
+        etag=f"{job_id}-{'opus' if is_opus else 'wav'}",
+        max_age=None
+    )
+    response.cache_control.no_cache = None
+    response.cache_control.private = True
+    response.cache_control.max_age = VOICE_JOB_TTL
+    return response
 
 
 @app.route('/api/kindness-response', methods=['POST'])
@@ -5628,7 +7222,7 @@ Examples:
 Keep it SHORT (under 30 words). Be real, not cheesy."""
 
     try:
-        completion = client.chat.completions.create(
+        completion = llm.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": kindness_prompt},
@@ -5651,30 +7245,229 @@ Keep it SHORT (under 30 words). Be real, not cheesy."""
 
     if current_user.is_authenticated:
         entry = KindnessEntry(user_id=current_user.id, entry_text=entry_text, ai_response=response)
-        db.session.add(entry)
-        db.session.commit()
+        persist(entry, urgent=is_crisis(entry_text))
 
     return jsonify({'response': response})
 
+# --- History API Routes ---
+# Newest first, keyset-paginated on (timestamp, id) so every page is one index
+# range scan no matter how much history a user has.
+
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+def encode_cursor(timestamp, row_id):
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (timestamp, id) from a cursor. Raises ValueError if it's malformed."""
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def history_page(model, fields):
+    """One page of the current user's ``model`` rows.
+
+    Query parameters: ``limit`` (1-100), ``cursor`` (the ``next_cursor`` of
+    the previous page) and ``fields`` (comma-separated subset of ``fields``,
+    to fetch only those columns).
+    """
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not logged in'}), 401
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    wanted = [f for f in request.args.get('fields', '').split(',') if f] or list(fields)
+    unknown = [f for f in wanted if f not in fields]
+    if unknown:
+        return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    columns = [model.timestamp, model.id, *(getattr(model, f) for f in wanted if f not in ('timestamp', 'id'))]
+    query = db.session.query(*columns).filter(model.user_id == current_user.id)
+    if cursor:
+        query = query.filter(tuple_(model.timestamp, model.id) < cursor)
+    rows = query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit + 1).all()
+
+    items = []
+    for row in rows[:limit]:
+        item = {f: getattr(row, f) for f in wanted}
+        if 'timestamp' in item and item['timestamp'] is not None:
+            item['timestamp'] = item['timestamp'].isoformat()
+        items.append(item)
+    last = rows[limit - 1] if len(rows) > limit else None
+    return jsonify({'items': items, 'next_cursor': encode_cursor(last.timestamp, last.id) if last else None})
+
+@app.route('/api/chat/history')
+def chat_history_page():
+    return history_page(ChatMessage, ('id', 'role', 'content', 'timestamp'))
+
+@app.route('/api/mood/history')
+def mood_history_page():
+    return history_page(MoodEntry, ('id', 'mood', 'note', 'timestamp'))
+
+@app.route('/api/kindness/history')
+def kindness_history_page():
+    return history_page(KindnessEntry, ('id', 'entry_text', 'ai_response', 'timestamp'))
+
 # --- Data API Routes ---
 
+# --- Progress Sync ---
+# Each progress value is its own ProgressField row carrying the version that last
+# changed it, so a sync only writes what changed and a client only downloads
+# what it hasn't seen.
+
+# Sync keys mirrored into the original UserProgress columns (read by /api/progress/load)
+PROGRESS_COLUMNS = {'xp': 'xp', 'level': 'level', 'badges': 'badges_json',
+                    'kindnessCount': 'kindness_count', 'couragePracticed': 'courage_practiced'}
+PROGRESS_KEY_RE = re.compile(r'^[A-Za-z][A-Za-z0-9_]{0,63}$')
+PROGRESS_MAX_KEYS = 50
+PROGRESS_MAX_VALUE_BYTES = 16384
+
+def merge_union(stored, value):
+    if isinstance(stored, list) and isinstance(value, list):
+        return stored + [item for item in value if item not in stored]
+    return stored
+
+def merge_max(stored, value):
+    if isinstance(stored, int) and isinstance(value, int):
+        return max(stored, value)
+    return stored
+
+# How to combine two devices' changes to the same key; other keys keep the server's value
+PROGRESS_MERGE = {'badges': merge_union, 'xp': merge_max, 'level': merge_max,
+                  'kindnessCount': merge_max, 'couragePracticed': merge_max}
+
+def validate_progress_changes(changes):
+    """Return an error message for a malformed ``changes`` map, or None."""
+    if not isinstance(changes, dict) or len(changes) > PROGRESS_MAX_KEYS:
+        return 'changes must be an object with at most %d keys' % PROGRESS_MAX_KEYS
+    for key, value in changes.items():
+        if not PROGRESS_KEY_RE.match(key):
+            return f'Invalid progress key: {key}'
+        if len(json.dumps(value)) > PROGRESS_MAX_VALUE_BYTES:
+            return f'Value too large: {key}'
+        column = PROGRESS_COLUMNS.get(key)
+        if column == 'badges_json' and not isinstance(value, list):
+            return 'badges must be a list'
+        if column and column != 'badges_json' and (not isinstance(value, int) or isinstance(value, bool)):
+            return f'{key} must be a whole number'
+    return None
+
+def progress_row(user_id):
+    progress = UserProgress.query.filter_by(user_id=user_id).first()
+    if progress is None:
+        db.session.add(UserProgress(user_id=user_id, version=0))
+        try:
+            db.session.commit()
+        except db.exc.IntegrityError:
+            db.session.rollback()  # created by a concurrent request
+        progress = UserProgress.query.filter_by(user_id=user_id).first()
+    if progress.version == 0:
+        # Written before versioned sync existed: turn the columns into fields first
+        legacy = {
+            'xp': progress.xp or 0, 'level': progress.level or 1,
+            'badges': json.loads(progress.badges_json or '[]'),
+            'kindnessCount': progress.kindness_count or 0,
+            'couragePracticed': progress.courage_practiced or 0,
+        }
+        apply_progress_changes(user_id, None, legacy, progress)
+        db.session.refresh(progress)
+    return progress
+
+def apply_progress_changes(user_id, base, changes, progress=None, attempts=3):
+    """Compare-and-set ``changes`` onto a user's progress. Returns the new version, or None.
+
+    A key is written unless another device changed it after ``base`` (the
+    version this client last saw; None means don't check). Then keys in
+    PROGRESS_MERGE combine both values and other keys keep the server's
+    value, which goes back to the client as a delta. None means the row kept
+    changing under us for every attempt.
+    """
+    for _ in range(attempts):
+        progress = progress or progress_row(user_id)
+        current = progress.version
+        fields = {}
+        if changes:
+            fields = {f.key: f for f in ProgressField.query.filter(
+                ProgressField.user_id == user_id, ProgressField.key.in_(list(changes)))}
+        updates = {}
+        for key, value in changes.items():
+            field = fields.get(key)
+            stored = json.loads(field.value) if field is not None else None
+            if field is not None and base is not None and field.version > base:
+                merge = PROGRESS_MERGE.get(key)
+                if merge is None:
+                    continue
+                value = merge(stored, value)
+            if field is None or value != stored:
+                updates[key] = (field, value)
+        if not updates:
+            return current
+
+        version = current + 1
+        columns = {'version': version, 'last_synced': datetime.utcnow()}
+        for key, (_, value) in updates.items():
+            column = PROGRESS_COLUMNS.get(key)
+            if column:
+                columns[column] = json.dumps(value) if column == 'badges_json' else value
+        # Only one writer can move the version on from `current`; the others retry
+        moved = (UserProgress.query.filter_by(user_id=user_id, version=current)
+                 .update(columns, synchronize_session=False))
+        if moved != 1:
+            db.session.rollback()
+            progress = None
+            continue
+        for key, (field, value) in updates.items():
+            if field is None:
+                db.session.add(ProgressField(user_id=user_id, key=key, value=json.dumps(value), version=version))
+            else:
+                field.value = json.dumps(value)
+                field.version = version
+        db.session.commit()
+        return version
+    return None
+
 @app.route('/api/progress/sync', methods=['POST'])
 def sync_progress():
+    """Versioned delta sync.
+
+    The client posts ``{"version": <last version it saw>, "changes": {key: value}}``
+    with only the keys that changed, and gets ``{"version": <current>, "changes":
+    {...}}`` back holding only the values it is missing. Empty ``changes`` is a
+    pull. Older clients posting the whole state have no version to compare
+    against, so their values overwrite the server's (last writer wins, as
+    before versioning).
+    """
     if not current_user.is_authenticated:
         return jsonify({'error': 'Not logged in'}), 401
-    data = request.json
-    progress = UserProgress.query.filter_by(user_id=current_user.id).first()
-    if not progress:
-        progress = UserProgress(user_id=current_user.id)
-        db.session.add(progress)
-    progress.xp = data.get('xp', progress.xp)
-    progress.level = data.get('level', progress.level)
-    progress.badges_json = json.dumps(data.get('badges', []))
-    progress.kindness_count = data.get('kindnessCount', progress.kindness_count)
-    progress.courage_practiced = data.get('couragePracticed', progress.courage_practiced)
-    progress.last_synced = datetime.utcnow()
-    db.session.commit()
-    return jsonify({'status': 'ok'})
+    data = request.json or {}
+    if 'changes' in data:
+        since, changes = data.get('version') or 0, data.get('changes') or {}
+        base = since
+    else:
+        since, changes = 0, {key: data[key] for key in PROGRESS_COLUMNS if key in data}
+        base = None
+    error = validate_progress_changes(changes) if isinstance(since, int) else 'version must be a number'
+    if error:
+        return jsonify({'error': error}), 400
+
+    progress_row(current_user.id)
+    version = apply_progress_changes(current_user.id, base, changes)
+    if version is None:
+        return jsonify({'error': 'Progress is changing too fast, try again'}), 409
+    missing = {}
+    for field in ProgressField.query.filter(ProgressField.user_id == current_user.id,
+                                            ProgressField.version > since):
+        value = json.loads(field.value)
+        version = max(version, field.version)  # another device may have synced meanwhile
+        if field.key not in changes or changes[field.key] != value:
+            missing[field.key] = value
+    return jsonify({'version': version, 'changes': missing})
 
 @app.route('/api/progress/load')
 def load_progress():
@@ -5726,82 +7519,479 @@ def delete_trust_team(member_id):
     db.session.commit()
     return jsonify({'status': 'ok'})
 
+# --- Email Outbox ---
+# /api/send-alert only records the email; a dispatcher thread sends it. A slow
+# or failing mail API never holds a request, and queued emails survive a
+# restart. Each worker runs a dispatcher (EMAIL_DISPATCHER=1), or set it to 0
+# and run `python simple_app.py --email-worker` on its own.
+
+BREVO_API_URL = os.getenv('BREVO_API_URL', 'https://api.brevo.com/v3/smtp/email')
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', '50'))  # emails per Brevo call, via messageVersions
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', '8'))
+EMAIL_LEASE = int(os.getenv('EMAIL_LEASE', '60'))  # seconds before a send that never finished is retried
+EMAIL_BACKOFF_BASE = float(os.getenv('EMAIL_BACKOFF_BASE', '5'))
+EMAIL_BACKOFF_MAX = float(os.getenv('EMAIL_BACKOFF_MAX', '900'))
+EMAIL_TIMEOUT = (3.05, float(os.getenv('EMAIL_TIMEOUT', '10')))  # connect, read
+EMAIL_POLL_INTERVAL = float(os.getenv('EMAIL_POLL_INTERVAL', '5'))  # for retries and other workers' emails
+
+class EmailDispatcher:
+    """Claims due EmailOutbox rows, sends them through Brevo and records the outcome.
+
+    Rows are claimed with the same attempts-as-version update as voice jobs,
+    so several workers can share the outbox. Up to ``batch_size`` emails go in
+    one API call over a pooled keep-alive session. Network errors, 429 and 5xx
+    are retried with exponential backoff until ``max_attempts``; any other 4xx
+    on a batch is retried one email at a time so a bad address fails alone.
+    """
+
+    def __init__(self, api_url, batch_size=50, max_attempts=8, lease=60,
+                 backoff_base=5.0, backoff_max=900.0, timeout=(3.05, 10), poll_interval=2.0):
+        self.api_url = api_url
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=4, max_retries=0))
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=4, max_retries=0))
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self):
+        return self._thread is not None
+
+    def ensure_running(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name='email-dispatcher', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def run(self):
+        with app.app_context():
+            while True:
+                try:
+                    emails = self.claim()
+                    if emails:
+                        self.deliver(emails)
+                        continue
+                except Exception as e:
+                    print(f"Email dispatcher error: {e}")
+                    db.session.rollback()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def claim(self):
+        now = datetime.utcnow()
+        candidates = (EmailOutbox.query
+                      .filter(EmailOutbox.status.in_(('pending', 'sending')),
+                              EmailOutbox.next_attempt_at <= now)
+                      .order_by(EmailOutbox.priority.desc(), EmailOutbox.next_attempt_at)
+                      .with_entities(EmailOutbox.id, EmailOutbox.attempts)
+                      .limit(self.batch_size).all())
+        claimed = []
+        for email_id, attempts in candidates:
+            if attempts >= self.max_attempts:
+                changes = {'status': 'failed'}
+            else:
+                # While sending, next_attempt_at is the lease: past it, another worker may retry
+                changes = {'status': 'sending', 'attempts': attempts + 1,
+                           'next_attempt_at': now + timedelta(seconds=self.lease)}
+            won = (EmailOutbox.query.filter_by(id=email_id, attempts=attempts)
+                   .update(changes, synchronize_session=False))
+            if won and changes['status'] == 'sending':
+                claimed.append(email_id)
+        db.session.commit()
+        if not claimed:
+            return []
+        return EmailOutbox.query.filter(EmailOutbox.id.in_(claimed)).all()
+
+    def post(self, payload):
+        return self.session.post(self.api_url, json=payload, timeout=self.timeout, headers={
+            'api-key': os.getenv('BREVO_API_KEY', ''),
+            'Content-Type': 'application/json'
+        })
+
+    def deliver(self, emails):
+        sender = {'email': os.getenv('BREVO_FROM_EMAIL', '')}
+        first = emails[0]
+        payload = {'sender': sender, 'to': [{'email': first.recipient}],
+                   'subject': first.subject, 'textContent': first.content}
+        if len(emails) > 1:
+            del payload['to']
+            payload['messageVersions'] = [
+                {'to': [{'email': e.recipient}], 'subject': e.subject, 'textContent': e.content}
+                for e in emails
+            ]
+        try:
+            res = self.post(payload)
+        except requests.RequestException as e:
+            self.record(emails, retry=True, error=f"{type(e).__name__}: {e}")
+            return
+        if res.status_code in (200, 201, 202):
+            try:
+                body = res.json()
+            except ValueError:
+                body = {}
+            ids = body.get('messageIds') or [body.get('messageId')]
+            for i, email in enumerate(emails):
+                email.status = 'sent'
+                email.sent_at = datetime.utcnow()
+                email.provider_message_id = ids[i] if i < len(ids) else None
+                email.error_message = None
+            db.session.commit()
+        elif res.status_code == 429 or res.status_code >= 500:
+            self.record(emails, retry=True, error=f"HTTP {res.status_code}: {res.text[:500]}")
+        elif len(emails) > 1:
+            for email in emails:
+                self.deliver([email])
+        else:
+            self.record(emails, retry=False, error=f"HTTP {res.status_code}: {res.text[:500]}")
+
+    def record(self, emails, retry, error):
+        """Note a failed attempt, and when to try again if there are attempts left."""
+        now = datetime.utcnow()
+        for email in emails:
+            email.error_message = error
+            if retry and email.attempts < self.max_attempts:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (email.attempts - 1))
+                email.status = 'pending'
+                email.next_attempt_at = now + timedelta(seconds=random.uniform(delay / 2, delay))
+            else:
+                email.status = 'failed'
+        db.session.commit()
+        print(f"Email delivery failed for {len(emails)} email(s): {error}")
+
+email_dispatcher = EmailDispatcher(
+    BREVO_API_URL,
+    batch_size=EMAIL_BATCH_SIZE,
+    max_attempts=EMAIL_MAX_ATTEMPTS,
+    lease=EMAIL_LEASE,
+    backoff_base=EMAIL_BACKOFF_BASE,
+    backoff_max=EMAIL_BACKOFF_MAX,
+    timeout=EMAIL_TIMEOUT,
+    poll_interval=EMAIL_POLL_INTERVAL
+)
+
+class TokenBucket:
+    """Per-name token buckets in shared state: ``burst`` tokens, refilled at ``per_hour`` an hour.
+
+    A bucket that would be full again is simply allowed to expire, so idle
+    names cost nothing and the memory backend stays bounded by its LRU.
+    """
+
+    def __init__(self, state, prefix, burst, per_hour):
+        self.state = state
+        self.prefix = prefix
+        self.burst = burst
+        self.rate = per_hour / 3600
+
+    def _change(self, tokens):
+        def change(bucket):
+            now = time.time()
+            level, updated = bucket or (self.burst, now)
+            level = min(self.burst, level + (now - updated) * self.rate)
+            if level >= tokens:
+                return [level - tokens, now], 0.0
+            return [level, now], (tokens - level) / self.rate
+        return change
+
+    def take(self, name):
+        """Spend a token. Returns 0 if there was one, else the seconds until there will be."""
+        return self.state.update(f'{self.prefix}:{name}', self._change(1), self.burst / self.rate)
+
+    def refund(self, name):
+        self.state.update(f'{self.prefix}:{name}', self._change(-1), self.burst / self.rate)
+
+# The same alert again (double tap, client retry) within this window is not resent
+ALERT_DEDUPE_SECONDS = int(os.getenv('ALERT_DEDUPE_SECONDS', '600'))
+# Crisis alerts skip these limits
+recipient_alert_limit = TokenBucket(alert_state, 'alert-limit:to',
+                                    burst=int(os.getenv('ALERT_RECIPIENT_BURST', '5')),
+                                    per_hour=float(os.getenv('ALERT_RECIPIENT_PER_HOUR', '20')))
+sender_alert_limit = TokenBucket(alert_state, 'alert-limit:user',
+                                 burst=int(os.getenv('ALERT_USER_BURST', '10')),
+                                 per_hour=float(os.getenv('ALERT_USER_PER_HOUR', '60')))
+
+def alert_wait(user_id, recipient):
+    """Seconds before this user may email this recipient again (0: go ahead)."""
+    wait = recipient_alert_limit.take(recipient)
+    if not wait:
+        wait = sender_alert_limit.take(str(user_id))
+        if wait:
+            recipient_alert_limit.refund(recipient)
+    return wait
+
+def ensure_email_dispatcher():
+    if os.getenv('EMAIL_DISPATCHER', '1') == '1':
+        email_dispatcher.ensure_running()
+
+@app.before_request
+def resume_email_dispatch():
+    # The first request a worker serves also picks up emails queued before a restart
+    if not email_dispatcher.started:
+        ensure_email_dispatcher()
+
 @app.route('/api/send-alert', methods=['POST'])
 def send_alert():
+    """Queue an email to a trust team member. Poll the returned status_url to follow it."""
     if not current_user.is_authenticated:
         return jsonify({'error': 'Not logged in'}), 401
     data = request.json
-    to_email = data.get('email', '')
-    subject = data.get('subject', 'Buddy App Alert')
+    to_email = data.get('email', '').strip()
+    subject = data.get('subject', 'Buddy App Alert')[:255]
     body = data.get('body', '')
 
-    api_key = os.getenv('BREVO_API_KEY', '')
-    from_email = os.getenv('BREVO_FROM_EMAIL', '')
-    if not api_key:
+    if not os.getenv('BREVO_API_KEY', ''):
         return jsonify({'error': 'Email not configured.'}), 400
+    if not to_email:
+        return jsonify({'error': 'Email address is required'}), 400
+
+    recipient = to_email[:255].lower()
+    tracking_id = secrets.token_hex(16)
+    content_hash = hashlib.sha256(json.dumps([subject, body]).encode('utf-8')).hexdigest()
+    dedupe_key = f'alert-dedupe:{current_user.id}:{recipient}:{content_hash}'
+    original = alert_state.add(dedupe_key, tracking_id, ALERT_DEDUPE_SECONDS)
+    if original is not None:
+        usage.incr('alerts_duplicate')
+        return jsonify({
+            'status': 'duplicate',
+            'message': 'Alert already sent',
+            'tracking_id': original,
+            'status_url': f'/api/send-alert/{original}'
+        }), 202
+
+    urgent = is_crisis(subject, body)
+    if urgent:
+        usage.incr('alerts_urgent')
+    else:
+        wait = alert_wait(current_user.id, recipient)
+        if wait:
+            alert_state.delete(dedupe_key)  # it wasn't sent, so a later retry shouldn't count as a duplicate
+            usage.incr('alerts_rate_limited')
+            response = jsonify({'error': "You've sent a lot of messages just now. Please wait a little and try again."})
+            response.headers['Retry-After'] = str(int(wait) + 1)
+            return response, 429
+
+    email = EmailOutbox(id=tracking_id, user_id=current_user.id, trigger_event='send_alert',
+                        recipient=to_email[:255], subject=subject, content=body, priority=1 if urgent else 0)
+    db.session.add(email)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        alert_state.delete(dedupe_key)
+        raise
+    usage.incr('alerts_queued')
+    ensure_email_dispatcher()
+    return jsonify({
+        'status': 'queued',
+        'message': 'Alert queued!',
+        'tracking_id': email.id,
+        'status_url': f'/api/send-alert/{email.id}'
+    }), 202
 
+@app.route('/api/send-alert/<tracking_id>')
+@login_required
+def send_alert_status(tracking_id):
+    email = EmailOutbox.query.filter_by(id=tracking_id, user_id=current_user.id).first()
+    if not email:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({
+        'tracking_id': email.id,
+        'status': email.status,
+        'attempts': email.attempts,
+        'sent_at': email.sent_at.isoformat() if email.sent_at else None,
+        'error': email.error_message if email.status == 'failed' else None
+    })
+
+MIGRATE_BATCH_SIZE = 500
+
+class BodyReader:
+    """Request body for ijson, which probes with read(0); werkzeug reads that as a disconnect."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size=-1):
+        return self.stream.read(size) if size else b''
+
+def iter_migration_payload(stream):
+    """Yield (section, item) for each mood and trust team member, and ('progress', {...}).
+
+    With ijson the body is parsed as it's read, so only one item is held in
+    memory at a time; otherwise it falls back to parsing the whole document.
+    """
+    if ijson is None:
+        data = json.load(stream)
+        for section in ('moods', 'trustTeam'):
+            for item in data.get(section) or []:
+                yield section, item
+        yield 'progress', data.get('progress') or {}
+        return
+
+    builder = prefix_building = None
+    for prefix, event, value in ijson.parse(BodyReader(stream), use_float=True):
+        if builder is None:
+            if event == 'start_map' and prefix in ('moods.item', 'trustTeam.item', 'progress'):
+                builder, prefix_building = ijson.ObjectBuilder(), prefix
+                builder.event(event, value)
+            continue
+        builder.event(event, value)
+        if event == 'end_map' and prefix == prefix_building:
+            yield prefix_building.split('.')[0], builder.value
+            builder = None
+
+def import_key(*fields):
+    """Content hash that identifies an imported row, so a replayed upload matches it."""
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def parse_client_time(value):
     try:
-        import requests as req
-        res = req.post('https://api.brevo.com/v3/smtp/email', json={
-            'sender': {'email': from_email},
-            'to': [{'email': to_email}],
-            'subject': subject,
-            'textContent': body
-        }, headers={'api-key': api_key, 'Content-Type': 'application/json'})
-        if res.status_code in (200, 201):
-            return jsonify({'status': 'ok', 'message': 'Alert sent!'})
-        return jsonify({'error': 'Email delivery failed'}), 500
-    except Exception as e:
-        print(f"Brevo error: {e}")
-        return jsonify({'error': 'Failed to send email'}), 500
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+def insert_new(model, rows, seen):
+    """Bulk insert the rows whose import_key this user doesn't have yet."""
+    fresh = []
+    for row in rows:
+        if row['import_key'] not in seen:
+            seen.add(row['import_key'])
+            fresh.append(row)
+    if fresh:
+        db.session.execute(model.__table__.insert(), fresh)
+    return len(fresh)
+
+def import_local_data(user_id, stream):
+    """Bulk-import a localStorage upload. Returns (moods added, members added, duplicates skipped).
+
+    Progress merges with what the account already has rather than replacing it.
+    """
+    seen = {
+        MoodEntry: {k for (k,) in db.session.query(MoodEntry.import_key).filter(
+            MoodEntry.user_id == user_id, MoodEntry.import_key.isnot(None))},
+        TrustTeamMember: {k for (k,) in db.session.query(TrustTeamMember.import_key).filter(
+            TrustTeamMember.user_id == user_id, TrustTeamMember.import_key.isnot(None))},
+    }
+    batches = {MoodEntry: [], TrustTeamMember: []}
+    added = {MoodEntry: 0, TrustTeamMember: 0}
+    total = 0
+    prog = {}
+    now = datetime.utcnow()
+
+    for section, item in iter_migration_payload(stream):
+        if section == 'progress':
+            prog = item
+            continue
+        if section == 'moods':
+            mood, note = str(item.get('mood', '')), str(item.get('note', ''))
+            when = item.get('timestamp') or item.get('date', '')
+            batches[MoodEntry].append({
+                'user_id': user_id, 'mood': mood, 'note': note,
+                'timestamp': parse_client_time(item.get('timestamp', '')) or now,
+                'import_key': import_key('mood', mood, note, when),
+            })
+        else:
+            # localStorage calls these role/email/avatar
+            name = str(item.get('name', ''))
+            relationship = str(item.get('relationship') or item.get('role', ''))
+            contact = str(item.get('contact') or item.get('email', ''))
+            batches[TrustTeamMember].append({
+                'user_id': user_id, 'name': name, 'relationship': relationship, 'contact': contact,
+                'emoji': str(item.get('emoji') or item.get('avatar', '👤')),
+                'import_key': import_key('trust', name, relationship, contact),
+            })
+        total += 1
+        for model, rows in batches.items():
+            if len(rows) >= MIGRATE_BATCH_SIZE:
+                added[model] += insert_new(model, rows, seen[model])
+                rows.clear()
+    for model, rows in batches.items():
+        added[model] += insert_new(model, rows, seen[model])
+
+    db.session.commit()
+
+    changes = {
+        'xp': prog.get('xp', 0), 'level': prog.get('level', 1), 'badges': prog.get('badges', []),
+        'kindnessCount': prog.get('kindnessCount', 0), 'couragePracticed': prog.get('couragePracticed', 0),
+    }
+    if validate_progress_changes(changes) is None:
+        progress_row(user_id)
+        # Base 0: every stored value counts as a concurrent change, so PROGRESS_MERGE
+        # keeps the higher counts and the union of badges
+        apply_progress_changes(user_id, 0, changes)
+    return added[MoodEntry], added[TrustTeamMember], total - added[MoodEntry] - added[TrustTeamMember]
 
 @app.route('/api/migrate', methods=['POST'])
 def migrate_data():
+    """Import a browser's localStorage history. Replaying the same upload adds nothing."""
     if not current_user.is_authenticated:
         return jsonify({'error': 'Not logged in'}), 401
-    data = request.json
-
-    # Migrate mood entries
-    for mood in data.get('moods', []):
-        entry = MoodEntry(user_id=current_user.id, mood=mood.get('mood', ''), note=mood.get('note', ''))
-        db.session.add(entry)
-
-    # Migrate trust team
-    for member in data.get('trustTeam', []):
-        m = TrustTeamMember(
-            user_id=current_user.id, name=member.get('name', ''),
-            relationship=member.get('relationship', ''),
-            contact=member.get('contact', ''), emoji=member.get('emoji', '👤')
-        )
-        db.session.add(m)
-
-    # Migrate progress
-    progress = UserProgress.query.filter_by(user_id=current_user.id).first()
-    if not progress:
-        progress = UserProgress(user_id=current_user.id)
-        db.session.add(progress)
-    prog = data.get('progress', {})
-    progress.xp = prog.get('xp', 0)
-    progress.level = prog.get('level', 1)
-    progress.badges_json = json.dumps(prog.get('badges', []))
-    progress.kindness_count = prog.get('kindnessCount', 0)
-    progress.courage_practiced = prog.get('couragePracticed', 0)
-
-    db.session.commit()
-    return jsonify({'status': 'ok', 'message': 'Data migrated!'})
+    try:
+        moods, members, duplicates = import_local_data(current_user.id, request.stream)
+    except db.exc.IntegrityError:
+        # A replay of the same upload committed first; retrying skips whatever it added
+        db.session.rollback()
+        return jsonify({'error': 'Import already in progress, try again'}), 409
+    except (ValueError, AttributeError, getattr(ijson, 'JSONError', ValueError)):
+        db.session.rollback()
+        return jsonify({'error': 'Invalid data'}), 400
+    return jsonify({'status': 'ok', 'message': 'Data migrated!',
+                    'moods': moods, 'trustTeam': members, 'duplicates': duplicates})
 
 @app.route('/api/stats')
 def get_stats():
+    totals = usage.totals()
     return jsonify({
-        'moods': len(mood_entries),
-        'chats': len(chat_history),
-        'reports': len(reports)
+        'moods': totals.get('moods', 0),
+        'chats': totals.get('chats', 0),
+        'reports': totals.get('reports', 0),
+        'alerts': {
+            'queued': totals.get('alerts_queued', 0),
+            'urgent': totals.get('alerts_urgent', 0),
+            'duplicates': totals.get('alerts_duplicate', 0),
+            'rateLimited': totals.get('alerts_rate_limited', 0)
+        },
+        'userCache': user_cache.stats()
     })
 
 with app.app_context():
     db.create_all()
+    # Large databases: set AUTO_MIGRATE=0 and run `python simple_app.py --migrate` when deploying
+    if os.getenv('AUTO_MIGRATE', '1') == '1' and '--migrate' not in sys.argv:
+        run_migrations()
 
 if __name__ == '__main__':
+    if '--migrate' in sys.argv:
+        with app.app_context():
+            run_migrations()
+        print("✅ Database schema is up to date")
+        sys.exit(0)
+
+    if '--derive-media' in sys.argv:
+        print(f"🎞️ Deriving media variants into {MEDIA_CACHE_DIR}")
+        if not media_library.derive_all():
+            print("Another process is already deriving media variants")
+        sys.exit(0)
+
+    if '--email-worker' in sys.argv:
+        print("📧 Running the email dispatcher")
+        email_dispatcher.run()
+
+    if '--voice-worker' in sys.argv:
+        print(f"🎤 Running {max(VOICE_WORKERS, 1)} voice worker(s)")
+        VOICE_WORKERS = max(VOICE_WORKERS, 1)
+        ensure_voice_workers()
+        for worker in voice_pool:
+            worker.join()
+        sys.exit(0)
+
     print("\n" + "="*60)
     print("🛡️  ANTI-BULLYING SUPPORT APP - WORKING NOW!")
     print("="*60)
@@ -0,0 +1,46 @@
+"""
+Shared setup: simple_app.py on a scratch SQLite database, imported once per run.
+
+Run from the repository root with ``python -m pytest tests``.
+"""
+
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+scratch = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch, 'test.db')}"
+os.environ['EMAIL_DISPATCHER'] = '0'  # the tests drive the dispatcher themselves
+os.environ['VOICE_WORKERS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_app
+from simple_app import User, app, db
+
+user_numbers = itertools.count(1)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    with app.app_context():
+        db.create_all()
+        simple_app.run_migrations()
+        db.session.add(User(id=1, username='kid', email='kid@example.com', password_hash='x'))
+        db.session.commit()
+    yield
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    """A test client logged in as a newly registered user; its id is ``client.user_id``."""
+    client = app.test_client()
+    n = next(user_numbers)
+    res = client.post('/api/auth/register', json={
+        'username': f'user{n}', 'email': f'user{n}@example.com', 'password': 'secret123'})
+    client.user_id = res.get_json()['id']
+    return client
@@ -0,0 +1,51 @@
+"""
+/api/chat/stream keeping the chat history and Buddy's context in step.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import simple_app
+from simple_app import CHAT_TRUNCATED_MARK, ChatMessage, app, conversations
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Makes the model stream ``words`` one chunk at a time."""
+    words = ['Hi ', 'there, ', 'friend!']
+    monkeypatch.setattr(simple_app.llm, 'create', lambda **params: (chunk(w) for w in words))
+    monkeypatch.setattr(simple_app, 'WRITE_BEHIND', False)
+    return words
+
+
+def saved_turn(user_id):
+    with app.app_context():
+        rows = ChatMessage.query.filter_by(user_id=user_id).order_by(ChatMessage.id).all()
+        return [(row.role, row.content) for row in rows]
+
+
+def test_finished_stream_saves_the_whole_reply(client, model):
+    res = client.post('/api/chat/stream', json={'message': 'hello buddy'})
+    assert b'event: done' in res.data
+
+    assert saved_turn(client.user_id) == [('user', 'hello buddy'), ('ai', 'Hi there, friend!')]
+    assert conversations.history(f'user:{client.user_id}')[-2:] == [
+        {'role': 'user', 'content': 'hello buddy'},
+        {'role': 'assistant', 'content': 'Hi there, friend!'},
+    ]
+
+
+def test_disconnect_mid_stream_saves_the_partial_reply(client, model):
+    res = client.post('/api/chat/stream', json={'message': 'are you there?'}, buffered=False)
+    frames = iter(res.response)
+    assert b'Hi ' in next(frames)
+    res.close()  # the browser went away after the first token
+
+    partial = 'Hi ' + CHAT_TRUNCATED_MARK
+    assert saved_turn(client.user_id) == [('user', 'are you there?'), ('ai', partial)]
+    assert conversations.history(f'user:{client.user_id}')[-1] == {'role': 'assistant', 'content': partial}
@@ -0,0 +1,155 @@
+"""
+EmailDispatcher against a local HTTP server standing in for Brevo's send API.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from simple_app import EmailDispatcher, EmailOutbox, app, db
+
+
+class FakeBrevo(ThreadingHTTPServer):
+    """Records every posted payload and answers with ``respond(payload) -> (status, body)``."""
+
+    def __init__(self, respond):
+        super().__init__(('127.0.0.1', 0), FakeBrevoHandler)
+        self.respond = respond
+        self.payloads = []
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v3/smtp/email'
+
+
+class FakeBrevoHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.payloads.append(payload)
+        status, body = self.server.respond(payload)
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def outbox():
+    """Adds pending emails to an empty outbox; returns their ids."""
+    with app.app_context():
+        EmailOutbox.query.delete()
+        db.session.commit()
+
+        def add(*recipients):
+            ids = []
+            for i, recipient in enumerate(recipients):
+                email_id = f'email{i}'
+                db.session.add(EmailOutbox(id=email_id, user_id=1, trigger_event='send_alert',
+                                           recipient=recipient, subject='Buddy App Alert',
+                                           content=f'Hello {recipient}'))
+                ids.append(email_id)
+            db.session.commit()
+            return ids
+
+        yield add
+
+
+@pytest.fixture
+def brevo():
+    servers = []
+
+    def start(respond):
+        server = FakeBrevo(respond)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def dispatcher_for(server):
+    # No backoff, so a retried email is due again straight away
+    return EmailDispatcher(server.url, batch_size=10, max_attempts=3, backoff_base=0, backoff_max=0)
+
+
+def dispatch(dispatcher):
+    emails = dispatcher.claim()
+    if emails:
+        dispatcher.deliver(emails)
+    return len(emails)
+
+
+def stored(email_id):
+    db.session.expire_all()
+    return db.session.get(EmailOutbox, email_id)
+
+
+def test_503_is_retried_and_then_delivered(outbox, brevo):
+    answers = iter([(503, {'message': 'unavailable'}), (201, {'messageId': '<m1@brevo>'})])
+    server = brevo(lambda payload: next(answers))
+    dispatcher = dispatcher_for(server)
+    (email_id,) = outbox('parent@example.com')
+
+    assert dispatch(dispatcher) == 1
+    email = stored(email_id)
+    assert email.status == 'pending'
+    assert email.attempts == 1
+    assert email.error_message.startswith('HTTP 503')
+
+    assert dispatch(dispatcher) == 1
+    email = stored(email_id)
+    assert email.status == 'sent'
+    assert email.attempts == 2
+    assert email.provider_message_id == '<m1@brevo>'
+    assert email.error_message is None
+    assert email.sent_at is not None
+    assert len(server.payloads) == 2
+    assert dispatch(dispatcher) == 0
+
+
+def test_emails_are_batched_into_one_message_versions_call(outbox, brevo):
+    server = brevo(lambda payload: (201, {'messageIds': [f'<m{i}@brevo>' for i in range(3)]}))
+    ids = outbox('mum@example.com', 'dad@example.com', 'teacher@example.com')
+
+    assert dispatch(dispatcher_for(server)) == 3
+    assert len(server.payloads) == 1
+    versions = server.payloads[0]['messageVersions']
+    assert sorted(v['to'][0]['email'] for v in versions) == \
+        ['dad@example.com', 'mum@example.com', 'teacher@example.com']
+    assert 'to' not in server.payloads[0]
+    for email_id in ids:
+        email = stored(email_id)
+        assert email.status == 'sent'
+        assert email.provider_message_id.startswith('<m')
+
+
+def test_bad_address_fails_alone(outbox, brevo):
+    def respond(payload):
+        if 'messageVersions' in payload:
+            return 400, {'code': 'invalid_parameter', 'message': 'email is not valid in messageVersions'}
+        if payload['to'][0]['email'] == 'not-an-address':
+            return 400, {'code': 'invalid_parameter', 'message': 'email is not valid'}
+        return 201, {'messageId': '<single@brevo>'}
+
+    server = brevo(respond)
+    good, bad, other = outbox('mum@example.com', 'not-an-address', 'dad@example.com')
+
+    assert dispatch(dispatcher_for(server)) == 3
+    # The batch, then each email on its own
+    assert len(server.payloads) == 4
+    assert stored(bad).status == 'failed'
+    assert stored(bad).error_message.startswith('HTTP 400')
+    for email_id in (good, other):
+        email = stored(email_id)
+        assert email.status == 'sent'
+        assert email.provider_message_id == '<single@brevo>'
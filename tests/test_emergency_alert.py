@@ -0,0 +1,83 @@
+"""
+NotificationService.send_emergency_alert fan-out with slow fake providers.
+
+The backend package is importable because simple_app (imported by conftest)
+puts backend/ on sys.path.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.notification import NotificationService
+
+
+class FakeSender:
+    """Answers after ``delay`` seconds and records who it sent to."""
+
+    def __init__(self, delay=0.0, success=True):
+        self.delay = delay
+        self.success = success
+        self.sent = []
+        self.finished = threading.Event()
+
+    def __call__(self, **kwargs):
+        time.sleep(self.delay)
+        self.sent.append(kwargs.get('to_email') or kwargs.get('to_phone'))
+        self.finished.set()
+        return {'success': self.success, 'message': 'fake'}
+
+
+@pytest.fixture
+def service():
+    service = NotificationService()
+    yield service
+    service.executor.shutdown(wait=True)
+
+
+def test_deliveries_run_side_by_side(service):
+    service.send_email = FakeSender(delay=0.2)
+    service.send_sms = FakeSender(delay=0.2)
+    contacts = [{'name': 'Mum', 'email': 'mum@example.com', 'phone': '+15550001'},
+                {'name': 'Dad', 'email': 'dad@example.com'}]
+
+    started = time.monotonic()
+    results = service.send_emergency_alert(contacts, 'Sam', deadline=5)
+
+    assert time.monotonic() - started < 0.4
+    assert [(r['contact']['name'], r['method']) for r in results] == [('Mum', 'email'), ('Mum', 'sms'), ('Dad', 'email')]
+    assert all(r['result']['success'] for r in results)
+    assert service.metrics.snapshot()['delivered'] == 3
+
+
+def test_late_deliveries_are_reported_pending_and_still_sent(service):
+    # One worker: the second email is still queued when the deadline passes
+    service.executor = ThreadPoolExecutor(max_workers=1)
+    service.send_email = FakeSender(delay=0.3)
+    contacts = [{'name': 'Mum', 'email': 'mum@example.com'}, {'name': 'Dad', 'email': 'dad@example.com'}]
+    seen = []
+
+    results = service.send_emergency_alert(contacts, 'Sam', deadline=0.1, on_result=seen.append)
+
+    assert [r['result']['pending'] for r in results] == [True, True]
+    assert all(r['result']['timed_out'] and not r['result']['success'] for r in results)
+    assert len(seen) == 2
+    assert service.metrics.snapshot()['timed_out'] == 2
+
+    service.executor.shutdown(wait=True)
+    assert service.send_email.sent == ['mum@example.com', 'dad@example.com']
+    metrics = service.metrics.snapshot()
+    assert metrics['late_delivered'] == 2
+    assert metrics['undelivered_alerts'] == 1
+
+
+def test_a_failed_late_delivery_is_counted(service):
+    service.send_email = FakeSender(delay=0.2, success=False)
+
+    service.send_emergency_alert([{'name': 'Mum', 'email': 'mum@example.com'}], 'Sam', deadline=0.05)
+
+    assert service.send_email.finished.wait(2)
+    service.executor.shutdown(wait=True)
+    assert service.metrics.snapshot()['late_failed'] == 1
@@ -0,0 +1,67 @@
+"""
+MediaLibrary poster frames and the lock that keeps workers from deriving in parallel.
+"""
+
+import os
+import time
+
+import pytest
+
+import simple_app
+from simple_app import MediaLibrary
+
+VIDEO_HTML = '<video autoplay loop muted>\n<source src="/static/buddy/clip.mp4" type="video/mp4">'
+
+
+@pytest.fixture
+def library(tmp_path):
+    source_dir = tmp_path / 'buddy'
+    source_dir.mkdir()
+    (source_dir / 'clip.mp4').write_bytes(b'not really a video')
+    return MediaLibrary(str(source_dir), str(tmp_path / 'cache'))
+
+
+@pytest.fixture
+def ffmpeg_calls(monkeypatch):
+    """Stands in for ffmpeg: writes each output file and records the call."""
+    calls = []
+
+    def run(args, **kwargs):
+        calls.append(args)
+        with open(args[-1], 'wb') as f:
+            f.write(b'variant')
+        return simple_app.subprocess.CompletedProcess(args, 0, b'', b'')
+
+    monkeypatch.setattr(simple_app.subprocess, 'run', run)
+    return calls
+
+
+def test_no_poster_until_the_frame_exists(library, ffmpeg_calls):
+    assert 'poster=' not in library.rewrite_html(VIDEO_HTML)
+    assert library.posters() == frozenset()
+
+    assert library.derive_all() is True
+    html = library.rewrite_html(VIDEO_HTML)
+    assert 'poster="/static/buddy/clip.poster.jpg?v=' in html
+    assert library.posters() == {'clip.poster.jpg'}
+    assert len(ffmpeg_calls) == 2  # poster and lite
+
+
+def test_second_process_skips_while_locked(library, ffmpeg_calls):
+    os.makedirs(library.cache_dir)
+    open(os.path.join(library.cache_dir, '.deriving'), 'w').close()
+
+    assert library.derive_all() is False
+    assert ffmpeg_calls == []
+
+
+def test_stale_lock_is_taken_over(library, ffmpeg_calls):
+    os.makedirs(library.cache_dir)
+    lock = os.path.join(library.cache_dir, '.deriving')
+    open(lock, 'w').close()
+    old = time.time() - simple_app.MEDIA_DERIVE_TIMEOUT - 120
+    os.utime(lock, (old, old))
+
+    assert library.derive_all() is True
+    assert len(ffmpeg_calls) == 2
+    assert not os.path.exists(lock)
@@ -0,0 +1,47 @@
+"""
+Progress imported by /api/migrate, then kept in step by /api/progress/sync.
+"""
+
+
+def migrate(client, **progress):
+    res = client.post('/api/migrate', json={'moods': [], 'trustTeam': [], 'progress': progress})
+    assert res.status_code == 200
+
+
+def sync(client, version, **changes):
+    res = client.post('/api/progress/sync', json={'version': version, 'changes': changes})
+    assert res.status_code == 200
+    return res.get_json()
+
+
+def test_first_delta_sync_after_migrate_keeps_the_clients_xp(client):
+    migrate(client, xp=40, level=2, badges=['first-mood'])
+
+    # A client that didn't pull after migrating still starts at version 0
+    reply = sync(client, 0, xp=50)
+    assert 'xp' not in reply['changes']
+    assert reply['changes']['level'] == 2
+    assert sync(client, 0)['changes']['xp'] == 50
+
+
+def test_pull_after_migrate_seeds_the_client(client):
+    migrate(client, xp=40, level=2, badges=['first-mood'], kindnessCount=3)
+
+    pulled = sync(client, 0)
+    assert pulled['changes']['xp'] == 40
+    assert pulled['changes']['badges'] == ['first-mood']
+
+    reply = sync(client, pulled['version'], xp=45)
+    assert reply['changes'] == {}
+    assert reply['version'] == pulled['version'] + 1
+
+
+def test_migrate_merges_with_existing_progress(client):
+    sync(client, 0, xp=100, level=3, badges=['brave'])
+    migrate(client, xp=40, level=2, badges=['first-mood'], kindnessCount=3)
+
+    state = sync(client, 0)['changes']
+    assert state['xp'] == 100
+    assert state['level'] == 3
+    assert state['badges'] == ['brave', 'first-mood']
+    assert state['kindnessCount'] == 3
@@ -0,0 +1,82 @@
+"""
+Expiry and add-unless-present on the shared state backends, and the alert
+rate limits (TokenBucket) built on them.
+
+The Redis backend runs against fakeredis's TCP server in a child process,
+so it goes through the real redis client and protocol.
+"""
+
+import subprocess
+import sys
+import time
+
+import pytest
+
+from simple_app import MemoryState, RedisState, SQLiteState, TokenBucket
+
+FAKE_REDIS = (
+    "from fakeredis import TcpFakeServer\n"
+    "server = TcpFakeServer(('127.0.0.1', 0))\n"
+    "print(server.server_address[1], flush=True)\n"
+    "server.serve_forever()\n"
+)
+
+
+@pytest.fixture(scope='module')
+def redis_url():
+    pytest.importorskip('redis')
+    pytest.importorskip('fakeredis')
+    server = subprocess.Popen([sys.executable, '-c', FAKE_REDIS], stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(server.stdout.readline())
+        yield f'redis://127.0.0.1:{port}/0'
+    finally:
+        server.terminate()
+        server.wait()
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def state(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryState()
+    if request.param == 'sqlite':
+        return SQLiteState(str(tmp_path / 'state.db'))
+    return RedisState(request.getfixturevalue('redis_url'), prefix=f'test:{time.time_ns()}:')
+
+
+def test_add_keeps_the_first_value_until_it_expires(state):
+    assert state.add('alert-dedupe:1:mum', 'first', 0.2) is None
+    assert state.add('alert-dedupe:1:mum', 'second', 0.2) == 'first'
+
+    time.sleep(0.3)
+    assert state.add('alert-dedupe:1:mum', 'third', 0.2) is None
+    assert state.get('alert-dedupe:1:mum') == 'third'
+
+
+def test_update_is_read_modify_write(state):
+    assert state.update('count', lambda current: ((current or 0) + 1, current), 5) is None
+    assert state.update('count', lambda current: ((current or 0) + 1, current), 5) == 1
+    assert state.get('count') == 2
+
+
+def test_token_bucket_refills(state):
+    bucket = TokenBucket(state, 'limit', burst=2, per_hour=2 * 3600)  # a token every 0.5s
+
+    assert bucket.take('parent@example.com') == 0
+    assert bucket.take('parent@example.com') == 0
+    wait = bucket.take('parent@example.com')
+    assert 0 < wait <= 0.5
+    assert bucket.take('teacher@example.com') == 0  # buckets are per name
+
+    time.sleep(wait + 0.05)
+    assert bucket.take('parent@example.com') == 0
+    assert bucket.take('parent@example.com') > 0
+
+
+def test_refund_gives_the_token_back(state):
+    bucket = TokenBucket(state, 'limit', burst=1, per_hour=1)
+
+    assert bucket.take('kid') == 0
+    assert bucket.take('kid') > 0
+    bucket.refund('kid')
+    assert bucket.take('kid') == 0
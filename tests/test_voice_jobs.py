@@ -0,0 +1,107 @@
+"""
+The VoiceJob queue: claims with attempts as a version number, and leases.
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import simple_app
+from simple_app import VOICE_JOB_LEASE, VoiceJob, app, claim_voice_job, db, run_voice_job
+
+
+@pytest.fixture
+def jobs():
+    """Adds queued jobs to an empty queue; returns their ids."""
+    with app.app_context():
+        VoiceJob.query.delete()
+        db.session.commit()
+
+        def add(count):
+            ids = [f'job{i}' for i in range(count)]
+            for job_id in ids:
+                db.session.add(VoiceJob(id=job_id, owner='user:1', status='queued', audio=b'webm'))
+            db.session.commit()
+            return ids
+
+        yield add
+
+
+def stored(job_id):
+    db.session.expire_all()
+    return db.session.get(VoiceJob, job_id)
+
+
+def expire_lease(job_id):
+    VoiceJob.query.filter_by(id=job_id).update(
+        {'started_at': datetime.utcnow() - timedelta(seconds=VOICE_JOB_LEASE + 1)})
+    db.session.commit()
+
+
+def test_workers_never_claim_the_same_job(jobs):
+    ids = jobs(30)
+    claims, errors = [], []
+    start = threading.Barrier(4)
+
+    def worker():
+        with app.app_context():
+            start.wait()
+            try:
+                while True:
+                    claim = claim_voice_job()
+                    if claim is None:
+                        return
+                    claims.append(claim)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert sorted(job_id for job_id, _ in claims) == sorted(ids)
+    assert all(attempt == 1 for _, attempt in claims)
+
+
+def test_running_job_is_not_claimed_again_within_its_lease(jobs):
+    (job_id,) = jobs(1)
+    assert claim_voice_job() == (job_id, 1)
+    assert claim_voice_job() is None
+
+
+def test_job_is_reclaimed_after_its_lease_and_the_late_result_is_dropped(jobs, monkeypatch):
+    (job_id,) = jobs(1)
+    first = claim_voice_job()
+    expire_lease(job_id)
+    second = claim_voice_job()
+    assert second == (job_id, 2)
+
+    monkeypatch.setattr(simple_app, 'respond_to_voice_entry', lambda audio: ('late reply', None))
+    run_voice_job(*first)
+    job = stored(job_id)
+    assert job.status == 'running'
+    assert job.transcript is None
+    assert job.audio == b'webm'
+
+    monkeypatch.setattr(simple_app, 'respond_to_voice_entry', lambda audio: ('fresh reply', None))
+    run_voice_job(*second)
+    job = stored(job_id)
+    assert job.status == 'done'
+    assert job.transcript == 'fresh reply'
+    assert job.audio is None
+
+
+def test_job_fails_once_it_runs_out_of_attempts(jobs):
+    (job_id,) = jobs(1)
+    for attempt in range(1, simple_app.VOICE_JOB_MAX_ATTEMPTS + 1):
+        assert claim_voice_job() == (job_id, attempt)
+        expire_lease(job_id)
+
+    assert claim_voice_job() is None
+    job = stored(job_id)
+    assert job.status == 'failed'
+    assert job.transcript in simple_app.VOICE_FALLBACKS
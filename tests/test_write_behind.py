@@ -0,0 +1,64 @@
+"""
+WriteBehindBuffer group commits with durable callers.
+"""
+
+import threading
+
+import pytest
+
+from simple_app import ChatMessage, WriteBehindBuffer, app, db
+
+
+@pytest.fixture
+def messages():
+    with app.app_context():
+        ChatMessage.query.delete()
+        db.session.commit()
+
+        def stored():
+            db.session.expire_all()
+            return sorted(m.content for m in ChatMessage.query.all())
+
+        yield stored
+
+
+def test_an_add_is_never_split_across_batches(messages):
+    buffer = WriteBehindBuffer(interval=0.2, max_rows=3, durable=True, wait_timeout=1.0)
+    batches = []
+    write = buffer._write
+
+    def record(batch):
+        batches.append(sorted(len(entries) for entries, _ in batch))
+        write(batch)
+
+    buffer._write = record
+    errors = []
+
+    def add(n):
+        try:
+            buffer.add([ChatMessage(user_id=1, role='user', content=f'add{n}-row{i}') for i in range(2)])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add, args=(n,)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert errors == []
+    assert all(sum(batch) <= 3 or len(batch) == 1 for batch in batches)
+    assert sorted(size for batch in batches for size in batch) == [2, 2, 2]
+    assert messages() == sorted(f'add{n}-row{i}' for n in range(3) for i in range(2))
+
+    # The flush thread survived and still takes new rows
+    buffer.add([ChatMessage(user_id=1, role='user', content='later')])
+    assert 'later' in messages()
+    buffer.close()
+
+
+def test_an_add_larger_than_max_rows_goes_alone(messages):
+    buffer = WriteBehindBuffer(interval=0.01, max_rows=3, durable=True)
+    buffer.add([ChatMessage(user_id=1, role='user', content=f'row{i}') for i in range(5)])
+    assert len(messages()) == 5
+    buffer.close()